@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, StudentProfile, AdminProfile
+from .models import User, StudentProfile, AdminProfile, OutboundEmail
 
 
 @admin.register(User)
@@ -57,3 +57,12 @@ class AdminProfileAdmin(admin.ModelAdmin):
         }),
     )
     readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['to_email', 'subject']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'sent_at', 'locked_at', 'last_error']
@@ -0,0 +1,80 @@
+"""
+ユーザーとプロファイルを1回のクエリで読み込む認証バックエンド
+
+リクエストごとのユーザーの読み込み（セッションのユーザーID → request.user）で、生徒・管理者の
+プロファイルもselect_relatedでまとめて読み込む。ビューやテンプレートで user.student_profile・
+user.admin_profile に触れても追加のクエリは発生しない。
+
+読み込んだユーザーはユーザーIDごとに短時間キャッシュする（同じユーザーの複数のセッションで共有し、
+1回の保存で全セッションのキャッシュを消せるようにするため、セッションごとではなくユーザーごとにキャッシュする）。
+ユーザー・プロファイルが保存・削除されたらキャッシュを消す（accounts.signals）。
+
+ただし、ログインの可否と権限を決める項目（パスワード・有効/無効・役割）はキャッシュを信用せず、
+リクエストごとにその3列だけを主キーで読み直して照合する（結合のない1行の読み込み）。
+既定のキャッシュ（LocMemCache）はプロセスごとのため、changepasswordコマンドや別のgunicornワーカーでの
+変更はシグナルでは消せないが、照合で食い違えばその場で読み込み直すので、パスワード変更前のセッションや
+無効化・降格したユーザーがキャッシュ期間中に使われることはない。
+
+キャッシュ期間（USER_CACHE_TIMEOUT）が過ぎるまで反映されないのは、シグナルが送られない変更
+（QuerySet.update()・bulk_update、他のプロセスでの保存）のうち、上の3項目以外（氏名・プロファイルなど）だけ。
+"""
+from typing import Optional
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+from .models import User
+
+# 読み込んだユーザーのキャッシュ期間（秒）。保存・削除されれば期間内でも使われない（同じプロセス・共有キャッシュの場合）。
+# シグナルで消せない表示用の項目の変更が反映されるまでの最大の時間でもあるため、長くしないこと
+USER_CACHE_TIMEOUT = 60
+
+_USER_KEY = 'accounts:user:{user_id}'
+
+
+def load_user(user_id) -> Optional[User]:
+    """ユーザーと生徒・管理者のプロファイルを1回のクエリで読み込む（存在しなければNone）"""
+    return User.objects.select_related('student_profile', 'admin_profile').filter(pk=user_id).first()
+
+
+# リクエストごとに読み直して照合する項目（ログインの可否と権限を決めるもの）
+AUTH_FIELDS = ('password', 'is_active', 'role')
+
+
+def get_cached_user(user_id) -> Optional[User]:
+    """
+    キャッシュしたユーザー（なければ読み込んでキャッシュする）
+
+    キャッシュがあってもAUTH_FIELDSだけは読み直し、食い違えば（他のプロセスでの変更など）読み込み直す。
+    """
+    key = _USER_KEY.format(user_id=user_id)
+    user = cache.get(key)
+    if user is not None:
+        current = User.objects.filter(pk=user_id).values_list(*AUTH_FIELDS).first()
+        if current is None:
+            cache.delete(key)
+            return None
+        if current == tuple(getattr(user, field) for field in AUTH_FIELDS):
+            return user
+    user = load_user(user_id)
+    if user is not None:
+        cache.set(key, user, USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_cached_user(user_id) -> None:
+    """
+    ユーザーのキャッシュを消す（トランザクション確定後）
+
+    確定前に消すと、同時に処理中の別のリクエストが確定前の内容を読み込んでキャッシュし直すため。
+    """
+    if user_id is None:
+        return
+    transaction.on_commit(lambda: cache.delete(_USER_KEY.format(user_id=user_id)))
+
+
+class ProfileModelBackend(ModelBackend):
+    """ModelBackendのユーザーの読み込みをプロファイル込み・キャッシュ付きにしたもの"""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,207 @@
+"""
+メールの送信待ち（OutboundEmail）と送信処理
+
+リクエストの処理ではメールを送信待ちに登録（INSERT）するだけで、SMTPには接続しない。
+送信はプロセスごとに1つのデーモンスレッドが行い、Djangoの get_connection() で開いた
+1つの接続で送信待ちをまとめて送る。失敗したメールは間隔を延ばしながら再送する。
+
+複数のプロセスが同時に送信しても同じメールを二重に送らないよう、送信するメールは
+状態を「送信中」に変える条件付きの更新で引き受けてから送る。
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# 1回に引き受けて同じ接続で送る最大件数
+EMAIL_BATCH_SIZE = 50
+
+# この回数失敗したメールは送信失敗とする（send_outbound_emails --retry-failed で再送）
+EMAIL_MAX_ATTEMPTS = 6
+
+# 再送までの間隔（秒）。失敗のたびに2倍にし、上限で打ち切る
+EMAIL_RETRY_BASE_SECONDS = 30
+EMAIL_RETRY_MAX_SECONDS = 60 * 30
+
+# 送信中のまま（プロセスの停止などで）この時間を過ぎたメールは送信待ちに戻す（秒）
+EMAIL_SENDING_STALE_SECONDS = 600
+
+# 送信処理のスレッドが次の再送を待つ最大時間（秒）
+EMAIL_SENDER_MAX_SLEEP_SECONDS = 60
+
+_sender_lock = threading.Lock()
+_sender_running = False
+
+
+def enqueue_email(subject: str, body: str, to_email: str, from_email: Optional[str] = None) -> OutboundEmail:
+    """メールを送信待ちに登録し、トランザクション確定後に送信処理を開始"""
+    email = OutboundEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        from_email=from_email or '',
+    )
+    transaction.on_commit(schedule_email_sender)
+    return email
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """attempts回目の失敗の後、再送するまでの間隔"""
+    seconds = EMAIL_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, EMAIL_RETRY_MAX_SECONDS))
+
+
+def _claimable(now) -> Q:
+    stale = now - timedelta(seconds=EMAIL_SENDING_STALE_SECONDS)
+    return (
+        Q(status=OutboundEmail.Status.PENDING, next_attempt_at__lte=now)
+        | Q(status=OutboundEmail.Status.SENDING, locked_at__lt=stale)
+    )
+
+
+def claim_emails(limit: int = EMAIL_BATCH_SIZE) -> list:
+    """
+    送信するメールを引き受ける
+
+    送信時刻になった送信待ち（と中断された送信中）を「送信中」に変え、更新できたものだけを返す。
+    送信開始日時を引き受けの目印に使い、同時に引き受けた別のプロセスの分は含めない。
+    """
+    now = timezone.now()
+    ids = list(
+        OutboundEmail.objects.filter(_claimable(now))
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    OutboundEmail.objects.filter(_claimable(now), pk__in=ids).update(
+        status=OutboundEmail.Status.SENDING,
+        locked_at=now,
+    )
+    return list(OutboundEmail.objects.filter(
+        pk__in=ids, status=OutboundEmail.Status.SENDING, locked_at=now
+    ).order_by('id'))
+
+
+def _record_failure(email: OutboundEmail, error: Exception) -> None:
+    attempts = email.attempts + 1
+    if attempts >= EMAIL_MAX_ATTEMPTS:
+        status = OutboundEmail.Status.FAILED
+    else:
+        status = OutboundEmail.Status.PENDING
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        status=status,
+        attempts=F('attempts') + 1,
+        next_attempt_at=timezone.now() + retry_delay(attempts),
+        locked_at=None,
+        last_error=str(error)[:1000],
+    )
+
+
+def send_pending_emails(max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """
+    送信待ちのメールをまとめて送信
+
+    1つのSMTP接続を開いたまま、引き受けたメールを順に送る。送信に失敗した場合は
+    そのメールを失敗として記録し、接続を閉じて次のメールの送信前に接続し直す。
+    """
+    sent_count = 0
+    failed_count = 0
+    batches = 0
+    backend = get_connection(fail_silently=False)
+    try:
+        while max_batches is None or batches < max_batches:
+            emails = claim_emails()
+            if not emails:
+                break
+            batches += 1
+            sent_ids = []
+            for email in emails:
+                message = EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+                    to=[email.to_email],
+                    connection=backend,
+                )
+                try:
+                    # 開いている接続はそのまま使う（閉じていれば開き直す）
+                    backend.open()
+                    message.send()
+                except Exception as e:
+                    logger.warning(f"メール送信エラー - 送信メールID: {email.pk}: {e}")
+                    _record_failure(email, e)
+                    failed_count += 1
+                    backend.close()
+                    continue
+                sent_ids.append(email.pk)
+
+            OutboundEmail.objects.filter(pk__in=sent_ids).update(
+                status=OutboundEmail.Status.SENT,
+                attempts=F('attempts') + 1,
+                sent_at=timezone.now(),
+                locked_at=None,
+                last_error='',
+            )
+            sent_count += len(sent_ids)
+    finally:
+        backend.close()
+
+    return {'sent_count': sent_count, 'failed_count': failed_count}
+
+
+def next_pending_at() -> Optional[Any]:
+    """次に送信時刻になる送信待ちのメールの日時（なければNone）"""
+    return OutboundEmail.objects.filter(
+        status=OutboundEmail.Status.PENDING
+    ).aggregate(next_at=Min('next_attempt_at'))['next_at']
+
+
+def _run_sender() -> None:
+    global _sender_running
+    try:
+        while True:
+            close_old_connections()
+            try:
+                result = send_pending_emails()
+                if result['sent_count'] or result['failed_count']:
+                    logger.info(f"メール送信 - 成功: {result['sent_count']}, 失敗: {result['failed_count']}")
+            except Exception:
+                logger.exception('メール送信処理エラー')
+
+            with _sender_lock:
+                # 再送待ちのメールがあれば送信時刻まで待って続ける
+                next_at = next_pending_at()
+                if next_at is None:
+                    _sender_running = False
+                    return
+            wait = (next_at - timezone.now()).total_seconds()
+            time.sleep(min(max(wait, 1), EMAIL_SENDER_MAX_SLEEP_SECONDS))
+    except Exception:
+        with _sender_lock:
+            _sender_running = False
+        raise
+    finally:
+        connection.close()
+
+
+def schedule_email_sender() -> None:
+    """送信処理をデーモンスレッドで開始（実行中なら何もしない）"""
+    global _sender_running
+    with _sender_lock:
+        if _sender_running:
+            return
+        _sender_running = True
+
+    thread = threading.Thread(target=_run_sender)
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,67 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from accounts.roster import credentials_csv, provision_students, read_roster, validate_roster
+
+
+class Command(BaseCommand):
+    help = '生徒名簿（CSV・XLSX）から生徒アカウントを一括登録します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            help='名簿ファイルのパス（会員番号・都道府県・所属校・クラス・ニックネーム・学年の列が必要）',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='パスワードのハッシュ化に使うワーカープロセス数（既定: CPUコア数）',
+        )
+        parser.add_argument(
+            '--credentials',
+            type=str,
+            default=None,
+            help='発行した初期パスワードの一覧の出力先（既定: <名簿ファイル名>_passwords.csv）',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='名簿の検証のみ行い、登録しない',
+        )
+
+    def handle(self, *args, **options):
+        path = options['file']
+        try:
+            with open(path, 'rb') as f:
+                rows, errors = read_roster(f, path)
+        except OSError as e:
+            raise CommandError(f'名簿ファイルを読み込めません: {e}')
+        if not errors:
+            errors = validate_roster(rows)
+
+        self.stdout.write(f'名簿の人数: {len(rows)}人')
+        if errors:
+            self.stdout.write(self.style.ERROR(f'エラー {len(errors)}件（登録していません）'))
+            for error in errors[:20]:
+                self.stdout.write(f'  - {error}')
+            if len(errors) > 20:
+                self.stdout.write(f'  ... 他 {len(errors) - 20} 件のエラー')
+            raise CommandError('名簿を修正してから再実行してください。')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('※ ドライランモードです。登録は行っていません。'))
+            return
+
+        started = time.perf_counter()
+        result = provision_students(rows, max_workers=options['workers'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"登録した人数: {result['created_count']}人（{elapsed:.1f}秒）")
+
+        if result['credentials']:
+            output = options['credentials'] or f"{path.rsplit('.', 1)[0]}_passwords.csv"
+            with open(output, 'w', encoding='utf-8', newline='') as f:
+                f.write(credentials_csv(result['credentials']))
+            self.stdout.write(self.style.WARNING(
+                f"初期パスワードを発行しました（{len(result['credentials'])}人）: {output}\n"
+                '生徒に配布したら削除してください。'
+            ))
+        self.stdout.write(self.style.SUCCESS('一括登録が完了しました。'))
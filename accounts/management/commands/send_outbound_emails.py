@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.models import OutboundEmail
+from accounts.email_outbox import send_pending_emails
+
+
+class Command(BaseCommand):
+    help = '送信待ちのメールをまとめて送信します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='送信に繰り返し失敗したメールも再送する',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            reset = OutboundEmail.objects.filter(status=OutboundEmail.Status.FAILED).update(
+                status=OutboundEmail.Status.PENDING,
+                attempts=0,
+                next_attempt_at=timezone.now(),
+            )
+            self.stdout.write(f'失敗したメールを送信待ちに戻しました: {reset}件')
+
+        pending = OutboundEmail.objects.filter(status=OutboundEmail.Status.PENDING).count()
+        self.stdout.write(f'送信待ち: {pending}件')
+
+        result = send_pending_emails()
+        self.stdout.write(f"送信件数: {result['sent_count']}")
+        self.stdout.write(f"失敗件数: {result['failed_count']}")
+        remaining = OutboundEmail.objects.filter(status=OutboundEmail.Status.PENDING).count()
+        if remaining:
+            self.stdout.write(self.style.WARNING(f'送信待ちに残っているメール（再送待ちを含む）: {remaining}件'))
+        else:
+            self.stdout.write(self.style.SUCCESS('送信待ちのメールをすべて送信しました。'))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentprofile',
+            index=models.Index(fields=['prefecture', 'school', 'class_name'], name='accounts_st_prefect_a74c2f_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_studentprofile_audience_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_email', models.EmailField(max_length=254, verbose_name='宛先')),
+                ('subject', models.CharField(max_length=255, verbose_name='件名')),
+                ('body', models.TextField(verbose_name='本文')),
+                ('from_email', models.CharField(blank=True, max_length=255, verbose_name='送信者')),
+                ('status', models.CharField(choices=[('pending', '送信待ち'), ('sending', '送信中'), ('sent', '送信済み'), ('failed', '送信失敗')], default='pending', max_length=10, verbose_name='状態')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='送信試行回数')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='次回送信日時')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='送信開始日時')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後のエラー')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='送信日時')),
+            ],
+            options={
+                'verbose_name': '送信メール',
+                'verbose_name_plural': '送信メール',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='accounts_ou_status_c6d874_idx')],
+            },
+        ),
+    ]
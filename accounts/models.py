@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -61,6 +62,9 @@ class StudentProfile(models.Model):
     class Meta:
         verbose_name = '生徒プロファイル'
         verbose_name_plural = '生徒プロファイル'
+        indexes = [
+            models.Index(fields=['prefecture', 'school', 'class_name']),
+        ]
     
     def __str__(self):
         return f"{self.nickname} ({self.school} {self.class_name})"
@@ -93,3 +97,40 @@ class AdminProfile(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.employee_number})"
+
+
+class OutboundEmail(models.Model):
+    """送信待ちのメール（accounts.email_outboxの送信処理がまとめて送信する）"""
+    
+    class Status(models.TextChoices):
+        PENDING = 'pending', '送信待ち'
+        SENDING = 'sending', '送信中'
+        SENT = 'sent', '送信済み'
+        FAILED = 'failed', '送信失敗'
+    
+    to_email = models.EmailField(verbose_name='宛先')
+    subject = models.CharField(max_length=255, verbose_name='件名')
+    body = models.TextField(verbose_name='本文')
+    from_email = models.CharField(max_length=255, blank=True, verbose_name='送信者')
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='状態'
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name='送信試行回数')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='次回送信日時')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='送信開始日時')
+    last_error = models.TextField(blank=True, verbose_name='最後のエラー')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='送信日時')
+    
+    class Meta:
+        verbose_name = '送信メール'
+        verbose_name_plural = '送信メール'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.to_email} - {self.subject} ({self.get_status_display()})"
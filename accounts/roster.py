@@ -0,0 +1,277 @@
+"""
+生徒名簿（CSV・XLSX）による生徒アカウントの一括登録
+
+名簿の全行を検証してから登録し、1行でもエラーがあれば何も登録しない。
+会員番号・ユーザー名の重複は、登録済みの会員番号と名簿のユーザー名に一致するユーザーを
+それぞれ1回だけ読み込んだ集合で判定する。
+
+パスワードのハッシュ化（PBKDF2）はCPUバウンドで1件ごとに時間がかかるため、プロセスプールで
+並列に行う。UserとStudentProfileはbulk_createで一定件数ずつまとめて作成する。
+"""
+import csv
+import io
+import os
+import re
+import secrets
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from .models import User, StudentProfile
+
+# 列名（英語・日本語の見出しのどちらでもよい）
+ROSTER_COLUMNS = {
+    'member_id': ('member_id', '会員番号'),
+    'prefecture': ('prefecture', '都道府県'),
+    'school': ('school', '所属校', '学校'),
+    'class_name': ('class', 'class_name', 'クラス'),
+    'nickname': ('nickname', 'ニックネーム'),
+    'grade': ('grade', '学年'),
+    'username': ('username', 'ユーザー名'),
+    'password': ('password', 'パスワード'),
+}
+
+REQUIRED_COLUMNS = ('member_id', 'prefecture', 'school', 'class_name', 'nickname', 'grade')
+
+GRADES = ('中1', '中2', '中3')
+
+# bulk_createで1回に作成する件数
+ROSTER_BATCH_SIZE = 500
+
+# パスワードのハッシュ化に使うワーカープロセス数の上限
+HASH_MAX_WORKERS = 4
+
+# 名簿にパスワードがない生徒に発行する初期パスワードの文字と長さ（紛らわしい文字は除く）
+INITIAL_PASSWORD_CHARS = 'abcdefghjkmnpqrstuvwxyz23456789'
+INITIAL_PASSWORD_LENGTH = 10
+
+_MEMBER_ID_PATTERN = re.compile(r'^\d{8}$')
+_MAX_LENGTHS = {'prefecture': 10, 'school': 100, 'class_name': 50, 'nickname': 50, 'username': 150}
+
+
+def _column_map(header: Iterable[Any]) -> Dict[str, int]:
+    aliases = {alias.lower(): field for field, names in ROSTER_COLUMNS.items() for alias in names}
+    mapping = {}
+    for index, name in enumerate(header):
+        field = aliases.get(str(name or '').strip().lower())
+        if field and field not in mapping:
+            mapping[field] = index
+    return mapping
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def read_roster(file_obj, filename: str) -> Tuple[List[Dict[str, str]], List[str]]:
+    """名簿を読み込む（行の辞書のリストとエラー）。行番号は見出しを1行目として数える"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_obj, read_only=True, data_only=True)
+        try:
+            table = [list(row) for row in workbook.active.iter_rows(values_only=True)]
+        finally:
+            workbook.close()
+    elif extension == '.csv':
+        raw = file_obj.read()
+        try:
+            text = raw.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            # Excelで保存したCSV（Shift_JIS）
+            text = raw.decode('cp932')
+        table = list(csv.reader(io.StringIO(text)))
+    else:
+        return [], ['CSVまたはXLSXファイルを指定してください。']
+
+    if not table:
+        return [], ['名簿が空です。']
+    mapping = _column_map(table[0])
+    missing = [ROSTER_COLUMNS[field][1] for field in REQUIRED_COLUMNS if field not in mapping]
+    if missing:
+        return [], [f"必要な列がありません: {', '.join(missing)}"]
+
+    rows = []
+    for line_number, values in enumerate(table[1:], 2):
+        if not any(_cell(value) for value in values):
+            continue
+        row = {field: _cell(values[index]) if index < len(values) else '' for field, index in mapping.items()}
+        row['line'] = line_number
+        rows.append(row)
+    return rows, []
+
+
+def _existing(model, field: str, values: List[str], chunk_size: int = ROSTER_BATCH_SIZE) -> set:
+    """登録済みの値（IN句の件数を抑えるため分割して読み込む）"""
+    found = set()
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        found.update(model.objects.filter(**{f'{field}__in': chunk}).values_list(field, flat=True))
+    return found
+
+
+def validate_roster(rows: List[Dict[str, str]]) -> List[str]:
+    """名簿の全行を検証してエラーのリストを返す（ユーザー名が空の行は会員番号をユーザー名にする）"""
+    errors = []
+    existing_member_ids = set(StudentProfile.objects.values_list('member_id', flat=True))
+    for row in rows:
+        row['username'] = row.get('username') or row['member_id']
+    existing_usernames = _existing(User, 'username', [row['username'] for row in rows])
+
+    seen_member_ids = set()
+    seen_usernames = set()
+    for row in rows:
+        prefix = f"{row['line']}行目"
+        for field in REQUIRED_COLUMNS:
+            if not row.get(field):
+                errors.append(f'{prefix}: {ROSTER_COLUMNS[field][1]}が空です')
+        for field, max_length in _MAX_LENGTHS.items():
+            if len(row.get(field, '')) > max_length:
+                errors.append(f'{prefix}: {ROSTER_COLUMNS[field][1]}は{max_length}文字以内にしてください')
+
+        member_id = row['member_id']
+        if not member_id:
+            pass
+        elif not _MEMBER_ID_PATTERN.match(member_id):
+            errors.append(f'{prefix}: 会員番号は8桁の数字で入力してください（{member_id}）')
+        elif member_id in existing_member_ids:
+            errors.append(f'{prefix}: 会員番号 {member_id} は既に使用されています')
+        elif member_id in seen_member_ids:
+            errors.append(f'{prefix}: 会員番号 {member_id} が名簿内で重複しています')
+        seen_member_ids.add(member_id)
+
+        username = row['username']
+        if not username:
+            pass
+        elif username in existing_usernames:
+            errors.append(f'{prefix}: ユーザー名 {username} は既に使用されています')
+        elif username in seen_usernames:
+            errors.append(f'{prefix}: ユーザー名 {username} が名簿内で重複しています')
+        seen_usernames.add(username)
+
+        if row['grade'] and row['grade'] not in GRADES:
+            errors.append(f"{prefix}: 学年は{'・'.join(GRADES)}のいずれかにしてください（{row['grade']}）")
+    return errors
+
+
+def generate_initial_password() -> str:
+    return ''.join(secrets.choice(INITIAL_PASSWORD_CHARS) for _ in range(INITIAL_PASSWORD_LENGTH))
+
+
+def hash_passwords(passwords: List[str], max_workers: Optional[int] = None) -> List[str]:
+    """
+    パスワードをプロセスプールで並列にハッシュ化する（入力と同じ順）
+
+    ワーカーはmake_passwordを呼ぶだけで、データベースには一切アクセスしない。
+    Webプロセスのスレッドからも呼ばれるため、ワーカー数はHASH_MAX_WORKERSまでにし、
+    ワーカーはfork（スレッド・DB接続・キャッシュの状態を引き継ぐ）ではなくforkserver・spawnで起動する。
+    """
+    import django
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not passwords:
+        return []
+    max_workers = min(max_workers or os.cpu_count() or 1, HASH_MAX_WORKERS)
+    if max_workers == 1 or len(passwords) == 1:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (max_workers * 4))
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    # forkserver・spawnのワーカーではアプリを読み込み直す必要があるため、django.setupで初期化する
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(start_method),
+        initializer=django.setup,
+    ) as executor:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def issue_initial_passwords(rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    名簿にパスワードがない生徒に初期パスワードを発行して行に設定し、配布用の一覧を返す
+
+    初期パスワードはハッシュ化したものだけを保存するため、この一覧はその場で配布用に渡し、
+    データベースには保存しない。
+    """
+    credentials = []
+    for row in rows:
+        if row.get('password'):
+            continue
+        row['password'] = generate_initial_password()
+        credentials.append({
+            'member_id': row['member_id'],
+            'username': row['username'],
+            'nickname': row['nickname'],
+            'school': row['school'],
+            'class_name': row['class_name'],
+            'password': row['password'],
+        })
+    return credentials
+
+
+def provision_students(
+    rows: List[Dict[str, str]],
+    max_workers: Optional[int] = None,
+    batch_size: int = ROSTER_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    検証済みの名簿の生徒アカウントを一括作成する
+
+    パスワードがない生徒にはissue_initial_passwordsで初期パスワードを発行し、credentialsとして返す
+    （発行済みの行は名簿のパスワードとして扱う）。
+    """
+    credentials = issue_initial_passwords(rows)
+    hashed = hash_passwords([row['password'] for row in rows], max_workers=max_workers)
+
+    with transaction.atomic():
+        users = User.objects.bulk_create(
+            [
+                User(username=row['username'], password=password_hash, role=User.Role.STUDENT)
+                for row, password_hash in zip(rows, hashed)
+            ],
+            batch_size=batch_size,
+        )
+        if any(user.pk is None for user in users):
+            # 作成したIDを返せないデータベースではユーザー名で読み直す
+            ids = {}
+            usernames = [row['username'] for row in rows]
+            for start in range(0, len(usernames), batch_size):
+                chunk = usernames[start:start + batch_size]
+                ids.update(User.objects.filter(username__in=chunk).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+
+        StudentProfile.objects.bulk_create(
+            [
+                StudentProfile(
+                    user_id=user.pk,
+                    member_id=row['member_id'],
+                    prefecture=row['prefecture'],
+                    school=row['school'],
+                    class_name=row['class_name'],
+                    nickname=row['nickname'],
+                    grade=row['grade'],
+                )
+                for row, user in zip(rows, users)
+            ],
+            batch_size=batch_size,
+        )
+
+    return {'created_count': len(users), 'credentials': credentials}
+
+
+def credentials_csv(credentials: List[Dict[str, str]]) -> str:
+    """発行した初期パスワードの一覧（Excelで開けるようBOM付き）"""
+    output = io.StringIO()
+    output.write('\ufeff')
+    writer = csv.writer(output)
+    writer.writerow(['会員番号', 'ユーザー名', 'ニックネーム', '所属校', 'クラス', '初期パスワード'])
+    for item in credentials:
+        writer.writerow([
+            item['member_id'], item['username'], item['nickname'], item['school'], item['class_name'], item['password'],
+        ])
+    return output.getvalue()
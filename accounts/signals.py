@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import User, StudentProfile, AdminProfile
+from .backends import invalidate_cached_user
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    """ユーザーが変更されたら読み込み済みのユーザーのキャッシュを消す"""
+    invalidate_cached_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=StudentProfile)
+@receiver([post_save, post_delete], sender=AdminProfile)
+def profile_changed(sender, instance, **kwargs):
+    """プロファイルが変更されたらユーザーのキャッシュを消す"""
+    invalidate_cached_user(instance.user_id)
@@ -1,3 +1,114 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .backends import ProfileModelBackend
+from .email_outbox import (
+    EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_MAX_SECONDS, EMAIL_SENDING_STALE_SECONDS,
+    claim_emails, enqueue_email, retry_delay, send_pending_emails,
+)
+from .models import OutboundEmail, User
 
-# Create your tests here.
+
+class ProfileModelBackendTests(TestCase):
+    """ログイン中のユーザーの読み込み（キャッシュしてもパスワード・有効/無効・役割は読み直す）"""
+
+    def setUp(self):
+        cache.clear()
+        self.backend = ProfileModelBackend()
+        self.user = User.objects.create_user(username='student', password='pass')
+        # 1回目の読み込みでキャッシュする
+        self.assertIsNotNone(self.backend.get_user(self.user.pk))
+
+    def test_cached_user_is_reused(self):
+        with self.assertNumQueries(1):
+            user = self.backend.get_user(self.user.pk)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_changes_without_signals_are_seen_at_once(self):
+        # QuerySet.update()はシグナルを送らない（他のプロセスでの変更と同じくキャッシュは消えない）
+        User.objects.filter(pk=self.user.pk).update(password=make_password('changed'))
+        self.assertTrue(self.backend.get_user(self.user.pk).check_password('changed'))
+
+        User.objects.filter(pk=self.user.pk).update(role=User.Role.ADMIN)
+        self.assertEqual(self.backend.get_user(self.user.pk).role, User.Role.ADMIN)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_deleted_user_is_not_served_from_cache(self):
+        User.objects.filter(pk=self.user.pk).delete()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+
+class EmailOutboxTests(TestCase):
+    """メールの送信待ち（引き受け・送信・失敗時の再送）"""
+
+    def setUp(self):
+        self.email_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.email_dir, ignore_errors=True)
+
+    def enqueue(self, count=1):
+        return [enqueue_email('件名', '本文', f'student{index}@example.com') for index in range(count)]
+
+    def test_queued_emails_are_sent_through_the_file_backend(self):
+        # EMAIL_BACKENDの環境変数で切り替えるファイル出力と同じ設定
+        self.enqueue(3)
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.filebased.EmailBackend',
+                               EMAIL_FILE_PATH=self.email_dir):
+            result = send_pending_emails()
+
+        self.assertEqual(result, {'sent_count': 3, 'failed_count': 0})
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.Status.SENT).count(), 3)
+        # 1つの接続でまとめて送るため、出力ファイルは1つ
+        files = os.listdir(self.email_dir)
+        self.assertEqual(len(files), 1)
+        with open(os.path.join(self.email_dir, files[0]), encoding='utf-8') as f:
+            self.assertEqual(f.read().count('To: student'), 3)
+
+    def test_claimed_emails_are_not_claimed_again(self):
+        self.enqueue(2)
+
+        self.assertEqual(len(claim_emails()), 2)
+        self.assertEqual(claim_emails(), [])
+
+        # 送信中のまま中断されたメールは期限を過ぎれば引き受け直す
+        stale = timezone.now() - timedelta(seconds=EMAIL_SENDING_STALE_SECONDS + 1)
+        OutboundEmail.objects.update(locked_at=stale)
+        self.assertEqual(len(claim_emails()), 2)
+
+    def test_failed_emails_are_retried_with_backoff(self):
+        email, = self.enqueue()
+        with mock.patch('accounts.email_outbox.EmailMessage.send', side_effect=SMTPException('接続エラー')):
+            result = send_pending_emails()
+
+        self.assertEqual(result, {'sent_count': 0, 'failed_count': 1})
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.Status.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNone(email.locked_at)
+        self.assertIn('接続エラー', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + retry_delay(1) - timedelta(seconds=5))
+        # 再送時刻までは引き受けない
+        self.assertEqual(claim_emails(), [])
+
+    def test_emails_fail_after_the_last_attempt(self):
+        email, = self.enqueue()
+        OutboundEmail.objects.filter(pk=email.pk).update(attempts=EMAIL_MAX_ATTEMPTS - 1)
+        with mock.patch('accounts.email_outbox.EmailMessage.send', side_effect=SMTPException('接続エラー')):
+            send_pending_emails()
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.Status.FAILED)
+        self.assertEqual(email.attempts, EMAIL_MAX_ATTEMPTS)
+
+    def test_retry_delay_doubles_up_to_the_limit(self):
+        self.assertEqual(retry_delay(1), timedelta(seconds=30))
+        self.assertEqual(retry_delay(3), timedelta(seconds=120))
+        self.assertEqual(retry_delay(20), timedelta(seconds=EMAIL_RETRY_MAX_SECONDS))
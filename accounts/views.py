@@ -1,4 +1,3 @@
-import threading
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
@@ -15,50 +14,34 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.auth.tokens import default_token_generator
 from .models import User, StudentProfile, AdminProfile
 from .forms import StudentRegistrationForm, AdminRegistrationForm, ProfileEditForm
+from .email_outbox import enqueue_email
 
 
 def send_activation_email_async(user, request):
-    """非同期でメール認証用のメールを送信"""
-    def send_email():
-        try:
-            from django.conf import settings
-            
-            mail_subject = '管理者アカウント認証メール'
-            
-            # 開発環境では直接URLを生成
-            if settings.DEBUG:
-                domain = '127.0.0.1:8000'
-            else:
-                current_site = get_current_site(request)
-                domain = current_site.domain
-            
-            uid = urlsafe_base64_encode(force_bytes(user.pk))
-            token = default_token_generator.make_token(user)
-            
-            # メール本文のテンプレート
-            message = render_to_string('accounts/activation_email.html', {
-                'user': user,
-                'domain': domain,
-                'uid': uid,
-                'token': token,
-            })
-            
-            # メール送信
-            send_mail(
-                mail_subject,
-                message,
-                'noreply@example.com',  # 送信者
-                [user.email],  # 受信者
-                fail_silently=False,
-            )
-            print(f"DEBUG: メール送信完了 - {user.email}")
-        except Exception as e:
-            print(f"DEBUG: メール送信エラー - {e}")
-    
-    # 非同期でメール送信を実行
-    thread = threading.Thread(target=send_email)
-    thread.daemon = True
-    thread.start()
+    """メール認証用のメールを送信待ちに登録（送信はaccounts.email_outboxの送信処理が行う）"""
+    from django.conf import settings
+    
+    mail_subject = '管理者アカウント認証メール'
+    
+    # 開発環境では直接URLを生成
+    if settings.DEBUG:
+        domain = '127.0.0.1:8000'
+    else:
+        current_site = get_current_site(request)
+        domain = current_site.domain
+    
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    
+    # メール本文のテンプレート
+    message = render_to_string('accounts/activation_email.html', {
+        'user': user,
+        'domain': domain,
+        'uid': uid,
+        'token': token,
+    })
+    
+    enqueue_email(mail_subject, message, user.email, from_email='noreply@example.com')
 
 
 def send_activation_email(user, request):
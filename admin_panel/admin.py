@@ -1,18 +1,18 @@
 from django.contrib import admin
-from .models import XLSMUpload, AnalyticsData, PDFTemplate, SystemLog
+from .models import XLSMUpload, XLSMParseResult, AnalyticsData, PDFTemplate, WorksheetPDF, StudentRosterImport, SystemLog
 
 
 @admin.register(XLSMUpload)
 class XLSMUploadAdmin(admin.ModelAdmin):
-    list_display = ['subject', 'uploaded_by', 'uploaded_at', 'status', 'processed_at']
+    list_display = ['subject', 'original_filename', 'uploaded_by', 'uploaded_at', 'status', 'processed_at']
     list_filter = ['subject', 'status', 'uploaded_at']
-    search_fields = ['uploaded_by__username']
+    search_fields = ['uploaded_by__username', 'original_filename', 'content_hash']
     ordering = ['-uploaded_at']
-    readonly_fields = ['uploaded_at', 'processed_at']
+    readonly_fields = ['uploaded_at', 'processed_at', 'content_hash', 'duplicate_of']
     
     fieldsets = (
         ('基本情報', {
-            'fields': ('uploaded_by', 'subject', 'file')
+            'fields': ('uploaded_by', 'subject', 'file', 'original_filename', 'content_hash', 'duplicate_of')
         }),
         ('処理状況', {
             'fields': ('status', 'error_message')
@@ -24,6 +24,16 @@ class XLSMUploadAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(XLSMParseResult)
+class XLSMParseResultAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'parser_version', 'total_rows', 'error_count', 'created_at']
+    list_filter = ['parser_version', 'created_at']
+    search_fields = ['content_hash']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at']
+    exclude = ['data']
+
+
 @admin.register(AnalyticsData)
 class AnalyticsDataAdmin(admin.ModelAdmin):
     list_display = ['data_type', 'scope', 'calculated_at']
@@ -35,13 +45,35 @@ class AnalyticsDataAdmin(admin.ModelAdmin):
 
 @admin.register(PDFTemplate)
 class PDFTemplateAdmin(admin.ModelAdmin):
-    list_display = ['name', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['name', 'engine', 'is_active', 'created_at']
+    list_filter = ['engine', 'is_active', 'created_at']
     search_fields = ['name']
     ordering = ['name']
     readonly_fields = ['created_at']
 
 
+@admin.register(WorksheetPDF)
+class WorksheetPDFAdmin(admin.ModelAdmin):
+    list_display = ['unit', 'kind', 'template', 'engine', 'status', 'page_count', 'finished_at']
+    list_filter = ['kind', 'engine', 'status', 'template']
+    ordering = ['-created_at']
+    readonly_fields = [
+        'unit', 'content_version', 'template', 'kind', 'engine', 'status', 'file',
+        'page_count', 'error_message', 'started_at', 'finished_at', 'created_at',
+    ]
+
+
+@admin.register(StudentRosterImport)
+class StudentRosterImportAdmin(admin.ModelAdmin):
+    list_display = ['original_filename', 'uploaded_by', 'status', 'total_rows', 'created_count', 'created_at']
+    list_filter = ['status', 'created_at']
+    ordering = ['-created_at']
+    readonly_fields = [
+        'uploaded_by', 'original_filename', 'status', 'total_rows', 'created_count',
+        'issued_password_count', 'error_message', 'created_at', 'finished_at',
+    ]
+
+
 @admin.register(SystemLog)
 class SystemLogAdmin(admin.ModelAdmin):
     list_display = ['level', 'message_short', 'user', 'created_at']
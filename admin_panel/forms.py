@@ -15,6 +15,36 @@ class XLSMUploadForm(forms.ModelForm):
         }
 
 
+class StudentRosterForm(forms.Form):
+    """生徒名簿アップロードフォーム（名簿の全行を検証する）"""
+    
+    # 画面に表示するエラーの最大件数
+    ERROR_LIMIT = 50
+    
+    file = forms.FileField(
+        label='名簿ファイル',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    
+    def clean_file(self):
+        from accounts.roster import read_roster, validate_roster
+        
+        file = self.cleaned_data['file']
+        rows, errors = read_roster(file, file.name)
+        if not errors:
+            if not rows:
+                errors = ['名簿に生徒がいません。']
+            else:
+                errors = validate_roster(rows)
+        if errors:
+            shown = errors[:self.ERROR_LIMIT]
+            if len(errors) > self.ERROR_LIMIT:
+                shown.append(f'... 他 {len(errors) - self.ERROR_LIMIT} 件のエラー')
+            raise forms.ValidationError(shown)
+        self.roster_rows = rows
+        return file
+
+
 class QuestionForm(forms.ModelForm):
     """問題編集フォーム"""
     
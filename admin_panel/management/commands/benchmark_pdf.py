@@ -0,0 +1,166 @@
+import json
+import platform
+import resource
+import subprocess
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from admin_panel.models import PDFTemplate, WorksheetPDF
+from admin_panel.worksheets import render_pdf, render_worksheet_html
+from quiz_app.models import Question
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrssはLinuxではKB、macOSではバイト単位
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if platform.system() == 'Darwin' else 1024)
+
+
+def measure_render(engine, document, warmup):
+    """
+    1回のPDF作成の所要時間・ページ数・サイズ・ピークRSSの増分を計測
+
+    計測ごとに新しいワーカープロセスで実行し、ライブラリの読み込みとフォントの登録は
+    小さな文書で済ませてから計測する。
+    """
+    render_pdf(engine, warmup)
+    rss_before = _peak_rss_mb()
+    started = time.perf_counter()
+    data, page_count = render_pdf(engine, document)
+    seconds = time.perf_counter() - started
+    return {
+        'seconds': round(seconds, 4),
+        'pages': page_count,
+        'pages_per_sec': round(page_count / seconds, 1) if seconds else None,
+        'pdf_kb': round(len(data) / 1024, 1),
+        'peak_rss_delta_mb': round(_peak_rss_mb() - rss_before, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = 'WeasyPrintとReportLabのPDF作成の所要時間・メモリを問題数ごとに計測し、結果をJSONで出力します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='50,500,5000',
+            help='1つの文書の問題数（カンマ区切り）',
+        )
+        parser.add_argument(
+            '--engines',
+            type=str,
+            default=f'{PDFTemplate.Engine.WEASYPRINT},{PDFTemplate.Engine.REPORTLAB}',
+            help='計測する作成方式（カンマ区切り）',
+        )
+        parser.add_argument(
+            '--kind',
+            choices=WorksheetPDF.Kind.values,
+            default=WorksheetPDF.Kind.ANSWER_KEY,
+            help='計測するPDFの種類（既定: 解答用紙）',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='結果JSONの出力先（既定: benchmark_results/pdf_<コミット>.json）',
+        )
+
+    def handle(self, *args, **options):
+        import django
+        from concurrent.futures import ProcessPoolExecutor
+
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        engines = [engine.strip() for engine in options['engines'].split(',') if engine.strip()]
+        for engine in engines:
+            if engine not in (PDFTemplate.Engine.WEASYPRINT, PDFTemplate.Engine.REPORTLAB):
+                raise CommandError(f'不明な作成方式です: {engine}')
+
+        sample = self.load_sample_questions()
+        commit = self.current_commit()
+        report = {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'kind': options['kind'],
+            'results': [],
+        }
+        self.stdout.write(f'元にする問題: {len(sample)}問')
+
+        warmup = {engine: self.build_document(engine, sample, 5, options['kind']) for engine in engines}
+        for size in sizes:
+            self.stdout.write(f'\n=== {size}問 ===')
+            for engine in engines:
+                document = self.build_document(engine, sample, size, options['kind'])
+                # ピークRSSが前の計測の影響を受けないよう、計測ごとに新しいプロセスで実行する
+                with ProcessPoolExecutor(max_workers=1, initializer=django.setup) as executor:
+                    try:
+                        result = executor.submit(measure_render, engine, document, warmup[engine]).result()
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f'  {engine}: 計測できませんでした（{e}）'))
+                        report['results'].append({'questions': size, 'engine': engine, 'error': str(e)})
+                        continue
+                report['results'].append({'questions': size, 'engine': engine, **result})
+                self.stdout.write(
+                    f"  {engine}: {result['seconds']:.3f}秒, {result['pages']}ページ "
+                    f"({result['pages_per_sec']:.1f}ページ/秒), {result['pdf_kb']:.0f}KB, "
+                    f"ピークRSS +{result['peak_rss_delta_mb']:.1f}MB"
+                )
+
+        output_path = Path(options['output'] or (
+            Path(settings.BASE_DIR) / 'benchmark_results' / f'pdf_{commit[:8]}.json'
+        ))
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'\n結果を保存しました: {output_path}'))
+
+    def load_sample_questions(self):
+        """データベースの問題（なければ合成した問題）をPDFの問題の形式で読み込む"""
+        rows = list(Question.objects.order_by('id').values(
+            'question_type', 'text', 'correct_answer', 'accepted_alternatives', 'choices'
+        )[:1000])
+        if not rows:
+            rows = [{
+                'question_type': Question.QuestionType.TEXT,
+                'text': f'ベンチマーク用の問題文です。物質が酸素と結びつく化学変化を何というか。（{index}）',
+                'correct_answer': '酸化',
+                'accepted_alternatives': ['さんか'],
+                'choices': [],
+            } for index in range(1, 101)]
+        return [{
+            'is_choice': row['question_type'] == Question.QuestionType.CHOICE,
+            'text': row['text'],
+            'choices': row['choices'] or [],
+            'correct_answer': row['correct_answer'],
+            'alternatives': row['accepted_alternatives'] or [],
+        } for row in rows]
+
+    def build_document(self, engine, sample, size, kind):
+        """元の問題を繰り返して指定問題数の文書を作成（作成方式に応じてHTMLまたは問題の一覧）"""
+        questions = [
+            {**sample[index % len(sample)], 'number': index + 1, 'source_id': f'B{index + 1:07d}'}
+            for index in range(size)
+        ]
+        kind_label = WorksheetPDF.Kind(kind).label
+        context = {
+            'unit': f'ベンチマーク（{size}問）',
+            'title': f'ベンチマーク（{size}問）　{kind_label}',
+            'kind': kind,
+            'kind_label': kind_label,
+            'answer_key': kind == WorksheetPDF.Kind.ANSWER_KEY,
+            'questions': questions,
+            'generated_at': timezone.now(),
+        }
+        if engine == PDFTemplate.Engine.REPORTLAB:
+            return {key: context[key] for key in ('title', 'answer_key', 'questions')}
+        return render_worksheet_html(context)
+
+    def current_commit(self):
+        """現在のgitコミットハッシュ（取得できない場合はunknown）"""
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL
+            ).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown'
@@ -0,0 +1,71 @@
+import os
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from admin_panel.models import XLSMUpload
+from admin_panel.storage import compute_file_sha256, xlsm_storage
+
+
+class Command(BaseCommand):
+    help = '既存のXLSMアップロードを内容ハッシュのパスへ移し、重複ファイルを削除します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='実際の移動・削除を行わず、結果のみを表示',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        uploads = XLSMUpload.objects.filter(content_hash='').exclude(file='')
+
+        self.stdout.write(f'対象アップロード数: {uploads.count()}')
+
+        moved_count = 0
+        shared_count = 0
+        missing_count = 0
+        old_names = set()
+        seen_hashes = set()
+
+        for upload in uploads.iterator():
+            old_name = upload.file.name
+            if not default_storage.exists(old_name):
+                missing_count += 1
+                self.stdout.write(self.style.WARNING(f'アップロードID {upload.pk}: ファイルが見つかりません ({old_name})'))
+                continue
+
+            with default_storage.open(old_name, 'rb') as f:
+                content_hash = compute_file_sha256(f)
+                new_name = f'xlsm_files/{content_hash[:2]}/{content_hash}.xlsm'
+                already_stored = content_hash in seen_hashes or xlsm_storage.exists(new_name)
+                if not dry_run and not already_stored:
+                    xlsm_storage.save(new_name, f)
+
+            seen_hashes.add(content_hash)
+            if already_stored:
+                shared_count += 1
+            else:
+                moved_count += 1
+            self.stdout.write(f'アップロードID {upload.pk}: {old_name} → {new_name}')
+
+            if not dry_run:
+                upload.content_hash = content_hash
+                upload.original_filename = upload.original_filename or os.path.basename(old_name)
+                upload.file.name = new_name
+                upload.save(update_fields=['content_hash', 'original_filename', 'file'])
+            old_names.add(old_name)
+
+        # 移行した旧ファイルを削除
+        if not dry_run:
+            for old_name in old_names:
+                default_storage.delete(old_name)
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f'  新規保存: {moved_count}件')
+        self.stdout.write(f'  既存ファイルと共有: {shared_count}件')
+        self.stdout.write(f'  ファイルなし: {missing_count}件')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('\n※ ドライランモードです。実際の移動・削除は行われていません。'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n重複ファイルの整理が完了しました。'))
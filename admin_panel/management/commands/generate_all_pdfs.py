@@ -0,0 +1,163 @@
+import shutil
+import time
+import zipfile
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from admin_panel.models import PDFTemplate, WorksheetPDF
+from admin_panel.worksheets import claim_worksheet, get_worksheet, render_worksheets_parallel, worksheet_is_available
+from quiz_app.models import Subject, Unit
+
+# 他の処理で作成中のPDFの完了を確認する間隔（秒）。作成中のまま中断されたものは
+# WORKSHEET_STALE_SECONDSを過ぎると引き受けられるため、待つ時間はそれ以下で済む
+BUSY_POLL_SECONDS = 2.0
+
+
+class Command(BaseCommand):
+    help = '全単元（または教科・学年で絞り込んだ単元）の問題用紙・解答用紙のPDFを並列に作成し、ZIPにまとめます'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subject',
+            type=str,
+            help='教科コードで絞り込む（例: science）',
+        )
+        parser.add_argument(
+            '--grade',
+            type=str,
+            help='学年で絞り込む（例: 中1）',
+        )
+        parser.add_argument(
+            '--kind',
+            choices=WorksheetPDF.Kind.values + ['all'],
+            default='all',
+            help='作成するPDFの種類（既定: 問題用紙と解答用紙の両方）',
+        )
+        parser.add_argument(
+            '--template',
+            type=int,
+            default=None,
+            help='使用するPDFテンプレートのID（既定: 標準のレイアウト）',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='PDFの作成に使うワーカープロセス数（既定: CPUコア数）',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='出力するZIPファイルのパス（既定: worksheets_YYYYmmdd_HHMMSS.zip）',
+        )
+
+    def handle(self, *args, **options):
+        units = Unit.objects.select_related('subject').filter(question_count__gt=0)
+        if options['subject']:
+            if not Subject.objects.filter(code=options['subject']).exists():
+                raise CommandError(f"教科コード {options['subject']} が存在しません。")
+            units = units.filter(subject__code=options['subject'])
+        if options['grade']:
+            units = units.filter(grade_year=options['grade'])
+        units = list(units.order_by('subject__code', 'grade_year', 'category'))
+
+        template = None
+        if options['template'] is not None:
+            template = PDFTemplate.objects.filter(pk=options['template'], is_active=True).first()
+            if template is None:
+                raise CommandError(f"有効なPDFテンプレート（ID: {options['template']}）が存在しません。")
+
+        kinds = WorksheetPDF.Kind.values if options['kind'] == 'all' else [options['kind']]
+        output = options['output'] or f"worksheets_{timezone.localtime().strftime('%Y%m%d_%H%M%S')}.zip"
+
+        # 作成済みで内容が最新のPDFはそのまま使い、それ以外を作成する
+        current = []
+        outdated = []
+        for unit in units:
+            for kind in kinds:
+                worksheet = get_worksheet(unit, kind, template)
+                if worksheet_is_available(worksheet):
+                    current.append(worksheet)
+                else:
+                    outdated.append(worksheet)
+
+        self.stdout.write(f'対象単元数: {len(units)}')
+        self.stdout.write(f'作成済み（最新）: {len(current)}件 / 作成: {len(outdated)}件')
+
+        self.total = len(outdated)
+        self.rendered = 0
+        self.failed = 0
+        self.pages = 0
+        # PDFは1件ずつストレージからZIPに書き込み、まとめてメモリに載せない
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for worksheet in current:
+                self._write_entry(archive, worksheet)
+
+            started = time.perf_counter()
+            busy = []
+            self._render(archive, self._claim_lazily(outdated, busy), options['workers'])
+            # 他の処理で作成中のPDFは、完了を待つか（中断されていれば）引き受けて作成する
+            while busy:
+                self.stdout.write(f'他の処理で作成中のPDFを待っています: {len(busy)}件')
+                time.sleep(BUSY_POLL_SECONDS)
+                waiting = busy
+                busy = []
+                self._render(archive, self._claim_lazily(self._collect_finished(archive, waiting), busy), options['workers'])
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write('\n=== 作成結果 ===')
+        self.stdout.write(f'  作成: {self.rendered}件（{self.pages}ページ）')
+        self.stdout.write(f'  作成済みを再利用: {len(current)}件')
+        if self.failed:
+            self.stdout.write(self.style.ERROR(f'  失敗: {self.failed}件'))
+        if self.rendered:
+            self.stdout.write(f'  所要時間: {elapsed:.1f}秒（{self.pages / elapsed if elapsed else 0:.1f}ページ/秒）')
+        self.stdout.write(self.style.SUCCESS(f'\nZIPファイルを作成しました: {output}'))
+
+    def _claim_lazily(self, worksheets, busy):
+        """
+        ワーカーが空いてPDFを渡す直前に作成を引き受ける
+
+        最初にすべてを引き受けると、中断したときに多くのPDFが作成中のまま残るため。
+        他の処理が作成中で引き受けられなかったものはbusyに加える。
+        """
+        for worksheet in worksheets:
+            if claim_worksheet(worksheet):
+                yield worksheet
+            else:
+                busy.append(worksheet)
+
+    def _collect_finished(self, archive, worksheets):
+        """待っているPDFのうち、他の処理が作成を終えたものをZIPに書き込み、残りを返す"""
+        remaining = []
+        for worksheet in worksheets:
+            try:
+                worksheet.refresh_from_db()
+            except WorksheetPDF.DoesNotExist:
+                # 待っている間に内容が変わり、古いバージョンとして削除された
+                worksheet = get_worksheet(worksheet.unit, worksheet.kind, worksheet.template)
+            if worksheet_is_available(worksheet):
+                self._write_entry(archive, worksheet)
+            else:
+                remaining.append(worksheet)
+        return remaining
+
+    def _render(self, archive, worksheets, max_workers):
+        for worksheet, error in render_worksheets_parallel(worksheets, max_workers=max_workers):
+            if error:
+                self.failed += 1
+                self.stdout.write(self.style.ERROR(f'{worksheet.unit} {worksheet.get_kind_display()}: {error}'))
+                continue
+            self.rendered += 1
+            self.pages += worksheet.page_count
+            self._write_entry(archive, worksheet)
+            self.stdout.write(
+                f'[{self.rendered + self.failed}/{self.total}] {worksheet.unit} {worksheet.get_kind_display()}: '
+                f'{worksheet.page_count}ページ'
+            )
+
+    def _write_entry(self, archive, worksheet):
+        unit = worksheet.unit
+        name = f'{unit.subject.label_ja}/{unit.grade_year}/{unit.category}-{worksheet.get_kind_display()}.pdf'
+        with worksheet.file.open('rb') as src, archive.open(name, 'w', force_zip64=True) as dst:
+            shutil.copyfileobj(src, dst)
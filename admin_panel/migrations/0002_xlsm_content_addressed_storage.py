@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:13
+
+import admin_panel.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xlsmupload',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='内容ハッシュ（SHA-256）'),
+        ),
+        migrations.AddField(
+            model_name='xlsmupload',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='admin_panel.xlsmupload', verbose_name='同一内容の取込元'),
+        ),
+        migrations.AddField(
+            model_name='xlsmupload',
+            name='original_filename',
+            field=models.CharField(blank=True, max_length=255, verbose_name='元のファイル名'),
+        ),
+        migrations.AlterField(
+            model_name='xlsmupload',
+            name='file',
+            field=models.FileField(storage=admin_panel.storage.ContentAddressedStorage(), upload_to=admin_panel.storage.xlsm_upload_path, verbose_name='ファイル'),
+        ),
+        migrations.CreateModel(
+            name='XLSMParseResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='内容ハッシュ（SHA-256）')),
+                ('parser_version', models.PositiveIntegerField(verbose_name='解析処理バージョン')),
+                ('data', models.JSONField(default=list, verbose_name='解析データ')),
+                ('errors', models.JSONField(default=list, verbose_name='解析エラー')),
+                ('total_rows', models.PositiveIntegerField(default=0, verbose_name='データ件数')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='エラー件数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'XLSM解析結果',
+                'verbose_name_plural': 'XLSM解析結果',
+                'unique_together': {('content_hash', 'parser_version')},
+            },
+        ),
+    ]
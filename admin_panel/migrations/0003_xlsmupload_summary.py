@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0002_xlsm_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xlsmupload',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict, verbose_name='検証・差分サマリー'),
+        ),
+    ]
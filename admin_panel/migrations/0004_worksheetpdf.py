@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:03
+
+import admin_panel.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0003_xlsmupload_summary'),
+        ('quiz_app', '0012_homework_audience'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorksheetPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_version', models.CharField(max_length=40, verbose_name='単元の内容のバージョン')),
+                ('kind', models.CharField(choices=[('worksheet', '問題用紙'), ('answer_key', '解答用紙')], max_length=20, verbose_name='種類')),
+                ('status', models.CharField(choices=[('pending', '作成待ち'), ('rendering', '作成中'), ('completed', '完了'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='状態')),
+                ('file', models.FileField(blank=True, upload_to=admin_panel.storage.worksheet_pdf_path, verbose_name='PDFファイル')),
+                ('page_count', models.PositiveIntegerField(default=0, verbose_name='ページ数')),
+                ('error_message', models.TextField(blank=True, verbose_name='エラーメッセージ')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='作成開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='作成完了日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('template', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='worksheet_pdfs', to='admin_panel.pdftemplate', verbose_name='テンプレート')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='worksheet_pdfs', to='quiz_app.unit', verbose_name='単元')),
+            ],
+            options={
+                'verbose_name': '単元PDF',
+                'verbose_name_plural': '単元PDF',
+                'constraints': [models.UniqueConstraint(fields=('unit', 'content_version', 'template', 'kind'), name='unique_worksheet_pdf'), models.UniqueConstraint(condition=models.Q(('template__isnull', True)), fields=('unit', 'content_version', 'kind'), name='unique_default_worksheet_pdf')],
+            },
+        ),
+    ]
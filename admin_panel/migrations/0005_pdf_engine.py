@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0004_worksheetpdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdftemplate',
+            name='engine',
+            field=models.CharField(choices=[('auto', '自動（問題数で選択）'), ('weasyprint', 'WeasyPrint（HTMLテンプレート）'), ('reportlab', 'ReportLab（高速）')], default='auto', max_length=20, verbose_name='作成方式'),
+        ),
+        migrations.AddField(
+            model_name='worksheetpdf',
+            name='engine',
+            field=models.CharField(choices=[('auto', '自動（問題数で選択）'), ('weasyprint', 'WeasyPrint（HTMLテンプレート）'), ('reportlab', 'ReportLab（高速）')], default='weasyprint', max_length=20, verbose_name='作成方式'),
+        ),
+        migrations.AlterField(
+            model_name='pdftemplate',
+            name='template_file',
+            field=models.FileField(blank=True, help_text='Djangoテンプレート形式のHTML（WeasyPrintで使用）。空の場合は標準のレイアウト', upload_to='pdf_templates/', verbose_name='テンプレートファイル'),
+        ),
+    ]
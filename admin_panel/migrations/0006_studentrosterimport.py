@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0005_pdf_engine'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentRosterImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_filename', models.CharField(max_length=255, verbose_name='元のファイル名')),
+                ('status', models.CharField(choices=[('processing', '登録中'), ('completed', '完了'), ('failed', '失敗')], default='processing', max_length=20, verbose_name='状態')),
+                ('total_rows', models.PositiveIntegerField(default=0, verbose_name='名簿の人数')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='登録した人数')),
+                ('error_message', models.TextField(blank=True, verbose_name='エラーメッセージ')),
+                ('credentials', models.JSONField(blank=True, default=list, verbose_name='発行した初期パスワード')),
+                ('credentials_downloaded_at', models.DateTimeField(blank=True, null=True, verbose_name='初期パスワードのダウンロード日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='アップロード日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完了日時')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roster_imports', to=settings.AUTH_USER_MODEL, verbose_name='アップロード者')),
+            ],
+            options={
+                'verbose_name': '生徒名簿の一括登録',
+                'verbose_name_plural': '生徒名簿の一括登録',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0006_studentrosterimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentrosterimport',
+            name='credentials_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='初期パスワードのダウンロード期限'),
+        ),
+    ]
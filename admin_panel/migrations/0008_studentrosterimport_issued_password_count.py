@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0007_studentrosterimport_credentials_expires_at'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='studentrosterimport',
+            name='credentials',
+        ),
+        migrations.RemoveField(
+            model_name='studentrosterimport',
+            name='credentials_downloaded_at',
+        ),
+        migrations.RemoveField(
+            model_name='studentrosterimport',
+            name='credentials_expires_at',
+        ),
+        migrations.AddField(
+            model_name='studentrosterimport',
+            name='issued_password_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='発行した初期パスワードの人数'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0008_studentrosterimport_issued_password_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pdftemplate',
+            name='engine',
+            field=models.CharField(choices=[('auto', '自動（HTMLテンプレートはWeasyPrint、標準のレイアウトはReportLab）'), ('weasyprint', 'WeasyPrint（HTMLテンプレート）'), ('reportlab', 'ReportLab（高速）')], default='auto', max_length=20, verbose_name='作成方式'),
+        ),
+        migrations.AlterField(
+            model_name='worksheetpdf',
+            name='engine',
+            field=models.CharField(choices=[('auto', '自動（HTMLテンプレートはWeasyPrint、標準のレイアウトはReportLab）'), ('weasyprint', 'WeasyPrint（HTMLテンプレート）'), ('reportlab', 'ReportLab（高速）')], default='weasyprint', max_length=20, verbose_name='作成方式'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 import uuid
+from .storage import worksheet_pdf_path, xlsm_storage, xlsm_upload_path
 
 User = get_user_model()
 
@@ -24,7 +25,26 @@ class XLSMUpload(models.Model):
         choices=Subject.choices,
         verbose_name='教科'
     )
-    file = models.FileField(upload_to='xlsm_files/', verbose_name='ファイル')
+    file = models.FileField(
+        upload_to=xlsm_upload_path,
+        storage=xlsm_storage,
+        verbose_name='ファイル'
+    )
+    original_filename = models.CharField(max_length=255, blank=True, verbose_name='元のファイル名')
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name='内容ハッシュ（SHA-256）'
+    )
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates',
+        verbose_name='同一内容の取込元'
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='アップロード日時')
     processed_at = models.DateTimeField(null=True, blank=True, verbose_name='処理日時')
     status = models.CharField(
@@ -39,6 +59,8 @@ class XLSMUpload(models.Model):
         verbose_name='ステータス'
     )
     error_message = models.TextField(blank=True, verbose_name='エラーメッセージ')
+    # プレビュー時にバックグラウンドで計算する検証・差分結果
+    summary = models.JSONField(default=dict, blank=True, verbose_name='検証・差分サマリー')
     
     class Meta:
         verbose_name = 'XLSMアップロード'
@@ -48,6 +70,35 @@ class XLSMUpload(models.Model):
         return f"{self.get_subject_display()} - {self.uploaded_at.strftime('%Y-%m-%d %H:%M')}"
 
 
+class XLSMParseResult(models.Model):
+    """XLSM解析結果（内容ハッシュ単位のキャッシュ）"""
+    
+    content_hash = models.CharField(max_length=64, verbose_name='内容ハッシュ（SHA-256）')
+    parser_version = models.PositiveIntegerField(verbose_name='解析処理バージョン')
+    data = models.JSONField(default=list, verbose_name='解析データ')
+    errors = models.JSONField(default=list, verbose_name='解析エラー')
+    total_rows = models.PositiveIntegerField(default=0, verbose_name='データ件数')
+    error_count = models.PositiveIntegerField(default=0, verbose_name='エラー件数')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+    
+    class Meta:
+        verbose_name = 'XLSM解析結果'
+        verbose_name_plural = 'XLSM解析結果'
+        unique_together = ['content_hash', 'parser_version']
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]} - {self.total_rows}件"
+    
+    def as_result(self):
+        """process_xlsm_fileと同じ形式の辞書を返す"""
+        return {
+            'data': self.data,
+            'errors': self.errors,
+            'total_rows': self.total_rows,
+            'error_count': self.error_count
+        }
+
+
 class AnalyticsData(models.Model):
     """分析データ（キャッシュ用）"""
     
@@ -68,8 +119,24 @@ class AnalyticsData(models.Model):
 class PDFTemplate(models.Model):
     """PDFテンプレート"""
     
+    class Engine(models.TextChoices):
+        AUTO = 'auto', '自動（HTMLテンプレートはWeasyPrint、標準のレイアウトはReportLab）'
+        WEASYPRINT = 'weasyprint', 'WeasyPrint（HTMLテンプレート）'
+        REPORTLAB = 'reportlab', 'ReportLab（高速）'
+    
     name = models.CharField(max_length=100, verbose_name='テンプレート名')
-    template_file = models.FileField(upload_to='pdf_templates/', verbose_name='テンプレートファイル')
+    template_file = models.FileField(
+        upload_to='pdf_templates/',
+        blank=True,
+        verbose_name='テンプレートファイル',
+        help_text='Djangoテンプレート形式のHTML（WeasyPrintで使用）。空の場合は標準のレイアウト'
+    )
+    engine = models.CharField(
+        max_length=20,
+        choices=Engine.choices,
+        default=Engine.AUTO,
+        verbose_name='作成方式'
+    )
     is_active = models.BooleanField(default=True, verbose_name='有効')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
     
@@ -81,6 +148,116 @@ class PDFTemplate(models.Model):
         return self.name
 
 
+class WorksheetPDF(models.Model):
+    """
+    単元の問題用紙・解答用紙のPDF（作成済みファイルのキャッシュ）
+
+    (単元, 単元の内容のバージョン, テンプレート, 種類) ごとに1件。同じキーの作成は
+    状態を「作成中」に変える更新に成功した1つの処理だけが行う。
+    """
+    
+    class Kind(models.TextChoices):
+        WORKSHEET = 'worksheet', '問題用紙'
+        ANSWER_KEY = 'answer_key', '解答用紙'
+    
+    class Status(models.TextChoices):
+        PENDING = 'pending', '作成待ち'
+        RENDERING = 'rendering', '作成中'
+        COMPLETED = 'completed', '完了'
+        FAILED = 'failed', '失敗'
+    
+    unit = models.ForeignKey(
+        'quiz_app.Unit',
+        on_delete=models.CASCADE,
+        related_name='worksheet_pdfs',
+        verbose_name='単元'
+    )
+    content_version = models.CharField(max_length=40, verbose_name='単元の内容のバージョン')
+    template = models.ForeignKey(
+        PDFTemplate,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='worksheet_pdfs',
+        verbose_name='テンプレート'
+    )
+    kind = models.CharField(max_length=20, choices=Kind.choices, verbose_name='種類')
+    engine = models.CharField(
+        max_length=20,
+        choices=PDFTemplate.Engine.choices,
+        default=PDFTemplate.Engine.WEASYPRINT,
+        verbose_name='作成方式'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='状態'
+    )
+    file = models.FileField(upload_to=worksheet_pdf_path, blank=True, verbose_name='PDFファイル')
+    page_count = models.PositiveIntegerField(default=0, verbose_name='ページ数')
+    error_message = models.TextField(blank=True, verbose_name='エラーメッセージ')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='作成開始日時')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='作成完了日時')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+    
+    class Meta:
+        verbose_name = '単元PDF'
+        verbose_name_plural = '単元PDF'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unit', 'content_version', 'template', 'kind'],
+                name='unique_worksheet_pdf',
+            ),
+            # テンプレートなし（標準のレイアウト）はNULLが重複とみなされないため別に制約を設ける
+            models.UniqueConstraint(
+                fields=['unit', 'content_version', 'kind'],
+                condition=models.Q(template__isnull=True),
+                name='unique_default_worksheet_pdf',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.unit} - {self.get_kind_display()} - {self.get_status_display()}"
+
+
+class StudentRosterImport(models.Model):
+    """生徒名簿による一括登録の記録"""
+    
+    class Status(models.TextChoices):
+        PROCESSING = 'processing', '登録中'
+        COMPLETED = 'completed', '完了'
+        FAILED = 'failed', '失敗'
+    
+    uploaded_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='roster_imports',
+        verbose_name='アップロード者'
+    )
+    original_filename = models.CharField(max_length=255, verbose_name='元のファイル名')
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PROCESSING,
+        verbose_name='状態'
+    )
+    total_rows = models.PositiveIntegerField(default=0, verbose_name='名簿の人数')
+    created_count = models.PositiveIntegerField(default=0, verbose_name='登録した人数')
+    error_message = models.TextField(blank=True, verbose_name='エラーメッセージ')
+    # 初期パスワードは名簿のアップロードへの応答で1回だけ渡し、件数だけを記録する
+    issued_password_count = models.PositiveIntegerField(default=0, verbose_name='発行した初期パスワードの人数')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='アップロード日時')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完了日時')
+    
+    class Meta:
+        verbose_name = '生徒名簿の一括登録'
+        verbose_name_plural = '生徒名簿の一括登録'
+    
+    def __str__(self):
+        return f"{self.original_filename} ({self.get_status_display()})"
+
+
 class SystemLog(models.Model):
     """システムログ"""
     
@@ -0,0 +1,109 @@
+"""
+ReportLab（platypus）による問題用紙・解答用紙のPDF
+
+HTML/CSSのレイアウトを行わず、問題ごとの段落を直接組むため、問題数の多い単元でも
+WeasyPrintより高速に作成できる。日本語はReportLab組み込みのCIDフォント
+（HeiseiKakuGo-W5・HeiseiMin-W3）を登録して使い、行分割はCJKの規則で行う。
+
+プロセスプールのワーカーからも呼ばれるため、データベースには一切アクセスしない。
+"""
+import io
+from typing import Any, Dict, Tuple
+from xml.sax.saxutils import escape
+
+GOTHIC_FONT = 'HeiseiKakuGo-W5'
+MINCHO_FONT = 'HeiseiMin-W3'
+
+_fonts_registered = False
+
+
+def register_cjk_fonts() -> None:
+    """日本語のCIDフォントを登録（プロセスごとに1回）"""
+    global _fonts_registered
+    if _fonts_registered:
+        return
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+
+    pdfmetrics.registerFont(UnicodeCIDFont(GOTHIC_FONT))
+    pdfmetrics.registerFont(UnicodeCIDFont(MINCHO_FONT))
+    _fonts_registered = True
+
+
+def _styles() -> Dict[str, Any]:
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+
+    base = ParagraphStyle('worksheet', fontName=MINCHO_FONT, fontSize=10.5, leading=16, wordWrap='CJK')
+    return {
+        'title': ParagraphStyle('title', parent=base, fontName=GOTHIC_FONT, fontSize=15, leading=20),
+        'meta': ParagraphStyle('meta', parent=base, fontSize=9.5, spaceAfter=4 * mm),
+        # 番号を左に出し、2行目以降（選択肢・解答を含む）は字下げする。問題の途中で1行だけ次のページに送らない
+        'question': ParagraphStyle(
+            'question', parent=base, leftIndent=8 * mm, firstLineIndent=-8 * mm,
+            spaceAfter=3 * mm, allowWidows=0, allowOrphans=0,
+        ),
+    }
+
+
+def _text(value: Any) -> str:
+    """Paragraphのマークアップとして安全な文字列（改行は<br/>）"""
+    return escape(str(value)).replace('\n', '<br/>')
+
+
+def _question_markup(question: Dict[str, Any], answer_key: bool) -> str:
+    """
+    1問分の段落のマークアップ
+
+    問題文・選択肢・解答（解答欄）を1つの段落にまとめ、問題ごとの行分割を1回で済ませる。
+    """
+    lines = [f"<font name=\"{GOTHIC_FONT}\">({question['number']})</font>　{_text(question['text'])}"]
+    if question['is_choice'] and question['choices']:
+        lines.append('　　'.join(f'{index}. {_text(choice)}' for index, choice in enumerate(question['choices'], 1)))
+    if answer_key:
+        answer = f"<font name=\"{GOTHIC_FONT}\" color=\"#cc0000\">{_text(question['correct_answer'])}</font>"
+        if question['alternatives']:
+            answer += f"　<font size=\"9\" color=\"#555555\">（別解: {' / '.join(_text(a) for a in question['alternatives'])}）</font>"
+        lines.append(answer)
+    else:
+        lines.append('答え（' + '　' * 24 + '）')
+    return '<br/>'.join(lines)
+
+
+def render_reportlab_pdf(document: Dict[str, Any]) -> Tuple[bytes, int]:
+    """
+    問題用紙・解答用紙のPDF（PDFのバイト列とページ数）
+
+    documentはtitle・answer_key・questions（worksheet_contextの問題と同じ形式）を持つ辞書。
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    register_cjk_fonts()
+    styles = _styles()
+
+    def draw_page_number(canvas, doc):
+        canvas.saveState()
+        canvas.setFont(GOTHIC_FONT, 9)
+        canvas.drawCentredString(A4[0] / 2, 10 * mm, f'- {doc.page} -')
+        canvas.restoreState()
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        leftMargin=15 * mm,
+        rightMargin=15 * mm,
+        topMargin=18 * mm,
+        bottomMargin=18 * mm,
+        title=document['title'],
+    )
+    meta = f"全{len(document['questions'])}問"
+    if not document['answer_key']:
+        meta += '　　名前（　　　　　　　　　　　　）'
+    story = [Paragraph(_text(document['title']), styles['title']), Paragraph(meta, styles['meta'])]
+    for question in document['questions']:
+        story.append(Paragraph(_question_markup(question, document['answer_key']), styles['question']))
+    doc.build(story, onFirstPage=draw_page_number, onLaterPages=draw_page_number)
+    return buffer.getvalue(), doc.page
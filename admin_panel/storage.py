@@ -0,0 +1,74 @@
+import hashlib
+import os
+import tempfile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def compute_file_sha256(file) -> str:
+    """アップロードファイルのSHA-256ハッシュを計算（読み込み位置は先頭に戻す）"""
+    digest = hashlib.sha256()
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return digest.hexdigest()
+
+
+def xlsm_upload_path(instance, filename):
+    """XLSMファイルの保存先（内容のSHA-256ハッシュで決まるパス）"""
+    if not instance.content_hash:
+        instance.content_hash = compute_file_sha256(instance.file)
+    content_hash = instance.content_hash
+    return f'xlsm_files/{content_hash[:2]}/{content_hash}.xlsm'
+
+
+def worksheet_pdf_path(instance, filename):
+    """単元PDFの保存先（単元・内容のバージョン・テンプレート・種類で決まるパス）"""
+    template = instance.template_id or 'default'
+    return f'worksheets/{instance.unit_id}/{instance.kind}-{instance.content_version[:16]}-{template}.pdf'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    内容ハッシュをファイル名とするストレージ
+
+    同じ名前のファイルは同じ内容なので、既に存在する場合は書き込まずに
+    既存のファイルをそのまま参照する（Django標準のランダムな接尾辞を付けない）。
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # 一時ファイルに書き込んでから置き換える（同時アップロードでも壊れたファイルを残さない）
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        # 複数のアップロード記録が同じファイルを共有するため、個別には削除しない
+        pass
+
+
+xlsm_storage = ContentAddressedStorage()
@@ -1,3 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from quiz_app.models import Question, Subject, Unit
+from .models import PDFTemplate, StudentRosterImport, WorksheetPDF
+from .utils import fail_stale_roster_imports
+from .worksheets import WORKSHEET_STALE_SECONDS, claim_worksheet, get_worksheet, unit_content_version
 
-# Create your tests here.
+ROSTER_HEADER = '会員番号,都道府県,所属校,クラス,ニックネーム,学年,パスワード\n'
+
+
+def run_now(target, *args):
+    """start_backgroundの代わりに、処理をその場で実行する"""
+    target(*args)
+
+
+class StudentRosterImportTests(TestCase):
+    """名簿による一括登録（初期パスワードは応答で1回だけ渡し、保存しない）"""
+
+    def setUp(self):
+        # ログインユーザーのキャッシュを前のテストから引き継がない
+        cache.clear()
+        self.admin = User.objects.create_user(username='teacher', password='pass', role=User.Role.ADMIN)
+        self.client.force_login(self.admin)
+        self.url = reverse('admin_panel:student_import')
+
+    def upload(self, content):
+        roster = SimpleUploadedFile('roster.csv', content.encode('utf-8'), content_type='text/csv')
+        with mock.patch('admin_panel.utils.start_background', run_now):
+            return self.client.post(self.url, {'file': roster})
+
+    def test_initial_passwords_are_returned_once_and_not_stored(self):
+        response = self.upload(ROSTER_HEADER + '12345678,東京都,第一中,A,たろう,中1,\n')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = response.content.decode('utf-8-sig').splitlines()
+        self.assertEqual(len(rows), 2)
+        password = rows[1].split(',')[-1]
+        roster_import = StudentRosterImport.objects.get()
+        self.assertEqual(roster_import.status, StudentRosterImport.Status.COMPLETED)
+        self.assertEqual(roster_import.issued_password_count, 1)
+        self.assertNotIn(password, str(StudentRosterImport.objects.values().get()))
+        self.assertTrue(User.objects.get(username='12345678').check_password(password))
+
+    def test_roster_with_passwords_redirects(self):
+        response = self.upload(ROSTER_HEADER + '12345678,東京都,第一中,A,たろう,中1,secret123\n')
+
+        self.assertRedirects(response, self.url)
+        self.assertEqual(StudentRosterImport.objects.get().issued_password_count, 0)
+        self.assertTrue(User.objects.get(username='12345678').check_password('secret123'))
+
+    def test_interrupted_imports_are_failed(self):
+        stale = StudentRosterImport.objects.create(uploaded_by=self.admin, original_filename='old.csv', total_rows=1)
+        running = StudentRosterImport.objects.create(uploaded_by=self.admin, original_filename='new.csv', total_rows=1)
+        StudentRosterImport.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(fail_stale_roster_imports(), 1)
+
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.status, StudentRosterImport.Status.FAILED)
+        self.assertEqual(running.status, StudentRosterImport.Status.PROCESSING)
+
+
+class WorksheetTests(TestCase):
+    """単元のPDFの内容のバージョンと作成の引き受け"""
+
+    def setUp(self):
+        subject = Subject.objects.create(code=Subject.Code.SCIENCE, label_ja='理科')
+        self.unit = Unit.objects.create(subject=subject, grade_year='中1', category='化学')
+        self.questions = [
+            Question.objects.create(unit=self.unit, source_id=f'S{index}', text=f'問題{index}', correct_answer='正解')
+            for index in range(3)
+        ]
+
+    def version(self):
+        return unit_content_version(self.unit, PDFTemplate.Engine.REPORTLAB)
+
+    def test_version_changes_when_synced_rows_move_back_in_time(self):
+        before = self.version()
+        # Supabaseとの同期はリモートの（より古い）更新日時をそのまま書き込む
+        Question.objects.filter(pk=self.questions[0].pk).update(
+            text='同期で変更', updated_at=timezone.now() - timedelta(days=30)
+        )
+        self.assertNotEqual(self.version(), before)
+
+    def test_version_is_stable_without_changes(self):
+        self.assertEqual(self.version(), self.version())
+
+    def test_only_one_process_claims_a_worksheet(self):
+        worksheet = get_worksheet(self.unit, WorksheetPDF.Kind.WORKSHEET)
+
+        self.assertTrue(claim_worksheet(worksheet))
+        self.assertFalse(claim_worksheet(worksheet))
+
+        # 作成中のまま中断されたものは期限を過ぎれば引き受け直す
+        WorksheetPDF.objects.filter(pk=worksheet.pk).update(
+            started_at=timezone.now() - timedelta(seconds=WORKSHEET_STALE_SECONDS + 1)
+        )
+        self.assertTrue(claim_worksheet(worksheet))
+
+    def test_failed_worksheets_can_be_claimed_but_completed_ones_cannot(self):
+        worksheet = get_worksheet(self.unit, WorksheetPDF.Kind.ANSWER_KEY)
+        WorksheetPDF.objects.filter(pk=worksheet.pk).update(status=WorksheetPDF.Status.FAILED)
+        self.assertTrue(claim_worksheet(worksheet))
+
+        WorksheetPDF.objects.filter(pk=worksheet.pk).update(status=WorksheetPDF.Status.COMPLETED)
+        self.assertFalse(claim_worksheet(worksheet))
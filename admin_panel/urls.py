@@ -13,6 +13,9 @@ urlpatterns = [
     path('upload/preview/<int:upload_id>/', views.XLSMPreviewView.as_view(), name='upload_preview'),
     path('upload/confirm/<int:upload_id>/', views.XLSMConfirmView.as_view(), name='upload_confirm'),
     
+    # キャッシュの監視
+    path('cache-stats/', views.CacheStatsView.as_view(), name='cache_stats'),
+    
     # 問題管理
     path('questions/', views.QuestionListView.as_view(), name='questions'),
     path('questions/<int:pk>/edit/', views.QuestionEditView.as_view(), name='question_edit'),
@@ -23,11 +26,17 @@ urlpatterns = [
     path('analytics/class/<int:pk>/', views.ClassAnalyticsView.as_view(), name='class_analytics'),
     
     # PDF生成
+    path('pdf/', views.PDFUnitListView.as_view(), name='pdf_units'),
     path('pdf/generate/<int:pk>/', views.PDFGenerateView.as_view(), name='pdf_generate'),
+    path('pdf/download/<int:pk>/', views.PDFDownloadView.as_view(), name='pdf_download'),
+    
+    # 生徒の一括登録
+    path('students/import/', views.StudentRosterImportView.as_view(), name='student_import'),
     
     # 宿題管理
     path('homework/', views.HomeworkListView.as_view(), name='homework_list'),
     path('homework/create/', views.HomeworkCreateView.as_view(), name='homework_create'),
+    path('homework/dashboard/', views.HomeworkDashboardView.as_view(), name='homework_dashboard'),
     path('homework/<int:pk>/edit/', views.HomeworkEditView.as_view(), name='homework_edit'),
     path('homework/<int:pk>/delete/', views.HomeworkDeleteView.as_view(), name='homework_delete'),
 ]
@@ -0,0 +1,274 @@
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from django.db import IntegrityError
+from django.utils import timezone
+from .models import XLSMUpload, XLSMParseResult
+
+logger = logging.getLogger(__name__)
+
+# プレビューで表示する先頭行数
+PREVIEW_ROW_LIMIT = 20
+
+# サマリーに保存するエラーの最大件数
+SUMMARY_ERROR_LIMIT = 50
+
+# この時間を過ぎても計算中のままのサマリーは中断されたものとみなす（秒）
+SUMMARY_STALE_SECONDS = 600
+
+# この時間を過ぎても登録中のままの一括登録は中断されたものとみなす（秒）
+ROSTER_STALE_SECONDS = 30 * 60
+
+
+def find_previous_import(upload: XLSMUpload) -> Optional[XLSMUpload]:
+    """同じ内容・同じ教科で取込が完了している過去のアップロードを探す"""
+    if not upload.content_hash:
+        return None
+    return XLSMUpload.objects.filter(
+        content_hash=upload.content_hash,
+        subject=upload.subject,
+        status='completed',
+        duplicate_of__isnull=True,
+    ).exclude(pk=upload.pk).order_by('-processed_at').first()
+
+
+def get_cached_parse_result(content_hash: str) -> Optional[XLSMParseResult]:
+    """内容ハッシュに対応する解析結果キャッシュを取得"""
+    from quiz_app.utils import XLSM_PARSER_VERSION
+
+    if not content_hash:
+        return None
+    return XLSMParseResult.objects.filter(
+        content_hash=content_hash,
+        parser_version=XLSM_PARSER_VERSION,
+    ).first()
+
+
+def get_or_parse_xlsm(upload: XLSMUpload) -> Dict[str, Any]:
+    """
+    アップロードの解析結果を取得する
+
+    同じ内容のファイルは一度だけ解析し、結果をXLSMParseResultに保存する。
+    再取込やプレビューではスプレッドシートを読み直さない。
+    """
+    from quiz_app.utils import process_xlsm_file, XLSM_PARSER_VERSION
+
+    cached = get_cached_parse_result(upload.content_hash)
+    if cached is not None:
+        return cached.as_result()
+
+    result = process_xlsm_file(upload.file.path, upload.subject)
+
+    # ファイル読み込み自体に失敗した場合はキャッシュしない
+    read_failed = any(error.startswith('ファイル読み込みエラー') for error in result['errors'])
+    if upload.content_hash and not read_failed:
+        try:
+            XLSMParseResult.objects.create(
+                content_hash=upload.content_hash,
+                parser_version=XLSM_PARSER_VERSION,
+                data=result['data'],
+                errors=result['errors'],
+                total_rows=result['total_rows'],
+                error_count=result['error_count'],
+            )
+        except IntegrityError:
+            # 同時に解析した別スレッドが先に保存した
+            pass
+
+    return result
+
+
+def reuse_previous_import(upload: XLSMUpload, previous: XLSMUpload) -> None:
+    """同一内容の再アップロードを前回の取込結果で完了扱いにする"""
+    upload.duplicate_of = previous
+    upload.status = 'completed'
+    upload.error_message = (
+        f'同一内容のファイルを取込済みのため、前回の取込結果を再利用しました'
+        f'（{timezone.localtime(previous.processed_at):%Y-%m-%d %H:%M}）\n'
+        f'{previous.error_message}'
+    )
+    upload.processed_at = timezone.now()
+    upload.save(update_fields=['duplicate_of', 'status', 'error_message', 'processed_at'])
+
+
+def run_xlsm_import(upload: XLSMUpload) -> None:
+    """アップロードされたXLSMファイルを解析してデータベースに保存"""
+    from quiz_app.utils import save_questions_from_xlsm_data
+
+    try:
+        result = get_or_parse_xlsm(upload)
+        logger.info(f"XLSM解析結果 - アップロードID: {upload.pk}, データ数: {result['total_rows']}, エラー数: {result['error_count']}")
+
+        if result['error_count'] > 0:
+            # エラーがある場合
+            upload.status = 'failed'
+            upload.error_message = '\n'.join(result['errors'][:10])
+        else:
+            # データベースに保存
+            save_result = save_questions_from_xlsm_data(result['data'], upload.subject)
+            logger.info(f"XLSM保存結果 - 新規: {save_result['saved_count']}, 更新: {save_result['updated_count']}")
+
+            if save_result['errors']:
+                upload.status = 'failed'
+                upload.error_message = '\n'.join(save_result['errors'][:10])
+            else:
+                upload.status = 'completed'
+                upload.error_message = f'新規: {save_result["saved_count"]}件, 更新: {save_result["updated_count"]}件'
+
+    except Exception as e:
+        logger.exception(f"XLSM取込エラー - アップロードID: {upload.pk}")
+        upload.status = 'failed'
+        upload.error_message = str(e)
+
+    upload.processed_at = timezone.now()
+    upload.save(update_fields=['status', 'error_message', 'processed_at'])
+
+    if upload.status == 'completed':
+        # 公開ページ（静的HTML）を書き出し直す
+        from quiz_app.static_catalog import refresh_static_catalog
+        refresh_static_catalog()
+
+
+def run_roster_import(roster_import_id: int, rows: List[Dict[str, str]]) -> None:
+    """
+    検証済みの名簿の生徒アカウントを一括作成（バックグラウンド処理）
+
+    初期パスワードは呼び出し元で発行済み（rowsのパスワード）で、ここではハッシュ化して保存するだけ。
+    """
+    from accounts.roster import provision_students
+    from .models import StudentRosterImport
+
+    roster_import = StudentRosterImport.objects.get(pk=roster_import_id)
+    try:
+        result = provision_students(rows)
+        roster_import.status = StudentRosterImport.Status.COMPLETED
+        roster_import.created_count = result['created_count']
+        logger.info(f"生徒名簿の一括登録 - ID: {roster_import_id}, 登録: {result['created_count']}人")
+    except Exception as e:
+        logger.exception(f"生徒名簿の一括登録エラー - ID: {roster_import_id}")
+        roster_import.status = StudentRosterImport.Status.FAILED
+        roster_import.error_message = str(e)
+
+    roster_import.finished_at = timezone.now()
+    roster_import.save(update_fields=['status', 'created_count', 'error_message', 'finished_at'])
+
+
+def fail_stale_roster_imports() -> int:
+    """
+    登録中のまま中断された一括登録を失敗にする（失敗にした件数）
+
+    アカウントの作成は1つのトランザクションで行うため、中断された一括登録では1人も登録されていない。
+    """
+    from .models import StudentRosterImport
+
+    return StudentRosterImport.objects.filter(
+        status=StudentRosterImport.Status.PROCESSING,
+        created_at__lt=timezone.now() - timedelta(seconds=ROSTER_STALE_SECONDS),
+    ).update(
+        status=StudentRosterImport.Status.FAILED,
+        error_message='登録が中断されました。名簿をもう一度アップロードしてください。',
+        finished_at=timezone.now(),
+    )
+
+
+def _normalize_for_diff(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """差分比較用に値を正規化（選択肢は取込時にシャッフルされるため順序を無視）"""
+    normalized = dict(fields)
+    normalized['choices'] = sorted(str(choice) for choice in (fields.get('choices') or []))
+    normalized['accepted_alternatives'] = list(fields.get('accepted_alternatives') or [])
+    return normalized
+
+
+def compute_import_diff(data, subject_code: str) -> Dict[str, Any]:
+    """取込データと現在のデータベースとの差分件数を計算"""
+    from quiz_app.models import Question, Unit
+    from quiz_app.utils import QUESTION_IMPORT_FIELDS, _question_fields_from_item
+
+    existing_units = set(
+        Unit.objects.filter(subject__code=subject_code).values_list('grade_year', 'category')
+    )
+    existing_questions = {
+        (row['unit__grade_year'], row['unit__category'], row['source_id']): row
+        for row in Question.objects.filter(unit__subject__code=subject_code).values(
+            'unit__grade_year', 'unit__category', 'source_id', *QUESTION_IMPORT_FIELDS
+        )
+    }
+
+    new_count = 0
+    updated_count = 0
+    unchanged_count = 0
+    new_units = set()
+    seen_keys = set()
+
+    for item in data:
+        unit_key = (item['grade'], item['category'])
+        if unit_key not in existing_units:
+            new_units.add(unit_key)
+        key = (item['grade'], item['category'], item['source_id'])
+        seen_keys.add(key)
+        current = existing_questions.get(key)
+        if current is None:
+            new_count += 1
+            continue
+        incoming = _normalize_for_diff(_question_fields_from_item(item))
+        current = _normalize_for_diff({field: current[field] for field in QUESTION_IMPORT_FIELDS})
+        if incoming == current:
+            unchanged_count += 1
+        else:
+            updated_count += 1
+
+    return {
+        'new_count': new_count,
+        'updated_count': updated_count,
+        'unchanged_count': unchanged_count,
+        # ファイルに含まれない既存問題（取込時に別解がクリアされる）
+        'untouched_count': len(set(existing_questions) - seen_keys),
+        'new_units': [f'{grade} {category}' for grade, category in sorted(new_units)],
+    }
+
+
+def summary_is_stale(summary: Dict[str, Any]) -> bool:
+    """サマリーが未計算、または計算中のまま中断されているか"""
+    from datetime import datetime
+
+    if not summary:
+        return True
+    if summary.get('state') != 'running':
+        return False
+    started_at = summary.get('started_at')
+    if not started_at:
+        return False
+    elapsed = timezone.now() - datetime.fromisoformat(started_at)
+    return elapsed.total_seconds() > SUMMARY_STALE_SECONDS
+
+
+def build_import_summary(upload: XLSMUpload) -> None:
+    """全行の解析・検証と差分計算を行い、結果をupload.summaryに保存（バックグラウンド処理）"""
+    upload.summary = {'state': 'running', 'started_at': timezone.now().isoformat()}
+    upload.save(update_fields=['summary'])
+
+    try:
+        result = get_or_parse_xlsm(upload)
+        summary = {
+            'state': 'ready',
+            'total_rows': result['total_rows'],
+            'error_count': result['error_count'],
+            'errors': result['errors'][:SUMMARY_ERROR_LIMIT],
+        }
+        summary.update(compute_import_diff(result['data'], upload.subject))
+    except Exception as e:
+        logger.exception(f"XLSMプレビュー集計エラー - アップロードID: {upload.pk}")
+        summary = {'state': 'failed', 'error': str(e)}
+
+    summary['computed_at'] = timezone.now().isoformat()
+    upload.summary = summary
+    upload.save(update_fields=['summary'])
+
+
+def start_background(target, *args) -> None:
+    """処理をデーモンスレッドで開始"""
+    import threading
+
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
@@ -1,14 +1,18 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.views.generic import ListView, DetailView, TemplateView, CreateView, UpdateView, DeleteView
+from django.views.generic import View, ListView, DetailView, TemplateView, CreateView, UpdateView, DeleteView, FormView
 from django.contrib import messages
-from django.urls import reverse_lazy
-from django.http import JsonResponse
-from django.db.models import Q, Count, Avg
-from .models import XLSMUpload, AnalyticsData, PDFTemplate, SystemLog
-from .forms import XLSMUploadForm, QuestionForm, HomeworkForm
-from quiz_app.models import Question, Unit, Homework
+from django.urls import reverse, reverse_lazy
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.db.models import Q, Count, Avg, Sum, Case, When, Value, IntegerField
+from .models import XLSMUpload, AnalyticsData, PDFTemplate, SystemLog, StudentRosterImport, WorksheetPDF
+from .forms import XLSMUploadForm, QuestionForm, HomeworkForm, StudentRosterForm
+from quiz_app.models import Subject, Question, Unit, Homework
+from quiz_app.catalog_cache import catalog_cache_stats
+from quiz_app.search import SEARCH_CANDIDATE_WINDOW, SEARCH_RESULT_LIMIT, search_question_ids
+from quiz_app.pagination import KeysetPaginationMixin
+from quiz_app.homework_progress import homework_matrix
 
 
 def admin_required(user):
@@ -34,8 +38,10 @@ class AdminHomeView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
         from accounts.models import StudentProfile
         from quiz_app.models import QuizAttempt
         
-        context['total_questions'] = Question.objects.count()
-        context['total_units'] = Unit.objects.count()
+        # 教科ごとの単元数・問題数（カウンター）を合計
+        totals = Subject.objects.aggregate(units=Sum('unit_count'), questions=Sum('question_count'))
+        context['total_questions'] = totals['questions'] or 0
+        context['total_units'] = totals['units'] or 0
         context['total_students'] = StudentProfile.objects.count()
         context['recent_uploads'] = XLSMUpload.objects.order_by('-uploaded_at')[:5]
         context['recent_logs'] = SystemLog.objects.order_by('-created_at')[:5]
@@ -59,63 +65,30 @@ class XLSMUploadView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     success_url = reverse_lazy('admin_panel:home')
     
     def form_valid(self, form):
-        form.instance.uploaded_by = self.request.user
-        form.instance.status = 'processing'
-        response = super().form_valid(form)
+        from django.utils import timezone
+        from .storage import compute_file_sha256
+        from .utils import find_previous_import, reuse_previous_import, build_import_summary, start_background
         
-        # バックグラウンドで処理を実行
-        import threading
+        uploaded_file = form.cleaned_data['file']
+        form.instance.uploaded_by = self.request.user
+        form.instance.original_filename = uploaded_file.name
+        form.instance.content_hash = compute_file_sha256(uploaded_file)
+        form.instance.status = 'pending'
+        form.instance.summary = {'state': 'running', 'started_at': timezone.now().isoformat()}
+        self.object = form.save()
         
-        def process_file():
-            try:
-                from quiz_app.utils import process_xlsm_file, save_questions_from_xlsm_data
-                from django.utils import timezone
-                
-                # ファイルパスを取得
-                file_path = form.instance.file.path
-                print(f"DEBUG: ファイルパス: {file_path}")
-                
-                # ファイルを処理
-                result = process_xlsm_file(file_path, form.instance.subject)
-                print(f"DEBUG: 処理結果 - データ数: {result['total_rows']}, エラー数: {result['error_count']}")
-                
-                if result['error_count'] > 0:
-                    # エラーがある場合
-                    form.instance.status = 'failed'
-                    form.instance.error_message = '\n'.join(result['errors'][:10])
-                    form.instance.processed_at = timezone.now()
-                    form.instance.save()
-                else:
-                    # データベースに保存
-                    save_result = save_questions_from_xlsm_data(result['data'], form.instance.subject)
-                    print(f"DEBUG: 保存結果 - 新規: {save_result['saved_count']}, 更新: {save_result['updated_count']}")
-                    
-                    if save_result['errors']:
-                        form.instance.status = 'failed'
-                        form.instance.error_message = '\n'.join(save_result['errors'][:10])
-                    else:
-                        form.instance.status = 'completed'
-                        form.instance.error_message = f'新規: {save_result["saved_count"]}件, 更新: {save_result["updated_count"]}件'
-                    
-                    form.instance.processed_at = timezone.now()
-                    form.instance.save()
-                
-            except Exception as e:
-                print(f"DEBUG: 例外発生: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                form.instance.status = 'failed'
-                form.instance.error_message = str(e)
-                form.instance.processed_at = timezone.now()
-                form.instance.save()
+        # 同一内容のファイルが取込済みなら解析・保存をせずに前回の結果を再利用
+        previous = find_previous_import(self.object)
+        if previous is not None:
+            reuse_previous_import(self.object, previous)
+            messages.info(self.request, '同じ内容のファイルが取込済みのため、前回の取込結果を再利用しました。')
+            return redirect('admin_panel:upload_status')
         
-        # バックグラウンドスレッドで処理を開始
-        thread = threading.Thread(target=process_file)
-        thread.daemon = True
-        thread.start()
+        # 全行の検証と差分計算はバックグラウンドで行い、すぐにプレビューを表示する
+        start_background(build_import_summary, self.object)
         
-        messages.success(self.request, 'ファイルがアップロードされました。処理中です。')
-        return response
+        messages.success(self.request, 'ファイルがアップロードされました。内容を確認して取込を確定してください。')
+        return redirect('admin_panel:upload_preview', upload_id=self.object.pk)
 
 
 class XLSMPreviewView(LoginRequiredMixin, AdminRequiredMixin, DetailView):
@@ -123,11 +96,42 @@ class XLSMPreviewView(LoginRequiredMixin, AdminRequiredMixin, DetailView):
     model = XLSMUpload
     template_name = 'admin_panel/upload_preview.html'
     context_object_name = 'upload'
+    pk_url_kwarg = 'upload_id'
     
     def get_context_data(self, **kwargs):
+        from quiz_app.utils import preview_xlsm_file
+        from django.utils import timezone
+        from .utils import PREVIEW_ROW_LIMIT, get_cached_parse_result, build_import_summary, start_background, summary_is_stale
+        
         context = super().get_context_data(**kwargs)
-        # ここでXLSMファイルの内容を解析してプレビューを表示
-        # 実際の実装ではopenpyxlを使用してファイルを読み込む
+        upload = self.object
+        
+        # 先頭行の表示（解析済みならキャッシュから、未解析ならストリーミングで先頭だけ読む）
+        cached = get_cached_parse_result(upload.content_hash)
+        if cached is not None:
+            context['preview_rows'] = cached.data[:PREVIEW_ROW_LIMIT]
+            context['preview_errors'] = []
+            context['estimated_total_rows'] = cached.total_rows
+        else:
+            preview = preview_xlsm_file(upload.file.path, PREVIEW_ROW_LIMIT)
+            context['preview_rows'] = preview['rows']
+            context['preview_errors'] = preview['errors']
+            context['estimated_total_rows'] = preview['estimated_total_rows']
+        
+        # 全体の検証・差分はバックグラウンドで計算（サーバー再起動などで中断していれば再開）
+        if upload.status == 'pending' and summary_is_stale(upload.summary):
+            upload.summary = {'state': 'running', 'started_at': timezone.now().isoformat()}
+            upload.save(update_fields=['summary'])
+            start_background(build_import_summary, upload)
+        
+        summary = upload.summary or {}
+        context['summary'] = summary
+        context['summary_running'] = summary.get('state') == 'running'
+        context['can_confirm'] = (
+            upload.status == 'pending'
+            and summary.get('state') == 'ready'
+            and summary.get('error_count') == 0
+        )
         return context
 
 
@@ -136,15 +140,39 @@ class XLSMConfirmView(LoginRequiredMixin, AdminRequiredMixin, DetailView):
     model = XLSMUpload
     template_name = 'admin_panel/upload_confirm.html'
     context_object_name = 'upload'
+    pk_url_kwarg = 'upload_id'
+    
+    def get(self, request, *args, **kwargs):
+        return redirect('admin_panel:upload_preview', upload_id=self.kwargs['upload_id'])
     
     def post(self, request, *args, **kwargs):
+        from .utils import run_xlsm_import, start_background
+        
         upload = self.get_object()
-        # ここでXLSMファイルの内容をデータベースに保存
-        # 実際の実装ではopenpyxlを使用してファイルを読み込み、Questionモデルに保存
-        upload.status = 'completed'
-        upload.save()
-        messages.success(request, 'データが正常に保存されました。')
-        return redirect('admin_panel:home')
+        summary = upload.summary or {}
+        
+        if upload.status != 'pending':
+            messages.error(request, 'このアップロードは既に処理されています。')
+            return redirect('admin_panel:upload_status')
+        if summary.get('state') != 'ready':
+            messages.error(request, '内容の検証が完了していません。しばらくしてから再度お試しください。')
+            return redirect('admin_panel:upload_preview', upload_id=upload.pk)
+        if summary.get('error_count'):
+            messages.error(request, 'エラーのある行があるため取り込めません。ファイルを修正して再度アップロードしてください。')
+            return redirect('admin_panel:upload_preview', upload_id=upload.pk)
+        
+        # 確定は1回だけ（同時に送信された確定で取込を二重に実行しないよう、状態を条件付きで更新する）
+        claimed = XLSMUpload.objects.filter(pk=upload.pk, status='pending').update(status='processing')
+        if not claimed:
+            messages.error(request, 'このアップロードは既に処理されています。')
+            return redirect('admin_panel:upload_status')
+        upload.status = 'processing'
+        
+        # プレビュー時に解析済みの結果（XLSMParseResult）を使って保存する
+        start_background(run_xlsm_import, upload)
+        
+        messages.success(request, '取込を開始しました。')
+        return redirect('admin_panel:upload_status')
 
 
 class UploadStatusView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
@@ -157,23 +185,58 @@ class UploadStatusView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
         return context
 
 
-class QuestionListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
-    """問題一覧"""
+class CacheStatsView(LoginRequiredMixin, AdminRequiredMixin, View):
+    """表示データのキャッシュのヒット率（監視用のJSON）"""
+    
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(catalog_cache_stats())
+
+
+class QuestionListView(LoginRequiredMixin, AdminRequiredMixin, KeysetPaginationMixin, ListView):
+    """問題一覧（新しい順、カーソル方式のページ分割）"""
     model = Question
     template_name = 'admin_panel/questions.html'
     context_object_name = 'questions'
     paginate_by = 20
+
+    def use_keyset_pagination(self):
+        # 検索結果は順位順に並べるため、ページ番号方式にする（最大SEARCH_RESULT_LIMIT件）
+        return not self.request.GET.get('search')
     
+    # 検索結果が上限で打ち切られたか（get_querysetで設定）
+    search_truncated = False
+
     def get_queryset(self):
         queryset = Question.objects.select_related('unit').all()
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(text__icontains=search) |
-                Q(unit__category__icontains=search) |
-                Q(unit__grade_year__icontains=search)
+            # 全文検索索引で順位付けした問題ID（索引に対応していないデータベースではNone）。
+            # 上限を超えたかを知るため、1件多く取得する
+            question_ids = search_question_ids(search, limit=SEARCH_RESULT_LIMIT + 1)
+            if question_ids is not None and len(question_ids) > SEARCH_RESULT_LIMIT:
+                self.search_truncated = True
+                question_ids = question_ids[:SEARCH_RESULT_LIMIT]
+            if question_ids is None:
+                return queryset.filter(
+                    Q(text__icontains=search) |
+                    Q(unit__category__icontains=search) |
+                    Q(unit__grade_year__icontains=search)
+                ).order_by('-created_at')
+            if not question_ids:
+                return queryset.none()
+            ranking = Case(
+                *[When(pk=question_id, then=Value(rank)) for rank, question_id in enumerate(question_ids)],
+                output_field=IntegerField(),
             )
-        return queryset.order_by('-created_at')
+            return queryset.filter(pk__in=question_ids).order_by(ranking)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['search_truncated'] = self.search_truncated
+        context['search_result_limit'] = SEARCH_RESULT_LIMIT
+        context['search_candidate_window'] = SEARCH_CANDIDATE_WINDOW
+        return context
 
 
 class QuestionEditView(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
@@ -236,25 +299,112 @@ class ClassAnalyticsView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
         return context
 
 
+class PDFUnitListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
+    """PDFを作成する単元の一覧"""
+    template_name = 'admin_panel/pdf_units.html'
+    context_object_name = 'units'
+    
+    def get_queryset(self):
+        return Unit.objects.select_related('subject').order_by('subject__code', 'grade_year', 'category')
+
+
 class PDFGenerateView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
-    """PDF生成"""
+    """単元の問題用紙・解答用紙のPDF生成"""
     template_name = 'admin_panel/pdf_generate.html'
     
+    def get_unit(self):
+        return get_object_or_404(Unit.objects.select_related('subject'), pk=self.kwargs['pk'])
+    
+    def get_pdf_template(self, value):
+        if not value:
+            return None
+        return get_object_or_404(PDFTemplate, pk=value, is_active=True)
+    
     def get_context_data(self, **kwargs):
+        from .worksheets import get_worksheet
+        
         context = super().get_context_data(**kwargs)
-        unit_id = self.kwargs['unit_id']
-        unit = get_object_or_404(Unit, id=unit_id)
+        unit = self.get_unit()
+        pdf_template = self.get_pdf_template(self.request.GET.get('template'))
+        worksheets = [get_worksheet(unit, kind, pdf_template) for kind in WorksheetPDF.Kind.values]
         context['unit'] = unit
+        context['pdf_template'] = pdf_template
+        context['pdf_templates'] = PDFTemplate.objects.filter(is_active=True).order_by('name')
+        context['worksheets'] = worksheets
+        context['rendering'] = any(w.status == WorksheetPDF.Status.RENDERING for w in worksheets)
         return context
     
     def post(self, request, *args, **kwargs):
-        unit_id = self.kwargs['unit_id']
-        unit = get_object_or_404(Unit, id=unit_id)
+        from .worksheets import request_worksheet
         
-        # PDF生成処理（実際の実装ではWeasyPrintを使用）
-        # ここでは簡易的に成功メッセージを表示
-        messages.success(request, f'{unit}のPDFが生成されました。')
-        return redirect('admin_panel:home')
+        unit = self.get_unit()
+        pdf_template = self.get_pdf_template(request.POST.get('template'))
+        worksheets = [request_worksheet(unit, kind, pdf_template) for kind in WorksheetPDF.Kind.values]
+        if all(w.status == WorksheetPDF.Status.COMPLETED for w in worksheets):
+            messages.success(request, f'{unit}のPDFは作成済みです。')
+        else:
+            messages.info(request, f'{unit}のPDFを作成しています。完了するとダウンロードできます。')
+        
+        url = reverse('admin_panel:pdf_generate', args=[unit.pk])
+        if pdf_template is not None:
+            url += f'?template={pdf_template.pk}'
+        return redirect(url)
+
+
+class PDFDownloadView(LoginRequiredMixin, AdminRequiredMixin, View):
+    """作成済みのPDFのダウンロード"""
+    
+    def get(self, request, pk):
+        worksheet = get_object_or_404(
+            WorksheetPDF.objects.select_related('unit__subject'),
+            pk=pk,
+            status=WorksheetPDF.Status.COMPLETED,
+        )
+        filename = f'{worksheet.unit}-{worksheet.get_kind_display()}.pdf'.replace(' ', '')
+        return FileResponse(worksheet.file.open('rb'), as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+class StudentRosterImportView(LoginRequiredMixin, AdminRequiredMixin, FormView):
+    """
+    生徒名簿による生徒アカウントの一括登録
+
+    初期パスワードはアップロードへの応答（CSV）で1回だけ渡し、データベースには保存しない。
+    """
+    template_name = 'admin_panel/student_import.html'
+    form_class = StudentRosterForm
+    success_url = reverse_lazy('admin_panel:student_import')
+    
+    def get_context_data(self, **kwargs):
+        from .utils import fail_stale_roster_imports
+        
+        context = super().get_context_data(**kwargs)
+        fail_stale_roster_imports()
+        imports = list(StudentRosterImport.objects.filter(uploaded_by=self.request.user).order_by('-created_at')[:10])
+        context['imports'] = imports
+        context['processing'] = any(item.status == StudentRosterImport.Status.PROCESSING for item in imports)
+        return context
+    
+    def form_valid(self, form):
+        from accounts.roster import credentials_csv, issue_initial_passwords
+        from .utils import run_roster_import, start_background
+        
+        rows = form.roster_rows
+        credentials = issue_initial_passwords(rows)
+        roster_import = StudentRosterImport.objects.create(
+            uploaded_by=self.request.user,
+            original_filename=form.cleaned_data['file'].name,
+            total_rows=len(rows),
+            issued_password_count=len(credentials),
+        )
+        # パスワードのハッシュ化に時間がかかるため、登録はバックグラウンドで行う
+        start_background(run_roster_import, roster_import.pk, rows)
+        messages.info(self.request, f'{len(rows)}人の生徒アカウントを登録しています。')
+        if not credentials:
+            return super().form_valid(form)
+        
+        response = HttpResponse(credentials_csv(credentials), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="initial_passwords_{roster_import.pk}.csv"'
+        return response
 
 
 class HomeworkListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
@@ -267,6 +417,25 @@ class HomeworkListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
         return Homework.objects.filter(created_by=self.request.user).order_by('-created_at')
 
 
+class HomeworkDashboardView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
+    """宿題の提出状況（生徒 × 公開中の宿題）"""
+    template_name = 'admin_panel/homework_dashboard.html'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        homeworks = list(
+            Homework.objects.filter(created_by=self.request.user, is_published=True)
+            .select_related('unit__subject').order_by('-published_at', '-id')
+        )
+        school = self.request.GET.get('school', '')
+        class_name = self.request.GET.get('class_name', '')
+        context['homeworks'] = homeworks
+        context['matrix'] = homework_matrix(homeworks, school=school, class_name=class_name)
+        context['school'] = school
+        context['class_name'] = class_name
+        return context
+
+
 class HomeworkCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     """宿題作成"""
     model = Homework
@@ -0,0 +1,372 @@
+"""
+単元の問題用紙・解答用紙のPDF
+
+PDFは (単元, 単元の内容のバージョン, テンプレート, 種類) ごとに1回だけ作成してWorksheetPDFに保存し、
+同じ内容の再要求には保存済みのファイルをそのまま返す。問題の追加・編集・削除で単元の内容の
+バージョンが変わると、次の要求で新しいPDFを作成する。
+
+作成はバックグラウンドのスレッドで行う。同じキーの作成は、WorksheetPDFの状態を「作成中」に
+変える条件付きの更新に成功した1つの処理だけが行うため、複数のワーカーから同時に要求されても
+レンダリングは1回だけ実行される。
+
+PDFの作成方式（エンジン）はWeasyPrint（HTMLテンプレート）とReportLab（問題を直接組む高速な方式）の2つ。
+PDFテンプレートで指定でき、自動の場合はHTMLテンプレートを使うならWeasyPrint、標準のレイアウトはReportLab。
+WeasyPrintを読み込めない環境（pango等のライブラリがない）では常にReportLabで作成する。
+"""
+import hashlib
+import logging
+from functools import lru_cache
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.db.models import Q
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.utils import timezone
+from quiz_app.models import Question, Unit
+from .models import PDFTemplate, WorksheetPDF
+from .storage import worksheet_pdf_path
+
+logger = logging.getLogger(__name__)
+
+# レイアウトを変更したら上げる（保存済みのPDFを作り直す）
+WORKSHEET_LAYOUT_VERSION = 1
+
+# この時間を過ぎても作成中のままのPDFは中断されたものとみなす（秒）
+WORKSHEET_STALE_SECONDS = 600
+
+DEFAULT_WORKSHEET_TEMPLATE = 'admin_panel/pdf/worksheet.html'
+
+
+def unit_content_stats(unit: Unit) -> Dict[str, Any]:
+    """
+    単元の問題数と、問題ごとの (ID, 更新日時) のダイジェスト（1回のクエリ）
+
+    件数・最新の更新日時・最大IDの集計だけでは、Supabaseとの同期で更新日時が以前の値に
+    戻った問題の変更を区別できないため、全問題の値から求める。
+    """
+    digest = hashlib.sha1()
+    count = 0
+    rows = Question.objects.filter(unit=unit).order_by('id').values_list('id', 'updated_at')
+    for question_id, updated_at in rows.iterator():
+        digest.update(f'{question_id}:{updated_at.isoformat() if updated_at else ""}\n'.encode('ascii'))
+        count += 1
+    return {'count': count, 'digest': digest.hexdigest()}
+
+
+@lru_cache(maxsize=None)
+def weasyprint_available() -> bool:
+    """
+    WeasyPrintを読み込めるか（プロセスごとに1回だけ確認する）
+
+    WeasyPrintはpango等のシステムライブラリが必要で、ない環境ではimport時にOSErrorになる。
+    """
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError) as e:
+        logger.warning('WeasyPrintを読み込めないため、PDFはReportLabで作成します: %s', e)
+        return False
+    return True
+
+
+def select_engine(template: Optional[PDFTemplate]) -> str:
+    """
+    PDFの作成方式
+
+    テンプレートで指定されていればその方式、自動ならHTMLテンプレートがあればWeasyPrint、
+    標準のレイアウトはReportLabを使う。
+    WeasyPrintを読み込めない環境では、どの場合もReportLabを使う（HTMLテンプレートは使われない）。
+    """
+    engine = template.engine if template is not None else PDFTemplate.Engine.AUTO
+    if engine == PDFTemplate.Engine.AUTO:
+        if template is not None and template.template_file:
+            engine = PDFTemplate.Engine.WEASYPRINT
+        else:
+            engine = PDFTemplate.Engine.REPORTLAB
+    if engine == PDFTemplate.Engine.WEASYPRINT and not weasyprint_available():
+        return PDFTemplate.Engine.REPORTLAB
+    return engine
+
+
+def unit_content_version(
+    unit: Unit,
+    engine: str,
+    template: Optional[PDFTemplate] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    単元の内容のバージョン
+
+    単元名と問題ごとの (ID, 更新日時)、作成方式、テンプレートのファイルから求める。
+    問題の追加・編集・削除（同期による更新を含む）やテンプレートの差し替えのいずれでも値が変わる。
+    """
+    stats = stats or unit_content_stats(unit)
+    source = '|'.join(str(value) for value in (
+        WORKSHEET_LAYOUT_VERSION,
+        engine,
+        template.template_file.name if template is not None else '',
+        unit.subject.label_ja,
+        unit.grade_year,
+        unit.category,
+        stats['count'],
+        stats['digest'],
+    ))
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def worksheet_context(unit: Unit, kind: str) -> Dict[str, Any]:
+    """PDFのテンプレートに渡すデータ（問題は元データIDの順）"""
+    questions = []
+    rows = Question.objects.filter(unit=unit).order_by('source_id', 'id').values(
+        'source_id', 'question_type', 'text', 'correct_answer', 'accepted_alternatives', 'choices'
+    )
+    for number, row in enumerate(rows.iterator(), 1):
+        questions.append({
+            'number': number,
+            'source_id': row['source_id'],
+            'is_choice': row['question_type'] == Question.QuestionType.CHOICE,
+            'text': row['text'],
+            'choices': row['choices'] or [],
+            'correct_answer': row['correct_answer'],
+            'alternatives': row['accepted_alternatives'] or [],
+        })
+    kind_label = WorksheetPDF.Kind(kind).label
+    return {
+        'unit': unit,
+        'title': f'{unit}　{kind_label}',
+        'kind': kind,
+        'kind_label': kind_label,
+        'answer_key': kind == WorksheetPDF.Kind.ANSWER_KEY,
+        'questions': questions,
+        'generated_at': timezone.now(),
+    }
+
+
+def render_worksheet_html(context: Dict[str, Any], template: Optional[PDFTemplate] = None) -> str:
+    """PDFにするHTML（PDFテンプレートが指定されればそのファイルをDjangoテンプレートとして使う）"""
+    if template is not None and template.template_file:
+        with template.template_file.open('rb') as f:
+            source = f.read().decode('utf-8')
+        return Template(source).render(Context(context))
+    return render_to_string(DEFAULT_WORKSHEET_TEMPLATE, context)
+
+
+def worksheet_document(worksheet: WorksheetPDF) -> Any:
+    """
+    PDFの作成に渡すデータ
+
+    WeasyPrintはHTML、ReportLabは問題の一覧（プロセス間で受け渡せる辞書）。
+    """
+    context = worksheet_context(worksheet.unit, worksheet.kind)
+    if worksheet.engine == PDFTemplate.Engine.REPORTLAB:
+        return {key: context[key] for key in ('title', 'answer_key', 'questions')}
+    return render_worksheet_html(context, worksheet.template)
+
+
+def render_html_pdf(html: str) -> Tuple[bytes, int]:
+    """HTMLをPDFにする（PDFのバイト列とページ数）"""
+    from weasyprint import HTML
+
+    document = HTML(string=html, base_url=str(settings.BASE_DIR)).render()
+    return document.write_pdf(), len(document.pages)
+
+
+def render_pdf(engine: str, document: Any) -> Tuple[bytes, int]:
+    """作成方式に応じてPDFを作成（PDFのバイト列とページ数）"""
+    if engine == PDFTemplate.Engine.REPORTLAB:
+        from .reportlab_worksheet import render_reportlab_pdf
+
+        return render_reportlab_pdf(document)
+    return render_html_pdf(document)
+
+
+def render_worksheet_file(engine: str, document: Any, name: str) -> Tuple[str, int]:
+    """
+    PDFを作成してストレージに保存する（保存したファイル名とページ数）
+
+    プロセスプールのワーカーから呼ばれるため、データベースには一切アクセスしない。
+    """
+    data, page_count = render_pdf(engine, document)
+    return default_storage.save(name, ContentFile(data)), page_count
+
+
+def claim_worksheet(worksheet: WorksheetPDF) -> bool:
+    """
+    PDFの作成を引き受ける
+
+    作成待ち・失敗、または作成中のまま中断されたものだけを「作成中」に変える。
+    更新できた処理（1つだけ）がTrueを受け取り、作成を行う。
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=WORKSHEET_STALE_SECONDS)
+    claimable = (
+        Q(status__in=[WorksheetPDF.Status.PENDING, WorksheetPDF.Status.FAILED])
+        | Q(status=WorksheetPDF.Status.RENDERING, started_at__lt=stale)
+    )
+    updated = WorksheetPDF.objects.filter(claimable, pk=worksheet.pk).update(
+        status=WorksheetPDF.Status.RENDERING,
+        started_at=now,
+        finished_at=None,
+        error_message='',
+    )
+    return updated == 1
+
+
+def complete_worksheet(worksheet: WorksheetPDF, file_name: str, page_count: int) -> None:
+    """作成したPDFを記録し、古いバージョンを削除"""
+    worksheet.file.name = file_name
+    worksheet.page_count = page_count
+    worksheet.status = WorksheetPDF.Status.COMPLETED
+    worksheet.error_message = ''
+    worksheet.finished_at = timezone.now()
+    worksheet.save(update_fields=['file', 'page_count', 'status', 'error_message', 'finished_at'])
+    discard_old_worksheets(worksheet)
+
+
+def fail_worksheet(worksheet: WorksheetPDF, error: str) -> None:
+    """PDFの作成の失敗を記録（次の要求で作り直す）"""
+    worksheet.status = WorksheetPDF.Status.FAILED
+    worksheet.error_message = error
+    worksheet.finished_at = timezone.now()
+    worksheet.save(update_fields=['status', 'error_message', 'finished_at'])
+
+
+def build_worksheet(worksheet_id: int) -> None:
+    """PDFを作成して保存（バックグラウンド処理）"""
+    worksheet = WorksheetPDF.objects.select_related('unit__subject', 'template').get(pk=worksheet_id)
+    try:
+        document = worksheet_document(worksheet)
+        file_name, page_count = render_worksheet_file(worksheet.engine, document, worksheet_pdf_path(worksheet, ''))
+    except Exception as e:
+        logger.exception(f"PDF作成エラー - 単元PDF ID: {worksheet_id}")
+        fail_worksheet(worksheet, str(e))
+        return
+    complete_worksheet(worksheet, file_name, page_count)
+
+
+def discard_old_worksheets(worksheet: WorksheetPDF) -> None:
+    """同じ単元・テンプレート・種類の古いバージョンのPDFを削除"""
+    old = WorksheetPDF.objects.filter(
+        unit_id=worksheet.unit_id,
+        template_id=worksheet.template_id,
+        kind=worksheet.kind,
+    ).exclude(content_version=worksheet.content_version).exclude(status=WorksheetPDF.Status.RENDERING)
+    for previous in old:
+        if previous.file:
+            previous.file.delete(save=False)
+        previous.delete()
+
+
+def get_worksheet(unit: Unit, kind: str, template: Optional[PDFTemplate] = None) -> WorksheetPDF:
+    """現在の内容のPDFの記録を取得（なければ作成待ちで作成）"""
+    stats = unit_content_stats(unit)
+    engine = select_engine(template)
+    lookup = {
+        'unit': unit,
+        'content_version': unit_content_version(unit, engine, template, stats),
+        'template': template,
+        'kind': kind,
+    }
+    try:
+        worksheet, _ = WorksheetPDF.objects.get_or_create(**lookup, defaults={'engine': engine})
+    except IntegrityError:
+        # 同時に要求した別の処理が先に作成した
+        worksheet = WorksheetPDF.objects.get(**lookup)
+    return worksheet
+
+
+def worksheet_is_available(worksheet: WorksheetPDF) -> bool:
+    """
+    作成済みのPDFのファイルが残っているか
+
+    作成済みなのにファイルが削除されていれば失敗扱いにして、作り直せるようにする。
+    """
+    if worksheet.status != WorksheetPDF.Status.COMPLETED:
+        return False
+    if worksheet.file and worksheet.file.storage.exists(worksheet.file.name):
+        return True
+    fail_worksheet(worksheet, 'PDFファイルが見つかりません')
+    return False
+
+
+def request_worksheet(unit: Unit, kind: str, template: Optional[PDFTemplate] = None) -> WorksheetPDF:
+    """
+    PDFを要求する
+
+    作成済みならそのまま返し、未作成なら作成をバックグラウンドで開始する
+    （作成中のものは開始しない）。
+    """
+    from .utils import start_background
+
+    worksheet = get_worksheet(unit, kind, template)
+    if worksheet_is_available(worksheet):
+        return worksheet
+    if claim_worksheet(worksheet):
+        start_background(build_worksheet, worksheet.pk)
+    worksheet.refresh_from_db()
+    return worksheet
+
+
+def render_worksheets_parallel(
+    worksheets: Iterable[WorksheetPDF],
+    max_workers: Optional[int] = None,
+) -> Iterator[Tuple[WorksheetPDF, Optional[str]]]:
+    """
+    引き受け済みのPDFをプロセスプールで並列に作成する
+
+    PDFのレンダリングはCPUバウンドでシングルスレッドのため、PDF単位でワーカープロセスに
+    分散する。HTML・問題の一覧の作成と結果の記録はこのプロセスで行い、ワーカーはPDFにして保存するだけ。
+    同時に処理中のPDFはワーカー数の2倍までに抑え、完了した順に (PDF, エラー) を返す。
+    worksheetsは必要な分だけ取り出すため、その中で引き受ければ処理中の分だけを引き受けられる。
+    中断された場合（例外・Ctrl+C）は処理中のPDFを失敗にし、次の要求ですぐに作り直せるようにする。
+    """
+    import os
+    import django
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from django.db import connections
+
+    max_workers = max_workers or os.cpu_count() or 1
+    pending: Dict[Any, WorksheetPDF] = {}
+    queue = iter(worksheets)
+
+    # ワーカーがデータベースの接続を引き継がないように、開始前に閉じておく
+    connections.close_all()
+    # spawn方式（Windows等）でもワーカー内でアプリを読み込めるようにdjango.setupで初期化する
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=django.setup) as executor:
+        try:
+            while True:
+                for worksheet in queue:
+                    try:
+                        document = worksheet_document(worksheet)
+                    except Exception as e:
+                        fail_worksheet(worksheet, str(e))
+                        yield worksheet, str(e)
+                        continue
+                    future = executor.submit(
+                        render_worksheet_file, worksheet.engine, document, worksheet_pdf_path(worksheet, '')
+                    )
+                    pending[future] = worksheet
+                    if len(pending) >= max_workers * 2:
+                        break
+                if not pending:
+                    return
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    worksheet = pending.pop(future)
+                    try:
+                        file_name, page_count = future.result()
+                    except Exception as e:
+                        logger.error(f"PDF作成エラー - 単元PDF ID: {worksheet.pk}: {e}")
+                        fail_worksheet(worksheet, str(e))
+                        yield worksheet, str(e)
+                        continue
+                    complete_worksheet(worksheet, file_name, page_count)
+                    yield worksheet, None
+        except BaseException:
+            for worksheet in pending.values():
+                fail_worksheet(worksheet, 'PDFの作成が中断されました')
+            raise
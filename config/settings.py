@@ -50,7 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoiseに書き出した公開ページ（/catalog/）の配信を加えたもの
+    'quiz_app.static_catalog.CatalogWhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -150,6 +151,9 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# render_static_catalogコマンドで書き出す公開ページ（/catalog/ で配信）
+STATIC_CATALOG_ROOT = BASE_DIR / 'static_catalog'
+
 # WhiteNoise configuration
 if not DEBUG:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -168,6 +172,13 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# ユーザーと生徒・管理者のプロファイルを1回のクエリで読み込み、短時間キャッシュする（accounts/backends.py）。
+# セッションには認証したバックエンドが記録されるため、以前からのセッション用にModelBackendも残す
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Sites framework
 SITE_ID = 1
 
@@ -177,12 +188,14 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
 # Email settings
+# メールは送信待ち（accounts.OutboundEmail）に登録され、送信処理がまとめて送信する
+# EMAIL_BACKENDを環境変数で指定すると、ファイル出力（filebased）などに切り替えられる
 if DEBUG:
     # 開発環境: コンソールにメールを出力
-    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+    EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 else:
     # 本番環境: SMTPを使用
-    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
     EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
     EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
     EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
@@ -191,6 +204,10 @@ else:
     # メール送信タイムアウト設定（秒）
     EMAIL_TIMEOUT = 10
 
+# filebasedバックエンドの出力先
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@example.com')
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
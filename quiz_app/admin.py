@@ -3,8 +3,9 @@ from django.core.management import call_command
 from django.contrib import messages
 from django.http import HttpResponseRedirect
 from django.urls import path
-from .models import Subject, Unit, Question, QuizSession, QuizAttempt, Homework
+from .models import Subject, Unit, Question, QuizSession, QuizAttempt, Homework, SyncState, SyncOutbox
 from django.conf import settings
+from .pagination import KeysetAdminMixin
 
 
 @admin.register(Subject)
@@ -136,35 +137,35 @@ class QuestionAdmin(admin.ModelAdmin):
         return HttpResponseRedirect('../')
 
     def save_model(self, request, obj, form, change):
-        """問題保存時にSupabaseに自動同期"""
+        """問題保存時にSupabaseへの送信待ちに登録（送信はバックグラウンドでまとめて行う）"""
         super().save_model(request, obj, form, change)
         
         # 本番環境でのみ自動同期を実行
         if not settings.DEBUG:
             try:
-                from django.core.management import call_command
-                # この問題のみをSupabaseに同期
-                call_command('sync_bidirectional', direction='django-to-supabase', verbosity=0)
+                from .sync_outbox import enqueue_question_sync
+                enqueue_question_sync([obj.id])
             except Exception as e:
                 # 自動同期でエラーが発生しても問題保存は継続
                 pass
 
 
 @admin.register(QuizSession)
-class QuizSessionAdmin(admin.ModelAdmin):
+class QuizSessionAdmin(KeysetAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'unit', 'question_count', 'started_at', 'finished_at', 'total_score']
     list_filter = ['unit', 'question_count', 'started_at']
     search_fields = ['user__username', 'unit__unit_key']
-    ordering = ['-started_at']
+    ordering = ['-started_at', '-id']
+    keyset_ordering = ('started_at', 'id')
     readonly_fields = ['started_at', 'finished_at']
 
 
 @admin.register(QuizAttempt)
-class QuizAttemptAdmin(admin.ModelAdmin):
+class QuizAttemptAdmin(KeysetAdminMixin, admin.ModelAdmin):
     list_display = ['session', 'question', 'is_correct', 'time_spent_sec', 'created_at']
     list_filter = ['is_correct', 'created_at']
     search_fields = ['session__user__username', 'question__text']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     readonly_fields = ['created_at']
 
 
@@ -185,9 +186,26 @@ class HomeworkAdmin(admin.ModelAdmin):
         ('公開状態', {
             'fields': ('is_published', 'published_at', 'public_slug')
         }),
+        ('出題問題（公開時に固定）', {
+            'fields': ('question_ids', 'choice_mappings'),
+            'classes': ('collapse',)
+        }),
         ('システム情報', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['question_ids', 'choice_mappings', 'created_at', 'updated_at']
+
+
+@admin.register(SyncState)
+class SyncStateAdmin(admin.ModelAdmin):
+    list_display = ['direction', 'subject_code', 'last_updated_at', 'last_id', 'last_synced_count', 'synced_at']
+    list_filter = ['direction']
+    readonly_fields = ['synced_at']
+
+
+@admin.register(SyncOutbox)
+class SyncOutboxAdmin(admin.ModelAdmin):
+    list_display = ['question_id', 'enqueued_at', 'attempts', 'last_error']
+    ordering = ['enqueued_at']
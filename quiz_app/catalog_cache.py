@@ -0,0 +1,170 @@
+"""
+教科・単元ページの表示データのキャッシュ
+
+教科一覧・単元一覧・単元の問題数は問題の取込や同期のときにしか変わらないため、
+コンテンツのバージョン番号をキーに含めてキャッシュする。Subject・Unit・Questionが
+変更されるとシグナルでバージョンを上げ、古いキャッシュは参照されなくなる。
+キャッシュする内容はユーザーに依存しないので、未ログイン・ログイン済みで共有する。
+
+バージョン番号はDB（ContentVersion）に保存し、プロセス内では数秒だけキャッシュする。
+管理コマンドなど別プロセスでの変更も、この時間内にWebプロセスへ反映される。
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import ContentVersion, Subject, Unit
+
+# バージョン番号をプロセス内で再利用する時間（秒）
+CONTENT_VERSION_CACHE_SECONDS = 5
+
+# 表示データのキャッシュ期間（秒）。バージョンが変われば期間内でも使われない
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+CATALOG_KINDS = ['subjects', 'subject', 'unit']
+
+_VERSION_KEY = 'catalog:version'
+_STATS_KEY = 'catalog:stats:{kind}:{result}'
+# 確定後のバージョンの更新が未処理であることを示す接続の属性
+_PENDING_FLAG = '_content_version_bump_pending'
+
+
+def _content_version_info() -> Tuple[int, Optional[datetime]]:
+    info = cache.get(_VERSION_KEY)
+    if info is None:
+        info = ContentVersion.objects.filter(pk=ContentVersion.SINGLETON_ID).values_list(
+            'version', 'updated_at'
+        ).first() or (0, None)
+        cache.set(_VERSION_KEY, tuple(info), CONTENT_VERSION_CACHE_SECONDS)
+    return info
+
+
+def get_content_version() -> int:
+    """現在のコンテンツのバージョン番号"""
+    return _content_version_info()[0]
+
+
+def get_content_updated_at() -> Optional[datetime]:
+    """コンテンツが最後に変更された日時（一度も変更されていなければNone）"""
+    return _content_version_info()[1]
+
+
+def read_content_version() -> int:
+    """データベースのバージョン番号（プロセス内のキャッシュを使わない）"""
+    return ContentVersion.objects.filter(pk=ContentVersion.SINGLETON_ID).values_list('version', flat=True).first() or 0
+
+
+def bump_content_version() -> None:
+    """
+    コンテンツのバージョンを上げる（キャッシュ済みの表示データを無効にする）
+
+    書き出した公開ページも古くなるため、書き出し直しを予約する。
+    """
+    from .static_catalog import content_version_changed
+
+    updated = ContentVersion.objects.filter(pk=ContentVersion.SINGLETON_ID).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        ContentVersion.objects.get_or_create(pk=ContentVersion.SINGLETON_ID, defaults={'version': 1})
+    cache.delete(_VERSION_KEY)
+    content_version_changed(read_content_version())
+
+
+def _bump_scheduled_content_version() -> None:
+    """確定後のコールバック。同じ確定で予約された分のうち最初の1回だけバージョンを上げる"""
+    if not getattr(connection, _PENDING_FLAG, False):
+        return
+    setattr(connection, _PENDING_FLAG, False)
+    bump_content_version()
+
+
+def schedule_content_version_bump() -> None:
+    """
+    トランザクション確定後にバージョンを上げる
+
+    同じトランザクション内の変更（取込での大量の保存など）は1回の更新にまとめる。
+    予約のたびに接続に未処理の印を付けてコールバックを登録し、確定後に最初に実行された
+    コールバックが印を消してバージョンを上げる（残りは何もしない）。ロールバックで
+    コールバックが捨てられても、次の予約で登録し直すため更新が漏れることはない。
+    """
+    if not connection.in_atomic_block:
+        bump_content_version()
+        return
+    setattr(connection, _PENDING_FLAG, True)
+    transaction.on_commit(_bump_scheduled_content_version)
+
+
+def _record(kind: str, result: str) -> None:
+    key = _STATS_KEY.format(kind=kind, result=result)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def _cached(kind: str, key_suffix: Any, loader: Callable[[], Any]) -> Any:
+    key = f'catalog:v{get_content_version()}:{kind}:{key_suffix}'
+    value = cache.get(key)
+    if value is not None:
+        _record(kind, 'hits')
+        return value
+    _record(kind, 'misses')
+    value = loader()
+    cache.set(key, value, CATALOG_CACHE_TIMEOUT)
+    return value
+
+
+def catalog_subjects() -> List[Subject]:
+    """ホームページの教科一覧"""
+    return _cached('subjects', 'all', lambda: list(Subject.objects.order_by('id')))
+
+
+def catalog_subject(subject_id: int) -> Optional[Dict[str, Any]]:
+    """教科ページの表示データ（教科と単元一覧）。存在しなければNone"""
+
+    def load() -> Dict[str, Any]:
+        subject = Subject.objects.filter(pk=subject_id).first()
+        if subject is None:
+            return {'subject': None, 'units': []}
+        return {'subject': subject, 'units': list(subject.units.order_by('grade_year', 'category'))}
+
+    data = _cached('subject', subject_id, load)
+    return data if data['subject'] is not None else None
+
+
+def catalog_unit(unit_id: int) -> Optional[Dict[str, Any]]:
+    """単元ページの表示データ（単元と問題数）。存在しなければNone"""
+
+    def load() -> Dict[str, Any]:
+        unit = Unit.objects.select_related('subject').filter(pk=unit_id).first()
+        if unit is None:
+            return {'unit': None, 'question_count': 0}
+        return {'unit': unit, 'question_count': unit.question_count}
+
+    data = _cached('unit', unit_id, load)
+    return data if data['unit'] is not None else None
+
+
+def catalog_cache_stats() -> Dict[str, Any]:
+    """表示データのキャッシュのヒット数・ミス数・ヒット率（監視用）"""
+    stats: Dict[str, Any] = {'content_version': get_content_version(), 'kinds': {}}
+    total_hits = 0
+    total_misses = 0
+    for kind in CATALOG_KINDS:
+        hits = cache.get(_STATS_KEY.format(kind=kind, result='hits'), 0)
+        misses = cache.get(_STATS_KEY.format(kind=kind, result='misses'), 0)
+        total_hits += hits
+        total_misses += misses
+        stats['kinds'][kind] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+        }
+    stats['hits'] = total_hits
+    stats['misses'] = total_misses
+    stats['hit_rate'] = total_hits / (total_hits + total_misses) if total_hits + total_misses else None
+    return stats
@@ -0,0 +1,106 @@
+"""
+条件付きGET（ETag・Last-Modified）のためのフィンガープリント関数
+
+django.views.decorators.http.conditionに渡す関数。ページの内容を決める値（コンテンツの
+バージョン・クイズの終了時刻・ランキングの集計日時）だけを安価に取得し、テンプレートの
+描画や集計を行わずに304を返せるようにする。
+
+ページにはログイン中のユーザー名やCSRFトークンが含まれるため、ETagにはユーザー・
+セッション・CSRFクッキーから作った値も含める（ログインし直すと一致しなくなる）。
+
+表示待ちのメッセージ（django.contrib.messages）があるリクエストでは、どの関数もNoneを返して
+条件付きGETを使わない（304を返すとメッセージが表示されないまま読み捨てられるため）。
+"""
+import hashlib
+from typing import Optional
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.exceptions import ObjectDoesNotExist
+from .catalog_cache import get_content_updated_at, get_content_version
+from .models import QuizSession
+from .ranking import get_ranking_snapshot
+
+
+def _visitor_fingerprint(request) -> str:
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else 0
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return hashlib.sha1(f'{user_id}:{session_key}:{csrf_cookie}'.encode('utf-8')).hexdigest()[:16]
+
+
+def _has_pending_messages(request) -> bool:
+    # len()はメッセージを読み込むだけで、表示済みにはしない（反復したときだけ表示済みになる）
+    return len(get_messages(request)) > 0
+
+
+def catalog_etag(request, *args, **kwargs) -> Optional[str]:
+    if _has_pending_messages(request):
+        return None
+    return f'catalog-{get_content_version()}-{_visitor_fingerprint(request)}'
+
+
+def _audience_fingerprint(request) -> str:
+    """生徒の都道府県・学校・クラス（ホームページに表示する宿題が決まる）"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or user.role != 'student':
+        return ''
+    try:
+        profile = user.student_profile
+    except ObjectDoesNotExist:
+        return ''
+    audience = f'{profile.prefecture}\0{profile.school}\0{profile.class_name}'
+    return hashlib.sha1(audience.encode('utf-8')).hexdigest()[:16]
+
+
+def home_etag(request, *args, **kwargs) -> Optional[str]:
+    """教科一覧に加えて生徒の宿題一覧を表示するため、生徒の所属も含める"""
+    etag = catalog_etag(request)
+    if etag is None:
+        return None
+    return f'{etag}-{_audience_fingerprint(request)}'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    if _has_pending_messages(request):
+        return None
+    return get_content_updated_at()
+
+
+def _finished_at(request, pk):
+    # ETag・Last-Modifiedの両方から呼ばれるため、リクエストごとに1回だけ取得する
+    cached = getattr(request, '_quiz_result_finished_at', None)
+    if cached is not None and cached[0] == pk:
+        return cached[1]
+    finished_at = None
+    if request.user.is_authenticated:
+        finished_at = QuizSession.objects.filter(pk=pk, user=request.user).values_list('finished_at', flat=True).first()
+    request._quiz_result_finished_at = (pk, finished_at)
+    return finished_at
+
+
+def quiz_result_etag(request, pk, *args, **kwargs) -> Optional[str]:
+    """終了したクイズの結果のみ（終了前は条件付きGETを使わない）"""
+    finished_at = _finished_at(request, pk)
+    if finished_at is None or _has_pending_messages(request):
+        return None
+    return f'result-{pk}-{finished_at.timestamp():.6f}-{_visitor_fingerprint(request)}'
+
+
+def quiz_result_last_modified(request, pk, *args, **kwargs):
+    if _has_pending_messages(request):
+        return None
+    return _finished_at(request, pk)
+
+
+def ranking_etag(request, *args, **kwargs) -> Optional[str]:
+    if _has_pending_messages(request):
+        return None
+    taken_at = get_ranking_snapshot()['taken_at']
+    return f'ranking-{int(taken_at.timestamp())}-{_visitor_fingerprint(request)}'
+
+
+def ranking_last_modified(request, *args, **kwargs):
+    if _has_pending_messages(request):
+        return None
+    return get_ranking_snapshot()['taken_at']
@@ -0,0 +1,377 @@
+"""
+Supabase（PostgREST）の動作を模したローカルサーバー
+
+同期処理の動作確認やベンチマークをネットワークなしで行うためのもの。
+/rest/v1/<テーブル> に対するGET・HEAD・POST（upsert）・PATCH・DELETEと、
+eq / neq / gt / gte / lt / lte / in の絞り込みとor=(...)・and(...)の組み合わせ、select・order・limit・offset、
+Rangeヘッダーによるページ分割、Prefer: count=exactによる件数の取得、
+register_rpc()で登録した関数の/rest/v1/rpc/<関数名>での呼び出しに対応する。
+add_foreign_key()で登録した外部キーに違反するupsertは、PostgreSQLと同じく
+リクエスト全体を409で拒否する。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit, parse_qsl
+
+# PostgRESTの予約済みクエリパラメータ（絞り込み条件ではないもの）
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict'}
+
+
+def _coerce(value: str, sample: Any) -> Any:
+    """クエリ文字列の値を比較対象の列の型にそろえる"""
+    if isinstance(sample, bool):
+        return value.lower() == 'true'
+    if isinstance(sample, int):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if isinstance(sample, float):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _split_conditions(expression: str) -> List[str]:
+    """or=(...)の中身を括弧の外のカンマで分割する（ダブルクォートで囲んだ値の中は分割しない）"""
+    parts = []
+    depth = 0
+    quoted = False
+    current = ''
+    for char in expression:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+
+def _matches_logical(row: Dict[str, Any], operator: str, expression: str) -> bool:
+    """or / and の条件（例: (updated_at.gt.X,and(updated_at.eq.X,id.gt.1))）"""
+    results = []
+    for condition in _split_conditions(expression.strip()[1:-1]):
+        if condition.startswith(('or(', 'and(')):
+            nested, _, nested_expression = condition.partition('(')
+            results.append(_matches_logical(row, nested, '(' + nested_expression))
+        else:
+            column, _, column_expression = condition.partition('.')
+            results.append(_matches(row, column, column_expression))
+    return any(results) if operator == 'or' else all(results)
+
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    if column in ('or', 'and'):
+        return _matches_logical(row, column, expression)
+    operator, _, operand = expression.partition('.')
+    operand = operand.strip('"')
+    current = row.get(column)
+    if operator == 'is':
+        return current is None if operand == 'null' else str(current).lower() == operand
+    if operator == 'in':
+        values = [value.strip().strip('"') for value in operand.strip('()').split(',') if value.strip()]
+        return current in [_coerce(value, current) for value in values]
+    if current is None:
+        return False
+    target = _coerce(operand, current)
+    if operator == 'eq':
+        return current == target
+    if operator == 'neq':
+        return current != target
+    try:
+        if operator == 'gt':
+            return current > target
+        if operator == 'gte':
+            return current >= target
+        if operator == 'lt':
+            return current < target
+        if operator == 'lte':
+            return current <= target
+    except TypeError:
+        return False
+    raise ValueError(f'未対応の演算子: {operator}')
+
+
+class FakePostgREST:
+    """
+    メモリ上のテーブルを持つPostgREST互換サーバー
+
+    latencyで1リクエストごとの遅延（秒）を、fail_next()で指定回数の
+    エラー応答を設定できる。max_rowsを指定するとSupabaseの既定（1000行）のように
+    1回の応答の行数を制限する。受け付けたリクエスト数はrequest_countで確認する。
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0.0,
+        max_rows: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.max_rows = max_rows
+        self.tables: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+        self.request_count = 0
+        self.requests_by_method: Dict[str, int] = {}
+        self._failures: List[int] = []
+        self.rpc_functions: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self.foreign_keys: Dict[str, List[tuple]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakePostgREST':
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'FakePostgREST':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def seed(self, table: str, rows: List[Dict[str, Any]], key: str = 'id') -> None:
+        """テーブルに初期データを投入"""
+        with self._lock:
+            target = self.tables.setdefault(table, {})
+            for row in rows:
+                target[row[key]] = dict(row)
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self.tables.get(table, {}).values()]
+
+    def fail_next(self, count: int, status: int = 503) -> None:
+        """次のcount件のリクエストにstatusで応答する（再試行の確認用）"""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def register_rpc(self, name: str, func: Callable[[Dict[str, Any]], Any]) -> None:
+        """/rest/v1/rpc/<name> へのPOSTで呼び出す関数を登録（引数はリクエスト本文のdict）"""
+        self.rpc_functions[name] = func
+
+    def add_foreign_key(self, table: str, column: str, referenced_table: str) -> None:
+        """tableのcolumnがreferenced_tableのidを参照する外部キーを登録"""
+        self.foreign_keys.setdefault(table, []).append((column, referenced_table))
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.request_count = 0
+            self.requests_by_method = {}
+
+    # 以下はリクエストハンドラから呼ばれる処理
+
+    def _record(self, method: str) -> Optional[int]:
+        with self._lock:
+            self.request_count += 1
+            self.requests_by_method[method] = self.requests_by_method.get(method, 0) + 1
+            if self._failures:
+                return self._failures.pop(0)
+        return None
+
+    def _select(self, table: str, params: List[tuple]) -> List[Dict[str, Any]]:
+        filters = [(column, value) for column, value in params if column not in RESERVED_PARAMS]
+        options = {column: value for column, value in params if column in RESERVED_PARAMS}
+        with self._lock:
+            rows = [
+                dict(row) for row in self.tables.get(table, {}).values()
+                if all(_matches(row, column, value) for column, value in filters)
+            ]
+
+        for order in reversed(options.get('order', '').split(',')):
+            if not order:
+                continue
+            column, _, direction = order.partition('.')
+            rows.sort(
+                key=lambda row: (row.get(column) is None, row.get(column)),
+                reverse=direction.startswith('desc'),
+            )
+
+        offset = int(options.get('offset', 0))
+        limit = options.get('limit')
+        rows = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+
+        select = options.get('select', '*')
+        if select != '*':
+            columns = [column.strip() for column in select.split(',')]
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return rows
+
+    def _upsert(self, table: str, rows: List[Dict[str, Any]], key: str, merge: bool) -> Optional[str]:
+        with self._lock:
+            target = self.tables.setdefault(table, {})
+            for column, referenced_table in self.foreign_keys.get(table, []):
+                referenced = self.tables.get(referenced_table, {})
+                for row in rows:
+                    if row.get(column) is not None and row[column] not in referenced:
+                        return (
+                            f'insert or update on table "{table}" violates foreign key constraint '
+                            f'({column}={row[column]})'
+                        )
+            if not merge:
+                for row in rows:
+                    if row.get(key) in target:
+                        return f'duplicate key value violates unique constraint ({key}={row.get(key)})'
+            for row in rows:
+                if merge and row.get(key) in target:
+                    target[row[key]].update(row)
+                else:
+                    target[row.get(key)] = dict(row)
+        return None
+
+    def _patch(self, table: str, params: List[tuple], changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        matched = self._select(table, [(column, value) for column, value in params if column not in RESERVED_PARAMS])
+        with self._lock:
+            target = self.tables.setdefault(table, {})
+            updated = []
+            for row in matched:
+                stored = target.get(row.get('id'))
+                if stored is not None:
+                    stored.update(changes)
+                    updated.append(dict(stored))
+        return updated
+
+    def _delete(self, table: str, params: List[tuple]) -> int:
+        matched = self._select(table, [(column, value) for column, value in params if column not in RESERVED_PARAMS])
+        with self._lock:
+            target = self.tables.setdefault(table, {})
+            for row in matched:
+                target.pop(row.get('id'), None)
+        return len(matched)
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # ヘッダーと本文を別々に書き込むため、keep-alive接続で遅延ACKを待たないようにする
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+                payload = b'' if body is None else json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if payload:
+                    self.wfile.write(payload)
+
+            def _read_json(self) -> Any:
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'null')
+
+            def _requested_range(self):
+                """Rangeヘッダー（例: 0-999）から取得範囲を読む"""
+                value = self.headers.get('Range', '')
+                first, _, last = value.partition('-')
+                if not first.strip().isdigit():
+                    return 0, None
+                return int(first), int(last) if last.strip().isdigit() else None
+
+            def _route(self):
+                parts = urlsplit(self.path)
+                prefix = '/rest/v1/'
+                if not parts.path.startswith(prefix):
+                    return None, []
+                return parts.path[len(prefix):].strip('/'), parse_qsl(parts.query, keep_blank_values=True)
+
+            def _handle(self, method: str) -> None:
+                # リクエスト本文は失敗応答の場合でも読み切る（接続を再利用できるように）
+                body = self._read_json() if method in ('POST', 'PATCH') else None
+                if fake.latency:
+                    time.sleep(fake.latency)
+                failure = fake._record(method)
+                if failure is not None:
+                    self._send(failure, {'message': '一時的なエラー（テスト用）'})
+                    return
+
+                table, params = self._route()
+                if not table:
+                    self._send(404, {'message': 'not found'})
+                    return
+
+                prefer = self.headers.get('Prefer', '')
+                representation = 'return=representation' in prefer
+                try:
+                    if method in ('GET', 'HEAD'):
+                        matched = fake._select(table, params)
+                        start, end = self._requested_range()
+                        rows = matched[start:] if end is None else matched[start:end + 1]
+                        if fake.max_rows is not None:
+                            rows = rows[:fake.max_rows]
+                        total = '*'
+                        if 'count=exact' in prefer:
+                            unpaged = [(column, value) for column, value in params if column not in ('limit', 'offset')]
+                            total = len(fake._select(table, unpaged))
+                        content_range = f'{start}-{start + len(rows) - 1}' if rows else '*'
+                        headers = {'Content-Range': f'{content_range}/{total}'}
+                        partial = start > 0 or start + len(rows) < len(matched)
+                        self._send(206 if partial else 200, rows if method == 'GET' else None, headers)
+                    elif method == 'POST' and table.startswith('rpc/'):
+                        func = fake.rpc_functions.get(table[len('rpc/'):])
+                        if func is None:
+                            self._send(404, {'message': f'関数がありません: {table}'})
+                        else:
+                            self._send(200, func(body or {}))
+                    elif method == 'POST':
+                        rows = body if isinstance(body, list) else [body]
+                        key = dict(params).get('on_conflict', 'id')
+                        error = fake._upsert(table, rows, key, 'resolution=merge-duplicates' in prefer)
+                        if error:
+                            self._send(409, {'message': error})
+                        else:
+                            self._send(201, rows if representation else None)
+                    elif method == 'PATCH':
+                        updated = fake._patch(table, params, body or {})
+                        self._send(200 if representation else 204, updated if representation else None)
+                    elif method == 'DELETE':
+                        fake._delete(table, params)
+                        self._send(204)
+                except ValueError as e:
+                    self._send(400, {'message': str(e)})
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_HEAD(self):
+                self._handle('HEAD')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PATCH(self):
+                self._handle('PATCH')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+        return Handler
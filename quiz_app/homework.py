@@ -0,0 +1,204 @@
+"""
+宿題の出題問題の固定と配信データ
+
+宿題を公開するときに出題する問題と選択肢の並び順を決めて保存する（Homework.question_ids・
+choice_mappings）。同じリンクを開いた生徒には全員同じ問題が同じ順で出題される。
+
+宿題ページの表示データ（正解を含まない）は宿題ごとに1回だけ作ってキャッシュし、全生徒で共有する。
+生徒のクイズセッションは「開始」したときに固定した問題から作るため、クラス全員が一斉に
+開始してもリクエストごとのキャッシュの読み込みとセッションの作成だけで済む。
+
+生徒に表示する宿題は、公開中の宿題の対象（HomeworkAudience）を生徒の都道府県・学校・クラスで
+検索して求め、対象ごとにキャッシュする。宿題が変更されるとコンテンツのバージョンを上げるため、
+キャッシュのキーにバージョンを含めれば古い表示データ・対象は使われなくなる。
+"""
+import hashlib
+import json
+import random
+from typing import Any, Dict, List, Optional
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+from .catalog_cache import get_content_version
+from .models import Homework, HomeworkAudience, Question, QuizSession
+from .homework_progress import invalidate_homework_progress
+from .utils import calculate_parts_count
+
+# 宿題ページの表示データ・対象ごとの宿題一覧のキャッシュ期間（秒）。宿題・問題が変更されれば期間内でも使われない
+HOMEWORK_PAYLOAD_TIMEOUT = 60 * 60 * 24
+HOMEWORK_AUDIENCE_TIMEOUT = 60 * 60
+
+_PAYLOAD_KEY = 'homework:v{version}:payload:{slug}'
+_AUDIENCE_KEY = 'homework:v{version}:audience:{digest}'
+
+
+def _as_list(value: Any) -> List[Any]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return []
+    return list(value) if isinstance(value, (list, tuple)) else []
+
+
+def freeze_homework_questions(homework: Homework) -> None:
+    """
+    出題する問題と選択肢の並び順を決める（保存は呼び出し側で行う）
+
+    単元の問題が宿題の問題数より少ない場合は全問を出題する。
+    """
+    question_ids = list(Question.objects.filter(unit_id=homework.unit_id).values_list('id', flat=True))
+    random.shuffle(question_ids)
+    selected = question_ids[:homework.question_count]
+
+    choice_mappings = {}
+    for question_id, choices in Question.objects.filter(id__in=selected, question_type='choice').values_list('id', 'choices'):
+        shuffled = _as_list(choices)
+        if shuffled:
+            random.shuffle(shuffled)
+            choice_mappings[str(question_id)] = shuffled
+
+    homework.question_ids = selected
+    homework.choice_mappings = choice_mappings
+
+
+def build_homework_payload(homework: Homework) -> Dict[str, Any]:
+    """宿題ページの表示データ（正解・別解は含めない）"""
+    questions = Question.objects.in_bulk(homework.question_ids)
+    items = []
+    for question_id in homework.question_ids:
+        question = questions.get(question_id)
+        if question is None:
+            # 固定した後に削除された問題
+            continue
+        items.append({
+            'id': question.id,
+            'number': len(items) + 1,
+            'text': question.text,
+            'question_type': question.question_type,
+            'choices': homework.choice_mappings.get(str(question.id)),
+            'parts_count': calculate_parts_count(question.correct_answer),
+        })
+
+    unit = homework.unit
+    return {
+        'id': homework.id,
+        'slug': homework.public_slug,
+        'unit_id': unit.id,
+        'unit_label': f'{unit.subject.label_ja} {unit.grade_year} {unit.category}',
+        'question_count': len(items),
+        'published_at': homework.published_at,
+        'questions': items,
+    }
+
+
+def get_homework_payload(slug: str) -> Optional[Dict[str, Any]]:
+    """公開中の宿題の表示データ（キャッシュから。存在しない・非公開ならNone）"""
+    key = _PAYLOAD_KEY.format(version=get_content_version(), slug=slug)
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    homework = Homework.objects.select_related('unit__subject').filter(public_slug=slug, is_published=True).first()
+    if homework is None:
+        return None
+    if not homework.question_ids:
+        # 問題を固定する前に公開された宿題。同時に最初の表示が重なっても固定は1回だけにし、
+        # 保存された問題（先に固定した方）を読み直して表示データを作る
+        freeze_homework_questions(homework)
+        Homework.objects.filter(pk=homework.pk, question_ids=[]).update(
+            question_ids=homework.question_ids, choice_mappings=homework.choice_mappings
+        )
+        homework.question_ids, homework.choice_mappings = Homework.objects.filter(pk=homework.pk).values_list(
+            'question_ids', 'choice_mappings'
+        ).get()
+    payload = build_homework_payload(homework)
+    cache.set(key, payload, HOMEWORK_PAYLOAD_TIMEOUT)
+    return payload
+
+
+def start_homework_session(user, payload: Dict[str, Any]) -> QuizSession:
+    """宿題のクイズセッション（解答途中のものがあればそれを続ける）"""
+    session = QuizSession.objects.filter(
+        homework_id=payload['id'], user=user, finished_at__isnull=True
+    ).order_by('-started_at').first()
+    if session is not None:
+        return session
+    session = QuizSession.objects.create(
+        user=user,
+        unit_id=payload['unit_id'],
+        homework_id=payload['id'],
+        question_count=payload['question_count'],
+        question_ids={str(item['number']): item['id'] for item in payload['questions']},
+        choice_mappings={str(item['id']): item['choices'] for item in payload['questions'] if item['choices']},
+    )
+    invalidate_homework_progress(session)
+    return session
+
+
+def prepare_homework_for_save(homework: Homework, previous: Optional[Dict[str, Any]]) -> None:
+    """
+    公開する宿題の問題を固定する（保存前に呼ぶ。previousは保存前の unit_id・question_count）
+
+    問題が未固定の場合と、単元・問題数が変更された場合に固定し直す。
+    """
+    if not homework.is_published:
+        return
+    if (
+        not homework.question_ids
+        or previous is None
+        or previous['unit_id'] != homework.unit_id
+        or previous['question_count'] != homework.question_count
+    ):
+        freeze_homework_questions(homework)
+    if homework.published_at is None:
+        homework.published_at = timezone.now()
+
+
+def rebuild_homework_audience(homework: Homework) -> None:
+    """宿題の対象を作り直す（公開中の宿題のみ対象を持つ）"""
+    HomeworkAudience.objects.filter(homework_id=homework.pk).delete()
+    if not homework.is_published:
+        return
+    HomeworkAudience.objects.create(
+        homework=homework,
+        prefecture=homework.scope_prefecture,
+        school=homework.scope_school,
+        class_name=homework.scope_class_name if homework.publish_scope == Homework.PublishScope.CLASS else '',
+    )
+
+
+def visible_homework(prefecture: str, school: str, class_name: str) -> List[Dict[str, Any]]:
+    """都道府県・学校・クラスの生徒に表示する宿題（新しい順。対象ごとにキャッシュ）"""
+    digest = hashlib.sha1(f'{prefecture}\0{school}\0{class_name}'.encode('utf-8')).hexdigest()
+    key = _AUDIENCE_KEY.format(version=get_content_version(), digest=digest)
+    assignments = cache.get(key)
+    if assignments is not None:
+        return assignments
+
+    audiences = HomeworkAudience.objects.filter(
+        prefecture=prefecture, school=school, class_name__in=['', class_name]
+    ).select_related('homework__unit__subject').order_by('-homework__published_at', '-homework_id')
+    assignments = []
+    for audience in audiences:
+        homework = audience.homework
+        unit = homework.unit
+        assignments.append({
+            'id': homework.id,
+            'slug': homework.public_slug,
+            'unit_label': f'{unit.subject.label_ja} {unit.grade_year} {unit.category}',
+            'question_count': len(homework.question_ids) or homework.question_count,
+            'published_at': homework.published_at,
+            'publish_scope': homework.publish_scope,
+        })
+    cache.set(key, assignments, HOMEWORK_AUDIENCE_TIMEOUT)
+    return assignments
+
+
+def homework_for_student(user) -> List[Dict[str, Any]]:
+    """生徒に表示する宿題（生徒プロファイルがなければ空）"""
+    try:
+        profile = user.student_profile
+    except ObjectDoesNotExist:
+        return []
+    return visible_homework(profile.prefecture, profile.school, profile.class_name)
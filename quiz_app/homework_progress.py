@@ -0,0 +1,132 @@
+"""
+宿題の提出状況（生徒 × 宿題の完了・得点の表）
+
+宿題ごとの生徒別の集計（開始回数・完了回数・最高得点・最終完了日時）は、宿題に紐づく
+クイズセッションをhomework_id・user_idで集計する1回のクエリで求め、宿題ごとにキャッシュする。
+生徒が宿題を開始・完了したときはその宿題のキャッシュを消し、次に表示するときに集計し直す。
+
+表の行（対象の生徒）は宿題の対象（都道府県・学校・クラス）に一致する生徒プロファイルを
+1回のクエリで取得するため、生徒が数千人の学校でも生徒ごとのクエリは発生しない。
+"""
+from typing import Any, Dict, Iterable, List, Optional
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from accounts.models import StudentProfile
+from .models import Homework, QuizSession
+
+# 集計のキャッシュ期間（秒）。開始・完了のたびに消すが、別プロセスでの開始・完了はこの時間で反映される
+HOMEWORK_PROGRESS_TIMEOUT = 60 * 10
+
+_PROGRESS_KEY = 'homework:progress:{homework_id}'
+
+
+def _empty_entry() -> Dict[str, Any]:
+    return {'started': 0, 'finished': 0, 'best_score': None, 'last_finished_at': None}
+
+
+def _load_progress(homework_ids: List[int]) -> Dict[int, Dict[int, Dict[str, Any]]]:
+    """宿題ごと・生徒ごとの集計（1回のクエリ）"""
+    finished = Q(finished_at__isnull=False)
+    rows = QuizSession.objects.filter(homework_id__in=homework_ids).values('homework_id', 'user_id').annotate(
+        started=Count('id'),
+        finished=Count('id', filter=finished),
+        best_score=Max('total_score', filter=finished),
+        last_finished_at=Max('finished_at'),
+    ).order_by()
+    progress: Dict[int, Dict[int, Dict[str, Any]]] = {homework_id: {} for homework_id in homework_ids}
+    for row in rows:
+        progress[row['homework_id']][row['user_id']] = {
+            'started': row['started'],
+            'finished': row['finished'],
+            'best_score': row['best_score'],
+            'last_finished_at': row['last_finished_at'],
+        }
+    return progress
+
+
+def homework_progress(homework_ids: Iterable[int]) -> Dict[int, Dict[int, Dict[str, Any]]]:
+    """宿題ID → {生徒のユーザーID → 集計}（キャッシュにない宿題はまとめて集計）"""
+    homework_ids = list(homework_ids)
+    keys = {homework_id: _PROGRESS_KEY.format(homework_id=homework_id) for homework_id in homework_ids}
+    cached = cache.get_many(list(keys.values()))
+    progress = {homework_id: cached[key] for homework_id, key in keys.items() if key in cached}
+    missing = [homework_id for homework_id in homework_ids if homework_id not in progress]
+    if missing:
+        loaded = _load_progress(missing)
+        cache.set_many({keys[homework_id]: loaded[homework_id] for homework_id in missing}, HOMEWORK_PROGRESS_TIMEOUT)
+        progress.update(loaded)
+    return progress
+
+
+def invalidate_homework_progress(session: QuizSession) -> None:
+    """
+    宿題のセッションの開始・完了でその宿題の集計のキャッシュを消す（トランザクション確定後）
+
+    キャッシュ済みの集計を読んで書き戻すと、クラス全員が同時に完了したときに互いの更新を
+    上書きしてしまうため、消すだけにして次に表示するときに1回のクエリで集計し直す。
+    """
+    if session.homework_id is None:
+        return
+    key = _PROGRESS_KEY.format(homework_id=session.homework_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _targets(homework: Homework, profile: Dict[str, Any]) -> bool:
+    if profile['prefecture'] != homework.scope_prefecture or profile['school'] != homework.scope_school:
+        return False
+    return homework.publish_scope == Homework.PublishScope.SCHOOL or profile['class_name'] == homework.scope_class_name
+
+
+def homework_roster(homeworks: List[Homework], school: str = '', class_name: str = '') -> List[Dict[str, Any]]:
+    """宿題の対象の生徒（学校・クラスで絞り込み可能）"""
+    condition = Q()
+    for homework in homeworks:
+        audience = Q(prefecture=homework.scope_prefecture, school=homework.scope_school)
+        if homework.publish_scope == Homework.PublishScope.CLASS:
+            audience &= Q(class_name=homework.scope_class_name)
+        condition |= audience
+    if not condition:
+        return []
+    profiles = StudentProfile.objects.filter(condition)
+    if school:
+        profiles = profiles.filter(school=school)
+    if class_name:
+        profiles = profiles.filter(class_name=class_name)
+    return list(profiles.order_by('school', 'class_name', 'nickname', 'user_id').values(
+        'user_id', 'user__username', 'nickname', 'prefecture', 'school', 'class_name'
+    ))
+
+
+def homework_matrix(homeworks: List[Homework], school: str = '', class_name: str = '') -> Dict[str, Any]:
+    """
+    生徒 × 宿題の提出状況の表
+
+    各セルは集計（未開始なら開始回数0）、対象外の宿題はNone。列ごとに対象人数・完了人数・平均得点を付ける。
+    """
+    roster = homework_roster(homeworks, school=school, class_name=class_name)
+    progress = homework_progress(homework.id for homework in homeworks)
+
+    columns = [{'homework': homework, 'targeted': 0, 'completed': 0, 'score_total': 0, 'scored': 0} for homework in homeworks]
+    rows = []
+    for profile in roster:
+        cells: List[Optional[Dict[str, Any]]] = []
+        for column in columns:
+            homework = column['homework']
+            if not _targets(homework, profile):
+                cells.append(None)
+                continue
+            entry = progress[homework.id].get(profile['user_id']) or _empty_entry()
+            column['targeted'] += 1
+            if entry['finished']:
+                column['completed'] += 1
+            if entry['best_score'] is not None:
+                column['score_total'] += entry['best_score']
+                column['scored'] += 1
+            cells.append(entry)
+        rows.append({'student': profile, 'cells': cells})
+
+    for column in columns:
+        column['completion_rate'] = column['completed'] / column['targeted'] * 100 if column['targeted'] else None
+        column['average_score'] = column['score_total'] / column['scored'] if column['scored'] else None
+    return {'columns': columns, 'rows': rows}
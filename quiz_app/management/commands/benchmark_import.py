@@ -0,0 +1,281 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import unicodedata
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from quiz_app.models import Subject
+from quiz_app.utils import (
+    process_xlsm_file, parse_alternatives, extract_unit_info, save_questions_from_xlsm_data
+)
+
+
+# ベンチマーク用の教科コード（ロールバックされるトランザクション内でのみ作成）
+BENCHMARK_SUBJECT_CODE = 'bench'
+
+
+class _Rollback(Exception):
+    """ベンチマーク後にデータベースの変更を破棄するための例外"""
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrssはLinuxではKB、macOSではバイト単位
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if platform.system() == 'Darwin' else 1024)
+
+
+def phase_function(phase, workbook_path, data):
+    """フェーズの処理（計測の対象）と処理する行数"""
+    if phase == 'process_xlsm_file':
+        return (lambda: process_xlsm_file(workbook_path, BENCHMARK_SUBJECT_CODE)), None
+    if phase == 'parse_alternatives':
+        # 別解・単元の解析は元のテキストに対して個別に計測
+        texts = ['/'.join(item['alternatives']) for item in data]
+        return (lambda: [parse_alternatives(text) for text in texts]), len(texts)
+    if phase == 'extract_unit_info':
+        texts = [item['unit_text'] for item in data]
+        return (lambda: [extract_unit_info(text) for text in texts]), len(texts)
+    return (lambda: save_questions_from_xlsm_data(data, BENCHMARK_SUBJECT_CODE, sync_supabase=False)), len(data)
+
+
+def measure_phase_memory(workbook_path, phase):
+    """
+    1つのフェーズのクエリ数・Pythonの割り当てのピーク・ピークRSSの増分を計測
+
+    ピークRSSが前の計測の影響を受けないよう、計測ごとに新しいワーカープロセスで実行する。
+    入力の準備（ワークブックの解析、更新の計測では1回目の保存）は計測の前に済ませ、
+    データベースの変更は最後にロールバックする。
+    """
+    data = None
+    if phase != 'process_xlsm_file':
+        data = process_xlsm_file(workbook_path, BENCHMARK_SUBJECT_CODE)['data']
+    try:
+        with transaction.atomic():
+            if phase.startswith('save_questions'):
+                Subject.objects.create(code=BENCHMARK_SUBJECT_CODE, label_ja='ベンチマーク')
+            if phase == 'save_questions_update':
+                save_questions_from_xlsm_data(data, BENCHMARK_SUBJECT_CODE, sync_supabase=False)
+            func, _ = phase_function(phase, workbook_path, data)
+
+            rss_before = _peak_rss_mb()
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            raise _Rollback({
+                'queries': len(queries.captured_queries),
+                'python_peak_mb': round(traced_peak / 1024 / 1024, 2),
+                'peak_rss_delta_mb': round(_peak_rss_mb() - rss_before, 1),
+            })
+    except _Rollback as rollback:
+        return rollback.args[0]
+
+
+class Command(BaseCommand):
+    help = 'XLSM取込処理のスループットを計測し、結果をJSONで出力します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='1000,10000,100000',
+            help='生成するワークブックの行数（カンマ区切り）',
+        )
+        parser.add_argument(
+            '--template',
+            type=str,
+            help='行データの元にするXLSMファイル（既定: media/xlsm_files内で最大のファイル）',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='結果JSONの出力先（既定: benchmark_results/import_<コミット>_<DB>.json）',
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='比較対象の過去の結果JSON（フェーズごとの行/秒の変化を表示）',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        template_path = options['template'] or self.default_template()
+        template_rows = self.load_template_rows(template_path)
+        if not template_rows:
+            raise CommandError(f'テンプレートに行がありません: {template_path}')
+
+        commit = self.current_commit()
+        report = {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'db_vendor': connection.vendor,
+            'db_name': str(connection.settings_dict.get('NAME')),
+            'template': os.path.basename(template_path),
+            'results': [],
+        }
+
+        self.stdout.write(f'テンプレート: {template_path} ({len(template_rows)}行)')
+        self.stdout.write(f'データベース: {connection.vendor}')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for size in sizes:
+                workbook_path = os.path.join(tmp_dir, f'bench_{size}.xlsx')
+                self.generate_workbook(template_rows, size, workbook_path)
+                self.stdout.write(f'\n=== {size}行 ===')
+                phases = self.run_phases(workbook_path, size)
+                report['results'].append({'rows': size, 'phases': phases})
+                for name, phase in phases.items():
+                    self.stdout.write(
+                        f"  {name}: {phase['seconds']:.3f}秒, {phase['rows_per_sec']:.0f}行/秒, "
+                        f"クエリ {phase['queries']}件, Python {phase['python_peak_mb']:.1f}MB, "
+                        f"ピークRSS +{phase['peak_rss_delta_mb']:.1f}MB"
+                    )
+
+        output_path = Path(options['output'] or (
+            Path(settings.BASE_DIR) / 'benchmark_results' / f'import_{commit[:8]}_{connection.vendor}.json'
+        ))
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'\n結果を保存しました: {output_path}'))
+
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+    def default_template(self):
+        """media/xlsm_files内で最大のファイルをテンプレートにする"""
+        candidates = sorted(
+            Path(settings.MEDIA_ROOT, 'xlsm_files').rglob('*.xlsm'),
+            key=lambda path: path.stat().st_size,
+            reverse=True,
+        )
+        if not candidates:
+            raise CommandError('media/xlsm_filesにテンプレートとなるXLSMファイルがありません。--templateで指定してください。')
+        return str(candidates[0])
+
+    def load_template_rows(self, template_path):
+        """テンプレートのデータ行（ヘッダー除く）を読み込む"""
+        workbook = load_workbook(template_path, read_only=True)
+        try:
+            rows = [
+                list(row) for row in workbook.active.iter_rows(min_row=2, values_only=True)
+                if row and row[0]
+            ]
+        finally:
+            workbook.close()
+
+        for row in rows:
+            # 単元の学年は半角数字のみ解析できるため、全角の「中１」などはNFKCで半角にそろえる
+            if len(row) > 1 and row[1]:
+                row[1] = unicodedata.normalize('NFKC', str(row[1]))
+        return rows
+
+    def generate_workbook(self, template_rows, size, path):
+        """テンプレートの行を繰り返して指定行数の合成ワークブックを作成"""
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet('問題')
+        worksheet.append(['ID', '単元', '問題', '正解', '別解', 'タイプ'] + [f'選択肢{i}' for i in range(1, 7)] + ['単位'])
+        for index in range(size):
+            row = list(template_rows[index % len(template_rows)])
+            row[0] = f'B{index + 1:07d}'
+            # 同じ問題文ばかりにならないよう周回数を付ける
+            if len(row) > 2 and row[2]:
+                row[2] = f'{row[2]} ({index // len(template_rows) + 1})'
+            worksheet.append(row)
+        workbook.save(path)
+
+    def measure(self, func, rows):
+        """処理時間を計測（計測の妨げにならないよう、メモリとクエリはmeasure_memoryで別に計測する）"""
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+        return result, {
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        }
+
+    def measure_memory(self, workbook_path, phases):
+        """各フェーズのクエリ数・メモリを、フェーズごとに新しいワーカープロセスで計測して結果に加える"""
+        import django
+        from concurrent.futures import ProcessPoolExecutor
+
+        # forkではこのプロセスのDB接続を引き継いでしまうため、forkserver・spawnで起動する
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        for phase in phases:
+            with ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=django.setup,
+            ) as executor:
+                phases[phase].update(executor.submit(measure_phase_memory, workbook_path, phase).result())
+
+    def run_phases(self, workbook_path, size):
+        """
+        取込処理の各フェーズを計測（データベースの変更は最後にロールバック）
+
+        処理時間はこのプロセスでtracemallocなどを使わずに計測し、クエリ数・メモリは別のプロセスで計測する。
+        """
+        phases = {}
+
+        func, _ = phase_function('process_xlsm_file', workbook_path, None)
+        parsed, phases['process_xlsm_file'] = self.measure(func, size)
+        if parsed['error_count']:
+            self.stdout.write(self.style.WARNING(f"  解析エラー {parsed['error_count']}件: {parsed['errors'][:3]}"))
+        data = parsed['data']
+
+        for phase in ('parse_alternatives', 'extract_unit_info'):
+            _, phases[phase] = self.measure(*phase_function(phase, workbook_path, data))
+
+        try:
+            with transaction.atomic():
+                Subject.objects.create(code=BENCHMARK_SUBJECT_CODE, label_ja='ベンチマーク')
+                for phase in ('save_questions_insert', 'save_questions_update'):
+                    _, phases[phase] = self.measure(*phase_function(phase, workbook_path, data))
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.measure_memory(workbook_path, phases)
+        return phases
+
+    def compare(self, report, baseline_path):
+        """過去の結果と行/秒を比較して表示"""
+        baseline = json.loads(Path(baseline_path).read_text(encoding='utf-8'))
+        baseline_results = {result['rows']: result['phases'] for result in baseline['results']}
+
+        self.stdout.write(f"\n=== 比較: {baseline.get('commit', '')[:8]} → {report['commit'][:8]} ===")
+        for result in report['results']:
+            previous_phases = baseline_results.get(result['rows'])
+            if not previous_phases:
+                continue
+            for name, phase in result['phases'].items():
+                previous = previous_phases.get(name)
+                if not previous or not previous.get('rows_per_sec') or not phase.get('rows_per_sec'):
+                    continue
+                ratio = phase['rows_per_sec'] / previous['rows_per_sec']
+                line = f"  {result['rows']}行 {name}: {previous['rows_per_sec']:.0f} → {phase['rows_per_sec']:.0f}行/秒 ({ratio:.2f}倍)"
+                if ratio < 0.9:
+                    self.stdout.write(self.style.WARNING(line))
+                else:
+                    self.stdout.write(line)
+
+    def current_commit(self):
+        """現在のgitコミットハッシュ（取得できない場合はunknown）"""
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL
+            ).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown'
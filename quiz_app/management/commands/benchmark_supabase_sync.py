@@ -0,0 +1,106 @@
+import time
+import requests
+from django.core.management.base import BaseCommand
+from quiz_app.fake_postgrest import FakePostgREST
+from quiz_app.supabase_sync import upsert_rows
+from quiz_app.sync_executor import SyncExecutor
+
+
+TABLE = 'quiz_app_question'
+
+
+class Command(BaseCommand):
+    help = 'ローカルの疑似PostgRESTサーバーに対してSupabase同期の処理時間を計測します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=str,
+            default='700,5000',
+            help='同期する問題数（カンマ区切り）',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.02,
+            help='1リクエストあたりの疑似遅延（秒）',
+        )
+        parser.add_argument(
+            '--failures',
+            type=int,
+            default=2,
+            help='一括同期の開始時に返す一時エラーの件数（再試行の確認用）',
+        )
+        parser.add_argument(
+            '--skip-legacy',
+            action='store_true',
+            help='1問ずつPATCHする従来方式の計測を省略',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['rows'].split(',') if size.strip()]
+        latency = options['latency']
+        self.stdout.write(f'疑似遅延: {latency * 1000:.0f}ms/リクエスト')
+
+        for size in sizes:
+            self.stdout.write(f'\n=== {size}問 ===')
+            existing = [self.make_row(index, ['旧別解']) for index in range(size)]
+            updated = [self.make_row(index, [f'別解{index}']) for index in range(size)]
+
+            if not options['skip_legacy']:
+                with FakePostgREST(latency=latency) as server:
+                    server.seed(TABLE, existing)
+                    seconds = self.run_legacy(server.url, updated)
+                    self.report('従来（1問ずつPATCH）', seconds, server.request_count, self.verify(server, updated))
+
+            with FakePostgREST(latency=latency) as server:
+                server.seed(TABLE, existing)
+                server.fail_next(options['failures'])
+                started = time.perf_counter()
+                with SyncExecutor(server.url, 'benchmark', rate_limit=0, backoff=0.05) as executor:
+                    result = upsert_rows(executor, TABLE, updated)
+                seconds = time.perf_counter() - started
+                self.report('一括upsert', seconds, server.request_count, self.verify(server, updated))
+                if result['errors']:
+                    self.stdout.write(self.style.ERROR(f"  エラー: {result['errors'][:3]}"))
+
+    def make_row(self, index, alternatives):
+        return {
+            'id': index + 1,
+            'unit_id': 1,
+            'source_id': f'B{index + 1:07d}',
+            'question_type': 'text',
+            'text': f'問題{index + 1}',
+            'correct_answer': f'正解{index + 1}',
+            'accepted_alternatives': alternatives,
+            'choices': [],
+            'parts_count': 1,
+            'requires_unit_label': False,
+            'unit_label_text': '',
+        }
+
+    def run_legacy(self, base_url, rows):
+        """変更前の同期処理と同じく、接続を再利用せず1問ずつPATCHする"""
+        headers = {
+            'apikey': 'benchmark',
+            'Authorization': 'Bearer benchmark',
+            'Content-Type': 'application/json',
+            'Prefer': 'return=representation',
+        }
+        started = time.perf_counter()
+        for row in rows:
+            requests.patch(
+                f"{base_url}/rest/v1/{TABLE}?id=eq.{row['id']}",
+                headers=headers,
+                json={'accepted_alternatives': row['accepted_alternatives']},
+                timeout=30,
+            )
+        return time.perf_counter() - started
+
+    def verify(self, server, expected):
+        stored = {row['id']: row['accepted_alternatives'] for row in server.rows(TABLE)}
+        return all(stored.get(row['id']) == row['accepted_alternatives'] for row in expected)
+
+    def report(self, label, seconds, request_count, ok):
+        status = self.style.SUCCESS('一致') if ok else self.style.ERROR('不一致')
+        self.stdout.write(f'  {label}: {seconds:.3f}秒, リクエスト {request_count}件, 結果 {status}')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from quiz_app.models import SyncOutbox
+from quiz_app.sync_outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Supabaseへの送信待ちの問題をまとめて送信します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='送信に繰り返し失敗した問題も再送する',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            reset = SyncOutbox.objects.filter(attempts__gt=0).update(attempts=0)
+            self.stdout.write(f'失敗した問題を再送対象に戻しました: {reset}件')
+
+        pending = SyncOutbox.objects.count()
+        self.stdout.write(f'送信待ち: {pending}件')
+
+        result = drain_outbox()
+        if result.get('skipped'):
+            self.stdout.write(self.style.ERROR('Supabase環境変数が設定されていません。'))
+            return
+
+        self.stdout.write(f"送信件数: {result['sent_count']}")
+        self.stdout.write(f"失敗件数: {result['failed_count']}")
+        remaining = SyncOutbox.objects.count()
+        if remaining:
+            self.stdout.write(self.style.WARNING(f'送信待ちに残っている問題: {remaining}件'))
+        else:
+            self.stdout.write(self.style.SUCCESS('送信待ちの問題をすべて送信しました。'))
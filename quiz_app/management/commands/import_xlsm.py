@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from quiz_app.models import Subject
+from quiz_app.utils import import_xlsm_files
+from quiz_app.static_catalog import render_static_catalog
+
+
+class Command(BaseCommand):
+    help = '複数のXLSMファイル（または全シート）を並列解析して問題を一括登録します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files',
+            nargs='+',
+            help='取り込むXLSMファイルのパス（複数指定可）',
+        )
+        parser.add_argument(
+            '--subject',
+            type=str,
+            required=True,
+            help='教科コードを指定（例: science）',
+        )
+        parser.add_argument(
+            '--all-sheets',
+            action='store_true',
+            help='アクティブシートだけでなく全シートを取り込む',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='解析に使うワーカープロセス数（既定: CPUコア数）',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='解析のみ行い、データベースには保存しない',
+        )
+        parser.add_argument(
+            '--no-sync',
+            action='store_true',
+            help='保存後のSupabase同期を行わない',
+        )
+
+    def handle(self, *args, **options):
+        subject_code = options['subject']
+        if not Subject.objects.filter(code=subject_code).exists():
+            raise CommandError(f'教科コード {subject_code} が存在しません。')
+
+        self.stdout.write(f'対象ファイル数: {len(options["files"])}')
+        self.stdout.write(f'全シート: {options["all_sheets"]}')
+
+        result = import_xlsm_files(
+            options['files'],
+            subject_code,
+            all_sheets=options['all_sheets'],
+            max_workers=options['workers'],
+            dry_run=options['dry_run'],
+            sync_supabase=not options['no_sync'],
+        )
+
+        # シートごとの解析結果
+        self.stdout.write('\n=== シート別解析結果 ===')
+        for sheet in result['sheets']:
+            label = f"{sheet['file']} [{sheet['sheet']}]"
+            if sheet['error_count']:
+                self.stdout.write(self.style.ERROR(
+                    f"{label}: データ {sheet['total_rows']}件, エラー {sheet['error_count']}件（このシートは保存されません）"
+                ))
+                for error in sheet['errors'][:10]:
+                    self.stdout.write(f'  - {error}')
+                if len(sheet['errors']) > 10:
+                    self.stdout.write(f"  ... 他 {len(sheet['errors']) - 10} 件のエラー")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{label}: データ {sheet['total_rows']}件"))
+
+        save_result = result['save_result']
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"\n※ ドライランモードです。保存対象 {result['total_rows']}件は保存されていません。"
+            ))
+            return
+
+        if save_result is None:
+            self.stdout.write(self.style.WARNING('\n保存対象のデータがありません。'))
+            return
+
+        self.stdout.write('\n=== 保存結果 ===')
+        self.stdout.write(f"  新規: {save_result['saved_count']}件")
+        self.stdout.write(f"  更新: {save_result['updated_count']}件")
+        if save_result['errors']:
+            self.stdout.write('\nエラー詳細:')
+            for error in save_result['errors'][:10]:
+                self.stdout.write(f'  - {error}')
+
+        if not save_result['errors']:
+            # 公開ページ（静的HTML）を書き出し直す
+            result = render_static_catalog()
+            if not result['unchanged']:
+                self.stdout.write(f"公開ページを書き出しました（{result['page_count']}ページ）")
+
+        self.stdout.write(self.style.SUCCESS('\n一括登録が完了しました。'))
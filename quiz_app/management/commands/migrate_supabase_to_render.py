@@ -2,7 +2,8 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from quiz_app.models import Subject, Unit, Question
 from accounts.models import StudentProfile, AdminProfile
-import os
+from quiz_app.supabase_sync import get_supabase_config, count_rows
+from quiz_app.sync_executor import add_executor_arguments, executor_from_options
 
 User = get_user_model()
 
@@ -10,6 +11,17 @@ User = get_user_model()
 class Command(BaseCommand):
     help = 'SupabaseのデータをRenderのPostgreSQLに移行します'
 
+    # Supabase側で件数を確認するテーブル
+    SUPABASE_TABLES = [
+        ('教科', 'quiz_app_subject'),
+        ('単元', 'quiz_app_unit'),
+        ('問題', 'quiz_app_question'),
+        ('ユーザー', 'accounts_user'),
+    ]
+
+    def add_arguments(self, parser):
+        add_executor_arguments(parser)
+
     def handle(self, *args, **options):
         self.stdout.write('🚀 SupabaseからRenderへのデータ移行を開始...')
         
@@ -40,11 +52,7 @@ class Command(BaseCommand):
             self.stdout.write(f'🗑️ 合計{deleted_count}件のサンプルデータを削除しました')
             
             # 2. Supabaseのデータを確認（実際の移行は手動で行う必要があります）
-            self.stdout.write('📊 Supabaseのデータ状況:')
-            self.stdout.write('  - 教科: 2件')
-            self.stdout.write('  - 単元: 13件')
-            self.stdout.write('  - 問題: 718件')
-            self.stdout.write('  - ユーザー: 6件')
+            self.show_supabase_counts(options)
             
             # 3. 手動移行の手順を表示
             self.stdout.write(self.style.WARNING('⚠️ 手動移行が必要です'))
@@ -132,3 +140,24 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(traceback.format_exc()))
         
         self.stdout.write('✅ 移行準備完了')
+
+    def show_supabase_counts(self, options):
+        """Supabaseの各テーブルの件数を並列に取得して表示"""
+        self.stdout.write('📊 Supabaseのデータ状況:')
+        config = get_supabase_config()
+        if config is None:
+            self.stdout.write('  - Supabase環境変数が設定されていないため確認できません')
+            return
+        
+        with executor_from_options(config, options) as executor:
+            results, failures, _ = executor.map(
+                lambda table: count_rows(executor, table[1]), self.SUPABASE_TABLES, label='件数取得'
+            )
+        
+        counts = {table: count for (_, table), count in results}
+        failed = {table: error for (_, table), error in failures}
+        for label, table in self.SUPABASE_TABLES:
+            if table in counts:
+                self.stdout.write(f'  - {label}: {counts[table]}件')
+            else:
+                self.stdout.write(f'  - {label}: 取得失敗（{failed.get(table, "中断")}）')
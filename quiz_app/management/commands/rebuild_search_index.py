@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from quiz_app.search import get_search_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = '問題の全文検索索引を作り直します'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            self.stdout.write(self.style.ERROR(f'このデータベース（{connection.vendor}）は検索索引に対応していません。'))
+            return
+
+        self.stdout.write(f'検索索引: {type(backend).__name__}')
+        started = time.perf_counter()
+        with transaction.atomic():
+            count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'{count}問を登録しました（{time.perf_counter() - started:.2f}秒）'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from quiz_app.catalog_cache import bump_content_version
+from quiz_app.question_counts import recount_question_counts
+
+
+class Command(BaseCommand):
+    help = '単元・教科の問題数と単元数を数え直して修正します'
+
+    def handle(self, *args, **options):
+        fixes = recount_question_counts()
+        if not fixes:
+            self.stdout.write(self.style.SUCCESS('問題数・単元数にずれはありません。'))
+            return
+
+        for fix in fixes:
+            self.stdout.write(f'  {fix}')
+        # update()ではシグナルが送られないため、表示データのキャッシュを無効にする
+        bump_content_version()
+        self.stdout.write(self.style.SUCCESS(f'{len(fixes)}件のずれを修正しました。'))
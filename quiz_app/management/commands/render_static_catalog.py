@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from quiz_app.static_catalog import STATIC_CATALOG_URL, render_static_catalog
+
+
+class Command(BaseCommand):
+    help = 'ホーム・教科・単元ページを静的HTMLに書き出します（WhiteNoiseで /catalog/ から配信）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='書き出し先のディレクトリ（省略時はSTATIC_CATALOG_ROOT）',
+        )
+
+    def handle(self, *args, **options):
+        result = render_static_catalog(options['output'])
+
+        self.stdout.write(f"書き出し先: {result['root']}")
+        self.stdout.write(f"ページ数: {result['page_count']}")
+        if result['unchanged']:
+            self.stdout.write(self.style.SUCCESS(f"内容に変更はありません（世代: {result['generation']}）"))
+            return
+
+        self.stdout.write(f"世代: {result['generation']}（{STATIC_CATALOG_URL}{result['generation']}/）")
+        if result['removed_generations']:
+            self.stdout.write(f"削除した古い世代: {', '.join(result['removed_generations'])}")
+        self.stdout.write(self.style.SUCCESS(f'公開ページを書き出しました。入口: {STATIC_CATALOG_URL}'))
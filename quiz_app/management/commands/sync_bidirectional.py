@@ -1,10 +1,16 @@
-import os
 import json
-import requests
 from django.core.management.base import BaseCommand
-from django.conf import settings
-from quiz_app.models import Question, Subject, Unit
-from datetime import datetime
+from django.db import transaction
+from quiz_app.models import Question, SyncState
+from quiz_app.supabase_sync import (
+    QUESTION_COMPARE_FIELDS, get_supabase_config, get_sync_state, questions_changed_since,
+    question_rows_for_sync, fetch_remote_questions, fetch_remote_questions_by_ids,
+    question_fingerprint, upsert_rows, parse_remote_datetime, advance_sync_state,
+)
+from quiz_app.sync_executor import SyncError, add_executor_arguments, executor_from_options
+from quiz_app.utils import BULK_BATCH_SIZE
+from quiz_app.catalog_cache import schedule_content_version_bump
+from quiz_app.search import index_questions
 
 
 class Command(BaseCommand):
@@ -28,236 +34,219 @@ class Command(BaseCommand):
             action='store_true',
             help='実際の更新を行わず、変更内容のみを表示',
         )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='前回の同期位置を無視して全問題を対象にする',
+        )
+        add_executor_arguments(parser)
 
     def handle(self, *args, **options):
-        supabase_url = os.getenv('SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_ANON_KEY')
-        
-        if not supabase_url or not supabase_key:
+        config = get_supabase_config()
+
+        if config is None:
             self.stdout.write(
                 self.style.ERROR('Supabase環境変数が設定されていません。')
             )
             return
-        
-        headers = {
-            'apikey': supabase_key,
-            'Authorization': f'Bearer {supabase_key}',
-            'Content-Type': 'application/json',
-        }
-        
+
         direction = options['direction']
         subject_filter = options['subject']
         dry_run = options['dry_run']
-        
+        full = options['full']
+
         self.stdout.write(f'同期方向: {direction}')
         self.stdout.write(f'対象教科: {subject_filter or "全教科"}')
         self.stdout.write(f'ドライラン: {dry_run}')
-        
-        if direction in ['django-to-supabase', 'bidirectional']:
-            self.sync_django_to_supabase(headers, subject_filter, dry_run)
-        
-        if direction in ['supabase-to-django', 'bidirectional']:
-            self.sync_supabase_to_django(headers, subject_filter, dry_run)
-    
-    def sync_django_to_supabase(self, headers, subject_filter, dry_run):
-        """DjangoからSupabaseへの同期"""
+        self.stdout.write(f'全件同期: {full}')
+
+        with executor_from_options(config, options, self.stdout) as executor:
+            if direction in ['django-to-supabase', 'bidirectional']:
+                self.sync_django_to_supabase(executor, subject_filter, dry_run, full)
+
+            if direction in ['supabase-to-django', 'bidirectional'] and not executor.cancel_event.is_set():
+                self.sync_supabase_to_django(executor, subject_filter, dry_run, full)
+
+    def sync_django_to_supabase(self, executor, subject_filter, dry_run, full):
+        """
+        DjangoからSupabaseへの同期（前回の同期以降に更新された問題のみ）
+
+        対象の問題をSupabaseからIDでまとめて取得し、フィールドのハッシュで差分を判定して、
+        新規・変更のある行だけをまとめてupsertする。
+        """
         self.stdout.write('\n=== Django → Supabase 同期開始 ===')
-        
+
+        state = get_sync_state(SyncState.Direction.DJANGO_TO_SUPABASE, subject_filter)
         questions = Question.objects.all()
         if subject_filter:
             questions = questions.filter(unit__subject__code=subject_filter)
-        
-        updated_count = 0
-        failed_count = 0
+        local_rows = question_rows_for_sync(questions_changed_since(questions, None if full else state))
+        self.stdout.write(f'対象問題数: {len(local_rows)}（前回の同期位置: {self.describe_state(state)}）')
+
+        # Supabaseのデータを取得
+        try:
+            remote_rows = fetch_remote_questions_by_ids(executor, [row['id'] for row in local_rows])
+        except SyncError as e:
+            self.stdout.write(
+                self.style.ERROR(f'Supabaseからのデータ取得に失敗しました: {e}')
+            )
+            return
+
+        # データを比較
+        created_ids = []
+        rows_to_write = []
+        for row in local_rows:
+            remote_row = remote_rows.get(row['id'])
+            if remote_row is None:
+                created_ids.append(row['id'])
+                rows_to_write.append(row)
+            elif question_fingerprint(row) != question_fingerprint(remote_row):
+                rows_to_write.append(row)
+            elif dry_run:
+                self.stdout.write(f"問題ID {row['id']}: 変更なし")
+
+        failed_ids = set()
         errors = []
-        
-        for question in questions:
-            try:
-                # Supabaseのデータを取得
-                response = requests.get(
-                    f"{supabase_url}/rest/v1/quiz_app_question?id=eq.{question.id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    failed_count += 1
-                    errors.append(f"問題ID {question.id} 取得失敗 ({response.status_code})")
-                    continue
-                
-                supabase_data = response.json()
-                if not supabase_data:
-                    # Supabaseにデータが存在しない場合は作成
-                    if not dry_run:
-                        self.create_supabase_question(headers, question)
-                    updated_count += 1
-                    self.stdout.write(f"問題ID {question.id}: Supabaseに新規作成")
-                    continue
-                
-                # データを比較して更新
-                supabase_question = supabase_data[0]
-                update_data = self.prepare_update_data(question, supabase_question)
-                
-                if update_data:
-                    if not dry_run:
-                        response = requests.patch(
-                            f"{supabase_url}/rest/v1/quiz_app_question?id=eq.{question.id}",
-                            headers=headers,
-                            json=update_data,
-                            timeout=30
-                        )
-                        
-                        if response.status_code == 200:
-                            updated_count += 1
-                            self.stdout.write(f"問題ID {question.id}: 更新完了")
-                        else:
-                            failed_count += 1
-                            errors.append(f"問題ID {question.id} 更新失敗 ({response.status_code})")
-                    else:
-                        updated_count += 1
-                        self.stdout.write(f"問題ID {question.id}: 更新予定")
-                else:
-                    if dry_run:
-                        self.stdout.write(f"問題ID {question.id}: 変更なし")
-                        
-            except Exception as e:
-                failed_count += 1
-                errors.append(f"問題ID {question.id} エラー: {str(e)}")
-        
+        if rows_to_write and not dry_run:
+            result = upsert_rows(executor, 'quiz_app_question', rows_to_write)
+            failed_ids = set(result['failed_keys'])
+            errors = result['errors']
+
+        created = set(created_ids)
+        for row in rows_to_write:
+            if row['id'] in failed_ids:
+                continue
+            if row['id'] in created:
+                self.stdout.write(f"問題ID {row['id']}: Supabaseに新規作成")
+            else:
+                self.stdout.write(f"問題ID {row['id']}: {'更新予定' if dry_run else '更新完了'}")
+
+        if not dry_run:
+            advance_sync_state(
+                state,
+                [(parse_remote_datetime(row['updated_at']), row['id']) for row in local_rows],
+                {row['id'] for row in local_rows} - failed_ids,
+            )
+
         self.stdout.write(f'\nDjango → Supabase 同期結果:')
-        self.stdout.write(f'  更新件数: {updated_count}')
-        self.stdout.write(f'  失敗件数: {failed_count}')
-        
+        self.stdout.write(f'  更新件数: {len(rows_to_write) - len(failed_ids)}')
+        self.stdout.write(f'  失敗件数: {len(failed_ids)}')
+
         if errors:
             self.stdout.write('\nエラー詳細:')
             for error in errors[:10]:
                 self.stdout.write(f'  - {error}')
-    
-    def sync_supabase_to_django(self, headers, subject_filter, dry_run):
-        """SupabaseからDjangoへの同期"""
+
+    def sync_supabase_to_django(self, executor, subject_filter, dry_run, full):
+        """
+        SupabaseからDjangoへの同期（前回の同期以降にSupabaseで更新された問題のみ）
+
+        Supabaseの変更行をページ分割して取得し、Django側はin_bulkで一度に読み込んで
+        フィールドのハッシュで差分を判定する。更新はbulk_updateでまとめて書き込む。
+        """
         self.stdout.write('\n=== Supabase → Django 同期開始 ===')
-        
-        # Supabaseから全データを取得
+
+        state = get_sync_state(SyncState.Direction.SUPABASE_TO_DJANGO, subject_filter)
+
+        # Supabaseから変更された行を取得
         try:
-            response = requests.get(
-                f"{supabase_url}/rest/v1/quiz_app_question",
-                headers=headers,
-                timeout=30
+            supabase_questions = fetch_remote_questions(executor, None if full else state)
+
+        except SyncError as e:
+            self.stdout.write(
+                self.style.ERROR(f'Supabaseからのデータ取得に失敗しました: {e}')
             )
-            
-            if response.status_code != 200:
-                self.stdout.write(
-                    self.style.ERROR(f'Supabaseからのデータ取得に失敗しました: {response.status_code}')
-                )
-                return
-            
-            supabase_questions = response.json()
-            
+            return
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Supabaseからのデータ取得エラー: {str(e)}')
             )
             return
-        
-        updated_count = 0
-        failed_count = 0
+
+        self.stdout.write(f'対象問題数: {len(supabase_questions)}（前回の同期位置: {self.describe_state(state)}）')
+
+        django_questions = Question.objects.select_related('unit__subject').in_bulk(
+            [row['id'] for row in supabase_questions if row.get('id')]
+        )
+
+        changed_questions = []
+        changed_fields = set()
         errors = []
-        
+        missing_ids = set()
+
         for supabase_question in supabase_questions:
-            try:
-                question_id = supabase_question.get('id')
-                if not question_id:
-                    continue
-                
-                # Djangoのデータを取得
-                try:
-                    django_question = Question.objects.get(id=question_id)
-                except Question.DoesNotExist:
-                    failed_count += 1
-                    errors.append(f"問題ID {question_id} Djangoに存在しません")
-                    continue
-                
-                # 教科フィルター
-                if subject_filter and django_question.unit.subject.code != subject_filter:
-                    continue
-                
-                # データを比較して更新
-                update_fields = self.prepare_django_update(django_question, supabase_question)
-                
-                if update_fields:
-                    if not dry_run:
-                        for field, value in update_fields.items():
-                            setattr(django_question, field, value)
-                        django_question.save()
-                        updated_count += 1
-                        self.stdout.write(f"問題ID {question_id}: 更新完了")
-                    else:
-                        updated_count += 1
-                        self.stdout.write(f"問題ID {question_id}: 更新予定")
-                else:
-                    if dry_run:
-                        self.stdout.write(f"問題ID {question_id}: 変更なし")
-                        
-            except Exception as e:
-                failed_count += 1
-                errors.append(f"問題ID {question_id} エラー: {str(e)}")
-        
+            question_id = supabase_question.get('id')
+            if not question_id:
+                continue
+
+            django_question = django_questions.get(question_id)
+            if django_question is None:
+                errors.append(f"問題ID {question_id} Djangoに存在しません")
+                missing_ids.add(question_id)
+                continue
+
+            # 教科フィルター
+            if subject_filter and django_question.unit.subject.code != subject_filter:
+                continue
+
+            local_values = {field: getattr(django_question, field) for field in QUESTION_COMPARE_FIELDS}
+            if question_fingerprint(local_values) == question_fingerprint(supabase_question):
+                if dry_run:
+                    self.stdout.write(f"問題ID {question_id}: 変更なし")
+                continue
+
+            update_fields = self.prepare_django_update(django_question, supabase_question)
+            for field, value in update_fields.items():
+                setattr(django_question, field, value)
+            # 更新日時はSupabase側の値にそろえる（Django → Supabase同期で送り返さないように）
+            remote_updated_at = parse_remote_datetime(supabase_question.get('updated_at'))
+            if remote_updated_at is not None:
+                django_question.updated_at = remote_updated_at
+            changed_questions.append(django_question)
+            changed_fields.update(update_fields)
+            self.stdout.write(f"問題ID {question_id}: {'更新予定' if dry_run else '更新完了'}")
+
+        if not dry_run:
+            if changed_questions:
+                with transaction.atomic():
+                    Question.objects.bulk_update(
+                        changed_questions,
+                        sorted(changed_fields) + ['updated_at'],
+                        batch_size=BULK_BATCH_SIZE,
+                    )
+                    schedule_content_version_bump()
+                    index_questions([question.id for question in changed_questions])
+            # Django側に存在しない行の手前で同期位置を止め、その行は次回も対象にする
+            advance_sync_state(
+                state,
+                [(parse_remote_datetime(row.get('updated_at')), row.get('id')) for row in supabase_questions],
+                {row.get('id') for row in supabase_questions} - missing_ids,
+            )
+
         self.stdout.write(f'\nSupabase → Django 同期結果:')
-        self.stdout.write(f'  更新件数: {updated_count}')
-        self.stdout.write(f'  失敗件数: {failed_count}')
-        
+        self.stdout.write(f'  更新件数: {len(changed_questions)}')
+        self.stdout.write(f'  失敗件数: {len(errors)}')
+
         if errors:
             self.stdout.write('\nエラー詳細:')
             for error in errors[:10]:
                 self.stdout.write(f'  - {error}')
-    
-    def prepare_update_data(self, django_question, supabase_question):
-        """DjangoデータをSupabase用に準備"""
-        update_data = {}
-        
-        # 基本フィールドの比較
-        fields_to_sync = [
-            'text', 'correct_answer', 'parts_count', 'requires_unit_label',
-            'unit_label_text', 'question_type', 'choices', 'accepted_alternatives'
-        ]
-        
-        for field in fields_to_sync:
-            django_value = getattr(django_question, field, None)
-            supabase_value = supabase_question.get(field)
-            
-            # JSONFieldの処理
-            if field in ['choices', 'accepted_alternatives']:
-                if isinstance(django_value, str):
-                    try:
-                        django_value = json.loads(django_value)
-                    except json.JSONDecodeError:
-                        django_value = []
-                
-                if isinstance(supabase_value, str):
-                    try:
-                        supabase_value = json.loads(supabase_value)
-                    except json.JSONDecodeError:
-                        supabase_value = []
-            
-            if django_value != supabase_value:
-                update_data[field] = django_value
-        
-        return update_data
-    
+
+    def describe_state(self, state):
+        """同期状態の表示用文字列"""
+        if state.last_updated_at is None:
+            return '未同期'
+        return f'{state.last_updated_at.isoformat()} / ID {state.last_id}'
+
     def prepare_django_update(self, django_question, supabase_question):
         """SupabaseデータをDjango用に準備"""
         update_fields = {}
-        
+
         # 基本フィールドの比較
-        fields_to_sync = [
-            'text', 'correct_answer', 'parts_count', 'requires_unit_label',
-            'unit_label_text', 'question_type', 'choices', 'accepted_alternatives'
-        ]
-        
-        for field in fields_to_sync:
+        for field in QUESTION_COMPARE_FIELDS:
             django_value = getattr(django_question, field, None)
             supabase_value = supabase_question.get(field)
-            
+
             # JSONFieldの処理
             if field in ['choices', 'accepted_alternatives']:
                 if isinstance(django_value, str):
@@ -265,41 +254,14 @@ class Command(BaseCommand):
                         django_value = json.loads(django_value)
                     except json.JSONDecodeError:
                         django_value = []
-                
+
                 if isinstance(supabase_value, str):
                     try:
                         supabase_value = json.loads(supabase_value)
                     except json.JSONDecodeError:
                         supabase_value = []
-            
+
             if django_value != supabase_value:
                 update_fields[field] = supabase_value
-        
+
         return update_fields
-    
-    def create_supabase_question(self, headers, question):
-        """Supabaseに新しい問題を作成"""
-        create_data = {
-            'id': question.id,
-            'text': question.text,
-            'correct_answer': question.correct_answer,
-            'parts_count': question.parts_count,
-            'requires_unit_label': question.requires_unit_label,
-            'unit_label_text': question.unit_label_text,
-            'question_type': question.question_type,
-            'choices': question.choices,
-            'accepted_alternatives': question.accepted_alternatives,
-            'unit_id': question.unit.id,
-            'source_id': question.source_id,
-            'created_at': question.created_at.isoformat() if question.created_at else None,
-            'updated_at': question.updated_at.isoformat() if question.updated_at else None
-        }
-        
-        response = requests.post(
-            f"{supabase_url}/rest/v1/quiz_app_question",
-            headers=headers,
-            json=create_data,
-            timeout=30
-        )
-        
-        return response.status_code == 201
@@ -1,9 +1,10 @@
-import os
 import json
-import requests
 from django.core.management.base import BaseCommand
-from django.conf import settings
-from quiz_app.models import Question
+from quiz_app.models import Question, SyncState
+from quiz_app.supabase_sync import (
+    get_supabase_config, get_sync_state, fetch_remote_questions, parse_remote_datetime, advance_sync_state,
+)
+from quiz_app.sync_executor import SyncError, add_executor_arguments, executor_from_options
 
 
 class Command(BaseCommand):
@@ -20,57 +21,66 @@ class Command(BaseCommand):
             action='store_true',
             help='実際の更新を行わず、変更内容のみを表示',
         )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='前回の同期位置を無視して全問題を対象にする',
+        )
+        add_executor_arguments(parser)
 
     def handle(self, *args, **options):
-        supabase_url = os.getenv('SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_ANON_KEY')
+        config = get_supabase_config()
         
-        if not supabase_url or not supabase_key:
+        if config is None:
             self.stdout.write(
                 self.style.ERROR('Supabase環境変数が設定されていません。')
             )
             return
         
-        headers = {
-            'apikey': supabase_key,
-            'Authorization': f'Bearer {supabase_key}',
-            'Content-Type': 'application/json',
-        }
+        state = get_sync_state(SyncState.Direction.ALTERNATIVES_FROM_SUPABASE, options['subject'])
+        
+        # 前回の同期以降にSupabaseで更新された行だけを取得
+        with executor_from_options(config, options, self.stdout) as executor:
+            try:
+                remote_rows = fetch_remote_questions(
+                    executor, None if options['full'] else state, select='id,accepted_alternatives,updated_at'
+                )
+            except SyncError as e:
+                self.stdout.write(self.style.ERROR(f'Supabaseからのデータ取得に失敗しました: {e}'))
+                return
         
         # 対象の質問を取得
-        questions = Question.objects.all()
+        remote_ids = [row['id'] for row in remote_rows]
+        questions = Question.objects.filter(id__in=remote_ids)
         if options['subject']:
             questions = questions.filter(unit__subject__code=options['subject'])
+        questions = questions.in_bulk()
+        # Djangoに存在する問題のID（教科の指定で対象外になった問題を、存在しない問題と区別する）
+        if options['subject']:
+            local_ids = set(Question.objects.filter(id__in=remote_ids).values_list('id', flat=True))
+        else:
+            local_ids = set(questions)
         
-        self.stdout.write(f'対象問題数: {questions.count()}')
+        self.stdout.write(f'対象問題数: {len(questions)}（Supabaseの変更 {len(remote_rows)}件）')
         
         updated_count = 0
         failed_count = 0
         errors = []
+        processed_ids = set()
+        missing_ids = []
         
-        for question in questions:
+        for row in remote_rows:
+            question = questions.get(row['id'])
+            if question is None:
+                if row['id'] in local_ids:
+                    # 他の教科の問題
+                    processed_ids.add(row['id'])
+                else:
+                    # Djangoに存在しない問題。同期位置はこの行の手前で止め、次回も対象にする
+                    missing_ids.append(row['id'])
+                continue
             try:
-                # Supabaseからデータを取得
-                response = requests.get(
-                    f"{supabase_url}/rest/v1/quiz_app_question?id=eq.{question.id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    failed_count += 1
-                    error_msg = f"問題ID {question.id} 取得失敗 ({response.status_code})"
-                    errors.append(error_msg)
-                    continue
-                
-                data = response.json()
-                if not data:
-                    failed_count += 1
-                    error_msg = f"問題ID {question.id} データが見つかりません"
-                    errors.append(error_msg)
-                    continue
-                
-                supabase_alternatives = data[0].get('accepted_alternatives', [])
+                supabase_alternatives = row.get('accepted_alternatives', [])
                 
                 # 現在のDjangoデータと比較
                 current_alternatives = question.accepted_alternatives or []
@@ -103,25 +113,30 @@ class Command(BaseCommand):
                 else:
                     if options['dry_run']:
                         self.stdout.write(f"問題ID {question.id}: 変更なし")
+                processed_ids.add(question.id)
                         
-            except requests.exceptions.Timeout:
-                failed_count += 1
-                error_msg = f"問題ID {question.id} タイムアウト"
-                errors.append(error_msg)
-            except requests.exceptions.RequestException as e:
-                failed_count += 1
-                error_msg = f"問題ID {question.id} ネットワークエラー: {str(e)}"
-                errors.append(error_msg)
             except Exception as e:
                 failed_count += 1
                 error_msg = f"問題ID {question.id} エラー: {str(e)}"
                 errors.append(error_msg)
         
+        if not options['dry_run']:
+            advance_sync_state(
+                state,
+                [(parse_remote_datetime(row.get('updated_at')), row['id']) for row in remote_rows],
+                processed_ids,
+            )
+        
         # 結果を表示
         self.stdout.write('\n' + '='*50)
         self.stdout.write('同期結果:')
         self.stdout.write(f'  更新件数: {updated_count}')
         self.stdout.write(f'  失敗件数: {failed_count}')
+        if missing_ids:
+            self.stdout.write(self.style.WARNING(
+                f'  Djangoに存在しない問題: {len(missing_ids)}件（ID {", ".join(map(str, missing_ids[:10]))}'
+                f'{" ..." if len(missing_ids) > 10 else ""}）。同期位置はこの手前で止め、次回も対象にします'
+            ))
         
         if errors:
             self.stdout.write('\nエラー詳細:')
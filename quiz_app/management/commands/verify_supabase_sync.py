@@ -0,0 +1,82 @@
+import time
+from django.core.management.base import BaseCommand
+from quiz_app.models import Question
+from quiz_app.supabase_sync import get_supabase_config
+from quiz_app.sync_executor import SyncError, add_executor_arguments, executor_from_options
+from quiz_app.sync_verify import (
+    DIGEST_FIELDS, DIGEST_FANOUT, DIGEST_LEAF_SIZE, QUESTION_DIGEST_FUNCTION_SQL, verify_with_supabase,
+)
+
+
+class Command(BaseCommand):
+    help = 'IDの範囲ごとのハッシュでDjangoとSupabaseの問題データが一致しているかを検証します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fanout',
+            type=int,
+            default=DIGEST_FANOUT,
+            help=f'一致しない区間を分割する数（既定: {DIGEST_FANOUT}）',
+        )
+        parser.add_argument(
+            '--leaf-size',
+            type=int,
+            default=DIGEST_LEAF_SIZE,
+            help=f'行を直接比較する区間の件数（既定: {DIGEST_LEAF_SIZE}）',
+        )
+        parser.add_argument(
+            '--print-sql',
+            action='store_true',
+            help='Supabaseに作成するRPC関数のSQLを表示して終了',
+        )
+        add_executor_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options['print_sql']:
+            self.stdout.write(QUESTION_DIGEST_FUNCTION_SQL)
+            return
+
+        config = get_supabase_config()
+        if config is None:
+            self.stdout.write(self.style.ERROR('Supabase環境変数が設定されていません。'))
+            return
+
+        started = time.perf_counter()
+        local_rows = list(Question.objects.values(*DIGEST_FIELDS))
+        self.stdout.write(f'Djangoの問題数: {len(local_rows)}')
+
+        with executor_from_options(config, options) as executor:
+            try:
+                result = verify_with_supabase(
+                    executor, local_rows, fanout=options['fanout'], leaf_size=options['leaf_size']
+                )
+            except SyncError as e:
+                if e.status_code == 404:
+                    self.stdout.write(self.style.ERROR(
+                        'SupabaseにRPC関数がありません。--print-sqlで表示されるSQLをSupabaseで実行してください。'
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(f'検証に失敗しました: {e}'))
+                return
+
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"リクエスト数: {result['requests']}（ダイジェスト {result['digest_requests']}, "
+            f"行の取得 {result['row_requests']}）, {seconds:.2f}秒"
+        )
+
+        labels = [
+            ('missing_remote', 'Supabaseにない問題'),
+            ('missing_local', 'Djangoにない問題'),
+            ('different', '内容が異なる問題'),
+        ]
+        if not any(result[key] for key, _ in labels):
+            self.stdout.write(self.style.SUCCESS('DjangoとSupabaseの問題データは一致しています。'))
+            return
+
+        for key, label in labels:
+            ids = result[key]
+            if ids:
+                preview = ', '.join(str(question_id) for question_id in ids[:20])
+                more = f' ... 他 {len(ids) - 20}件' if len(ids) > 20 else ''
+                self.stdout.write(self.style.WARNING(f'{label}: {len(ids)}件 ({preview}{more})'))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0004_quizsession_choice_mappings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(choices=[('django-to-supabase', 'Django → Supabase'), ('supabase-to-django', 'Supabase → Django'), ('alternatives-from-supabase', 'Supabase → Django（別解のみ）')], max_length=30, verbose_name='同期方向')),
+                ('subject_code', models.CharField(blank=True, max_length=20, verbose_name='教科コード')),
+                ('last_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='同期済み更新日時')),
+                ('last_id', models.BigIntegerField(blank=True, null=True, verbose_name='同期済み問題ID')),
+                ('last_synced_count', models.PositiveIntegerField(default=0, verbose_name='前回の同期件数')),
+                ('synced_at', models.DateTimeField(blank=True, null=True, verbose_name='同期日時')),
+            ],
+            options={
+                'verbose_name': '同期状態',
+                'verbose_name_plural': '同期状態',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['updated_at', 'id'], name='quiz_app_qu_updated_c2e532_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='syncstate',
+            unique_together={('direction', 'subject_code')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0005_question_updated_at_index_syncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_id', models.BigIntegerField(unique=True, verbose_name='問題ID')),
+                ('enqueued_at', models.DateTimeField(verbose_name='登録日時')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='送信試行回数')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後のエラー')),
+            ],
+            options={
+                'verbose_name': '同期待ち',
+                'verbose_name_plural': '同期待ち',
+                'indexes': [models.Index(fields=['enqueued_at'], name='quiz_app_sy_enqueue_cce97f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:44
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_question_counts(apps, schema_editor):
+    """既存データの単元数・問題数を数えて設定"""
+    Subject = apps.get_model('quiz_app', 'Subject')
+    Unit = apps.get_model('quiz_app', 'Unit')
+    for unit in Unit.objects.annotate(actual=Count('questions')):
+        Unit.objects.filter(pk=unit.pk).update(question_count=unit.actual)
+    for subject in Subject.objects.annotate(
+        actual_units=Count('units', distinct=True),
+        actual_questions=Count('units__questions', distinct=True),
+    ):
+        Subject.objects.filter(pk=subject.pk).update(
+            unit_count=subject.actual_units,
+            question_count=subject.actual_questions,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0007_contentversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subject',
+            name='question_count',
+            field=models.IntegerField(default=0, verbose_name='問題数'),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='unit_count',
+            field=models.IntegerField(default=0, verbose_name='単元数'),
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='question_count',
+            field=models.IntegerField(default=0, verbose_name='問題数'),
+        ),
+        migrations.RunPython(fill_question_counts, migrations.RunPython.noop),
+    ]
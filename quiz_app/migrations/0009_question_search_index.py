@@ -0,0 +1,117 @@
+import json
+import re
+import unicodedata
+
+from django.db import migrations
+
+# このマイグレーション時点の索引の定義（quiz_app.searchを変更しても影響を受けないよう複製している）
+FTS_TABLE = 'quiz_app_question_fts'
+TRGM_TABLE = 'quiz_app_question_search'
+BATCH_SIZE = 1000
+
+CREATE_SQL = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(body, tokenize='unicode61 remove_diacritics 0')",
+    ],
+    'postgresql': [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        f'CREATE TABLE IF NOT EXISTS {TRGM_TABLE} ('
+        f'question_id bigint PRIMARY KEY REFERENCES quiz_app_question (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        f'body text NOT NULL)',
+        f'CREATE INDEX IF NOT EXISTS {TRGM_TABLE}_body_trgm ON {TRGM_TABLE} USING gin (body gin_trgm_ops)',
+    ],
+}
+DROP_SQL = {
+    'sqlite': [f'DROP TABLE IF EXISTS {FTS_TABLE}'],
+    'postgresql': [f'DROP TABLE IF EXISTS {TRGM_TABLE}'],
+}
+
+SOURCE_FIELDS = ['id', 'text', 'correct_answer', 'accepted_alternatives', 'unit__grade_year', 'unit__category']
+
+_RUN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def _normalize(value):
+    return unicodedata.normalize('NFKC', value or '').lower()
+
+
+def _bigram_body(value):
+    tokens = []
+    for run in _RUN_PATTERN.findall(_normalize(value)):
+        tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+        tokens.append(run[-1])
+    return ' '.join(tokens)
+
+
+def _search_text(row):
+    alternatives = row.get('accepted_alternatives')
+    if isinstance(alternatives, str):
+        try:
+            alternatives = json.loads(alternatives)
+        except json.JSONDecodeError:
+            alternatives = [alternatives]
+    if not isinstance(alternatives, (list, tuple)):
+        alternatives = []
+    parts = [
+        row.get('unit__grade_year') or '',
+        row.get('unit__category') or '',
+        row.get('text') or '',
+        row.get('correct_answer') or '',
+    ]
+    parts.extend(str(alternative) for alternative in alternatives)
+    return '\n'.join(parts)
+
+
+def _index_rows(cursor, vendor, rows):
+    pairs = [(row['id'], _search_text(row)) for row in rows]
+    if vendor == 'sqlite':
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)',
+            [(row_id, _bigram_body(text)) for row_id, text in pairs],
+        )
+    else:
+        cursor.executemany(
+            f'INSERT INTO {TRGM_TABLE} (question_id, body) VALUES (%s, %s) '
+            f'ON CONFLICT (question_id) DO UPDATE SET body = EXCLUDED.body',
+            [(row_id, _normalize(text)) for row_id, text in pairs],
+        )
+
+
+def create_search_index(apps, schema_editor):
+    """データベースに対応した検索索引を作成し、既存の問題を登録"""
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+    Question = apps.get_model('quiz_app', 'Question')
+    with schema_editor.connection.cursor() as cursor:
+        for sql in CREATE_SQL[vendor]:
+            cursor.execute(sql)
+        last_id = 0
+        while True:
+            rows = list(
+                Question.objects.filter(id__gt=last_id).order_by('id').values(*SOURCE_FIELDS)[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            _index_rows(cursor, vendor, rows)
+            last_id = rows[-1]['id']
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in DROP_SQL:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_SQL[vendor]:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0008_question_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0009_question_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['created_at', 'id'], name='quiz_app_qu_created_65f3a2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['created_at', 'id'], name='quiz_app_qu_created_198d00_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['started_at', 'id'], name='quiz_app_qu_started_d72064_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0010_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='homework',
+            name='choice_mappings',
+            field=models.JSONField(blank=True, default=dict, verbose_name='選択肢並べ替えマッピング'),
+        ),
+        migrations.AddField(
+            model_name='homework',
+            name='question_ids',
+            field=models.JSONField(blank=True, default=list, verbose_name='出題問題ID'),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='homework',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='quiz_app.homework', verbose_name='宿題'),
+        ),
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['homework', 'user'], name='quiz_app_qu_homewor_fb2439_idx'),
+        ),
+    ]
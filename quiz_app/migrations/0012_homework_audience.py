@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_homework_audiences(apps, schema_editor):
+    """公開中の宿題の対象を作成"""
+    Homework = apps.get_model('quiz_app', 'Homework')
+    HomeworkAudience = apps.get_model('quiz_app', 'HomeworkAudience')
+    HomeworkAudience.objects.bulk_create([
+        HomeworkAudience(
+            homework_id=homework.id,
+            prefecture=homework.scope_prefecture,
+            school=homework.scope_school,
+            class_name=homework.scope_class_name if homework.publish_scope == 'class' else '',
+        )
+        for homework in Homework.objects.filter(is_published=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0011_homework_frozen_questions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HomeworkAudience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefecture', models.CharField(max_length=10, verbose_name='都道府県')),
+                ('school', models.CharField(max_length=100, verbose_name='学校')),
+                ('class_name', models.CharField(blank=True, max_length=50, verbose_name='クラス')),
+                ('homework', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audiences', to='quiz_app.homework', verbose_name='宿題')),
+            ],
+            options={
+                'verbose_name': '宿題の対象',
+                'verbose_name_plural': '宿題の対象',
+                'indexes': [models.Index(fields=['prefecture', 'school', 'class_name'], name='quiz_app_ho_prefect_c78833_idx')],
+            },
+        ),
+        migrations.RunPython(fill_homework_audiences, migrations.RunPython.noop),
+    ]
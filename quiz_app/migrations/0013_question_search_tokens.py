@@ -0,0 +1,63 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# このマイグレーション時点の索引の定義（quiz_app.searchを変更しても影響を受けないよう複製している）
+TRGM_TABLE = 'quiz_app_question_search'
+BATCH_SIZE = 1000
+
+_RUN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def _index_tokens(body):
+    tokens = set()
+    for run in _RUN_PATTERN.findall(unicodedata.normalize('NFKC', body or '').lower()):
+        tokens.update(run)
+        tokens.update(run[index:index + 2] for index in range(len(run) - 1))
+    return sorted(tokens)
+
+
+def add_search_tokens(apps, schema_editor):
+    """PostgreSQLの検索索引に文字unigram・bigramの列とGINインデックスを追加し、既存の行を登録"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TRGM_TABLE} ADD COLUMN IF NOT EXISTS tokens text[] NOT NULL DEFAULT '{{}}'")
+        last_id = 0
+        while True:
+            cursor.execute(
+                f'SELECT question_id, body FROM {TRGM_TABLE} WHERE question_id > %s ORDER BY question_id LIMIT %s',
+                [last_id, BATCH_SIZE],
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                f'UPDATE {TRGM_TABLE} SET tokens = %s WHERE question_id = %s',
+                [(_index_tokens(body), question_id) for question_id, body in rows],
+            )
+            last_id = rows[-1][0]
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {TRGM_TABLE}_tokens ON {TRGM_TABLE} USING gin (tokens)')
+        # トライグラムのインデックスは検索で使わなくなった
+        cursor.execute(f'DROP INDEX IF EXISTS {TRGM_TABLE}_body_trgm')
+
+
+def remove_search_tokens(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {TRGM_TABLE}_body_trgm ON {TRGM_TABLE} USING gin (body gin_trgm_ops)')
+        cursor.execute(f'DROP INDEX IF EXISTS {TRGM_TABLE}_tokens')
+        cursor.execute(f'ALTER TABLE {TRGM_TABLE} DROP COLUMN IF EXISTS tokens')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0012_homework_audience'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_tokens, remove_search_tokens),
+    ]
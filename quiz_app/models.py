@@ -20,6 +20,9 @@ class Subject(models.Model):
         verbose_name='教科コード'
     )
     label_ja = models.CharField(max_length=20, verbose_name='教科名')
+    # 単元数・問題数（quiz_app.question_countsで増減し、recountコマンドで数え直す）
+    unit_count = models.IntegerField(default=0, verbose_name='単元数')
+    question_count = models.IntegerField(default=0, verbose_name='問題数')
     
     class Meta:
         verbose_name = '教科'
@@ -45,6 +48,8 @@ class Unit(models.Model):
         unique=True,
         verbose_name='単元キー'
     )
+    # 問題数（quiz_app.question_countsで増減し、recountコマンドで数え直す）
+    question_count = models.IntegerField(default=0, verbose_name='問題数')
     
     class Meta:
         verbose_name = '単元'
@@ -117,6 +122,8 @@ class Question(models.Model):
         unique_together = ['unit', 'source_id']
         indexes = [
             models.Index(fields=['unit', 'source_id']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
@@ -159,10 +166,22 @@ class QuizSession(models.Model):
         blank=True,
         verbose_name='選択肢並べ替えマッピング'
     )
+    homework = models.ForeignKey(
+        'Homework',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sessions',
+        verbose_name='宿題'
+    )
     
     class Meta:
         verbose_name = 'クイズセッション'
         verbose_name_plural = 'クイズセッション'
+        indexes = [
+            models.Index(fields=['started_at', 'id']),
+            models.Index(fields=['homework', 'user']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.unit} - {self.started_at.strftime('%Y-%m-%d %H:%M')}"
@@ -194,6 +213,7 @@ class QuizAttempt(models.Model):
         verbose_name_plural = 'クイズ解答記録'
         indexes = [
             models.Index(fields=['question']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
@@ -239,6 +259,16 @@ class Homework(models.Model):
         unique=True,
         verbose_name='公開スラッグ'
     )
+    question_ids = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='出題問題ID'
+    )
+    choice_mappings = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='選択肢並べ替えマッピング'
+    )
     
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
@@ -249,3 +279,96 @@ class Homework(models.Model):
     
     def __str__(self):
         return f"{self.unit} - {self.question_count}問 - {self.get_publish_scope_display()}"
+
+
+class HomeworkAudience(models.Model):
+    """
+    公開中の宿題の対象（都道府県・学校・クラス）
+
+    宿題の公開・非公開・対象の変更のたびに作り直す。学校全体が対象の宿題はclass_nameが空。
+    生徒に表示する宿題はこの表の (prefecture, school, class_name) の索引で検索する。
+    """
+    
+    homework = models.ForeignKey(
+        Homework,
+        on_delete=models.CASCADE,
+        related_name='audiences',
+        verbose_name='宿題'
+    )
+    prefecture = models.CharField(max_length=10, verbose_name='都道府県')
+    school = models.CharField(max_length=100, verbose_name='学校')
+    class_name = models.CharField(max_length=50, blank=True, verbose_name='クラス')
+    
+    class Meta:
+        verbose_name = '宿題の対象'
+        verbose_name_plural = '宿題の対象'
+        indexes = [
+            models.Index(fields=['prefecture', 'school', 'class_name']),
+        ]
+    
+    def __str__(self):
+        return f"{self.prefecture} {self.school} {self.class_name or '（学校全体）'} - {self.homework_id}"
+
+
+class SyncState(models.Model):
+    """Supabase同期の進捗（方向・教科ごとに最後に同期した問題の更新日時とID）"""
+    
+    class Direction(models.TextChoices):
+        DJANGO_TO_SUPABASE = 'django-to-supabase', 'Django → Supabase'
+        SUPABASE_TO_DJANGO = 'supabase-to-django', 'Supabase → Django'
+        ALTERNATIVES_FROM_SUPABASE = 'alternatives-from-supabase', 'Supabase → Django（別解のみ）'
+    
+    direction = models.CharField(
+        max_length=30,
+        choices=Direction.choices,
+        verbose_name='同期方向'
+    )
+    # 空文字は全教科
+    subject_code = models.CharField(max_length=20, blank=True, verbose_name='教科コード')
+    last_updated_at = models.DateTimeField(null=True, blank=True, verbose_name='同期済み更新日時')
+    last_id = models.BigIntegerField(null=True, blank=True, verbose_name='同期済み問題ID')
+    last_synced_count = models.PositiveIntegerField(default=0, verbose_name='前回の同期件数')
+    synced_at = models.DateTimeField(null=True, blank=True, verbose_name='同期日時')
+    
+    class Meta:
+        verbose_name = '同期状態'
+        verbose_name_plural = '同期状態'
+        unique_together = ['direction', 'subject_code']
+    
+    def __str__(self):
+        return f"{self.get_direction_display()} - {self.subject_code or '全教科'}"
+
+
+class SyncOutbox(models.Model):
+    """Supabaseへの送信待ちの問題（同じ問題の連続した編集は1件にまとめる）"""
+    
+    question_id = models.BigIntegerField(unique=True, verbose_name='問題ID')
+    enqueued_at = models.DateTimeField(verbose_name='登録日時')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='送信試行回数')
+    last_error = models.TextField(blank=True, verbose_name='最後のエラー')
+    
+    class Meta:
+        verbose_name = '同期待ち'
+        verbose_name_plural = '同期待ち'
+        indexes = [
+            models.Index(fields=['enqueued_at']),
+        ]
+    
+    def __str__(self):
+        return f"問題ID {self.question_id} ({self.enqueued_at:%Y-%m-%d %H:%M:%S})"
+
+
+class ContentVersion(models.Model):
+    """教科・単元・問題のバージョン番号（変更のたびに増やし、表示データのキャッシュキーに使う）"""
+    
+    SINGLETON_ID = 1
+    
+    version = models.PositiveBigIntegerField(default=0, verbose_name='バージョン')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+    
+    class Meta:
+        verbose_name = 'コンテンツバージョン'
+        verbose_name_plural = 'コンテンツバージョン'
+    
+    def __str__(self):
+        return f"v{self.version} ({self.updated_at:%Y-%m-%d %H:%M:%S})"
@@ -0,0 +1,267 @@
+"""
+カーソル（キーセット）方式のページ分割
+
+(created_at, id) のような並び順の列の値をカーソルにして「この行より後」を絞り込むため、
+OFFSETを使わず、何ページ目でも1ページ目と同じ速さで表示できる。並び順の列には
+同じ順の複合インデックスを作成しておく。
+
+件数は「正確（COUNT(*)）」「推定（プランナーの統計情報）」「表示しない」から選べる。
+推定できない場合（SQLiteで絞り込みがある場合など）は件数を表示しない。
+"""
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min, Q, QuerySet
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATED = 'estimated'
+
+CURSOR_PARAM = 'cursor'
+
+
+def encode_cursor(direction: str, values: Sequence[Any]) -> str:
+    payload = json.dumps([direction, [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str], model, fields: Sequence[str]) -> Optional[Tuple[str, List[Any]]]:
+    """カーソル文字列を (方向, 列の値) に戻す（不正な値ならNone）"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, raw_values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if direction not in ('next', 'prev') or len(raw_values) != len(fields):
+            return None
+        values = [model._meta.get_field(field).to_python(value) for field, value in zip(fields, raw_values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+    return direction, values
+
+
+def _after(fields: Sequence[str], values: Sequence[Any], descending: bool) -> Q:
+    """
+    並び順で (fields) = (values) の行より後ろの行の条件
+
+    (a, b) < (x, y) を a <= x AND (a < x OR b < y) の形にし、先頭の列だけでも
+    インデックスの範囲検索が使えるようにする。
+    """
+    first, rest = fields[0], fields[1:]
+    strict = 'lt' if descending else 'gt'
+    inclusive = 'lte' if descending else 'gte'
+    if not rest:
+        return Q(**{f'{first}__{strict}': values[0]})
+    return Q(**{f'{first}__{inclusive}': values[0]}) & (
+        Q(**{f'{first}__{strict}': values[0]}) | (Q(**{first: values[0]}) & _after(rest, values[1:], descending))
+    )
+
+
+class KeysetPage:
+    """1ページ分の結果（テンプレートではpage_objとして使う）"""
+
+    is_keyset = True
+
+    def __init__(self, object_list: List[Any], has_next: bool, has_previous: bool,
+                 next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count: Optional[int] = None
+        self.count_is_estimate = False
+        self.next_query = ''
+        self.previous_query = ''
+        self.first_query = ''
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self._has_next or self._has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+
+def keyset_paginate(queryset: QuerySet, ordering: Sequence[str], per_page: int,
+                    cursor: Optional[str] = None, descending: bool = True) -> KeysetPage:
+    """querysetをorderingの列の順に並べ、cursorの位置から1ページ分を取得"""
+    fields = list(ordering)
+    decoded = decode_cursor(cursor, queryset.model, fields)
+    direction, values = decoded if decoded else ('next', None)
+    forward = direction == 'next'
+
+    # 前のページは逆順に読んでから並べ直す
+    scan_descending = descending if forward else not descending
+    rows = queryset.order_by(*[f'-{field}' if scan_descending else field for field in fields])
+    if values is not None:
+        rows = rows.filter(_after(fields, values, scan_descending))
+    rows = list(rows[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    has_next = has_more if forward else True
+    has_previous = values is not None if forward else has_more
+
+    def key(row) -> List[Any]:
+        return [getattr(row, field) for field in fields]
+
+    return KeysetPage(
+        rows,
+        has_next=has_next and bool(rows),
+        has_previous=has_previous and bool(rows),
+        next_cursor=encode_cursor('next', key(rows[-1])) if has_next and rows else None,
+        previous_cursor=encode_cursor('prev', key(rows[0])) if has_previous and rows else None,
+    )
+
+
+def estimated_count(queryset: QuerySet) -> Optional[int]:
+    """
+    プランナーの統計情報から件数を推定（推定できなければNone）
+
+    PostgreSQLはEXPLAINの推定行数を使う。SQLiteは絞り込みがなければsqlite_stat1（ANALYZE済みの場合）、
+    なければ主キーの最大値と最小値の差（主キーのインデックスの両端を読むだけ）を使う。
+    件数の推定のためにCOUNT(*)は実行しない。
+    """
+    connection = connections[queryset.db]
+    try:
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.order_by().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        if connection.vendor == 'sqlite' and not queryset.query.where:
+            row = None
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [queryset.model._meta.db_table])
+                    row = cursor.fetchone()
+            except DatabaseError:
+                # ANALYZEを一度も実行していなければsqlite_stat1がない
+                pass
+            if row:
+                return int(row[0].split()[0])
+            bounds = queryset.order_by().aggregate(low=Min('pk'), high=Max('pk'))
+            if bounds['low'] is None:
+                return 0
+            return int(bounds['high']) - int(bounds['low']) + 1
+    except (DatabaseError, KeyError, IndexError, TypeError, ValueError):
+        pass
+    return None
+
+
+def count_rows(queryset: QuerySet, mode: Optional[str]) -> Tuple[Optional[int], bool]:
+    """(件数, 推定値かどうか)。modeがNoneなら件数を数えない"""
+    if mode == COUNT_EXACT:
+        return queryset.count(), False
+    if mode == COUNT_ESTIMATED:
+        count = estimated_count(queryset)
+        return count, count is not None
+    return None, False
+
+
+def _query_string(params, cursor: Optional[str]) -> str:
+    params = params.copy()
+    params.pop(CURSOR_PARAM, None)
+    params.pop('page', None)
+    if cursor:
+        params[CURSOR_PARAM] = cursor
+    return params.urlencode()
+
+
+class KeysetPaginationMixin:
+    """
+    ListView用のカーソル方式のページ分割
+
+    keyset_orderingの列の順（既定は新しい順）に並べる。use_keyset_pagination()がFalseのときは
+    通常のページ番号方式になる（件数が少ない検索結果など）。
+    """
+
+    keyset_ordering = ('created_at', 'id')
+    keyset_descending = True
+    count_mode: Optional[str] = COUNT_ESTIMATED
+
+    def use_keyset_pagination(self) -> bool:
+        return True
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        page = keyset_paginate(
+            queryset, self.keyset_ordering, page_size,
+            cursor=self.request.GET.get(CURSOR_PARAM), descending=self.keyset_descending,
+        )
+        page.count, page.count_is_estimate = count_rows(queryset, self.count_mode)
+        page.next_query = _query_string(self.request.GET, page.next_cursor)
+        page.previous_query = _query_string(self.request.GET, page.previous_cursor)
+        page.first_query = _query_string(self.request.GET, None)
+        return None, page, page.object_list, page.has_other_pages()
+
+
+class KeysetChangeList(ChangeList):
+    """Django管理画面の一覧をカーソル方式で表示するChangeList"""
+
+    def get_results(self, request):
+        model_admin = self.model_admin
+        page = keyset_paginate(
+            self.queryset, model_admin.keyset_ordering, self.list_per_page,
+            cursor=getattr(request, 'keyset_cursor', None), descending=model_admin.keyset_descending,
+        )
+        count, is_estimate = count_rows(self.queryset, model_admin.count_mode)
+        page.count, page.count_is_estimate = count, is_estimate
+        if page.next_cursor:
+            page.next_query = self.get_query_string({CURSOR_PARAM: page.next_cursor}, remove=['p'])
+        if page.previous_cursor:
+            page.previous_query = self.get_query_string({CURSOR_PARAM: page.previous_cursor}, remove=['p'])
+        page.first_query = self.get_query_string(remove=['p'])
+
+        self.keyset_page = page
+        self.result_count = count if count is not None else len(page.object_list)
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.result_list = page.object_list
+        self.can_show_all = False
+        self.multi_page = page.has_other_pages()
+        self.paginator = model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+
+class KeysetAdminMixin:
+    """
+    ModelAdmin用のカーソル方式のページ分割
+
+    並び順は固定（列見出しでの並べ替えは無効）で、件数は推定値を表示する。
+    """
+
+    keyset_ordering = ('created_at', 'id')
+    keyset_descending = True
+    count_mode: Optional[str] = COUNT_ESTIMATED
+    show_full_result_count = False
+    sortable_by = ()
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def changelist_view(self, request, extra_context=None):
+        # 管理画面はクエリパラメータを絞り込み条件として扱うため、カーソルは取り除いて渡す
+        if CURSOR_PARAM in request.GET:
+            params = request.GET.copy()
+            request.keyset_cursor = params.pop(CURSOR_PARAM)[-1]
+            request.GET = params
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,65 @@
+"""
+単元・教科の問題数（非正規化したカウンター）の更新
+
+問題の追加・削除・単元の変更のたびに、Unit.question_count と Subject.question_count を
+F式で増減させる。呼び出し元のトランザクション内で実行されるため、問題の保存と
+カウンターの更新はまとめて確定・ロールバックされる。
+ずれが生じた場合は recount コマンド（recount_question_counts）で数え直す。
+"""
+from collections import defaultdict
+from typing import Dict, List
+from django.db import transaction
+from django.db.models import Count, F
+from .models import Subject, Unit
+
+
+def adjust_question_counts(unit_deltas: Dict[int, int]) -> None:
+    """単元IDごとの問題数の増減を単元と教科のカウンターに反映"""
+    unit_deltas = {unit_id: delta for unit_id, delta in unit_deltas.items() if delta}
+    if not unit_deltas:
+        return
+
+    unit_subjects = dict(Unit.objects.filter(pk__in=unit_deltas).values_list('id', 'subject_id'))
+    subject_deltas: Dict[int, int] = defaultdict(int)
+    for unit_id, delta in unit_deltas.items():
+        # 単元ごと削除される場合は単元が既に存在しないことがある
+        if unit_id not in unit_subjects:
+            continue
+        Unit.objects.filter(pk=unit_id).update(question_count=F('question_count') + delta)
+        subject_deltas[unit_subjects[unit_id]] += delta
+
+    for subject_id, delta in subject_deltas.items():
+        if delta:
+            Subject.objects.filter(pk=subject_id).update(question_count=F('question_count') + delta)
+
+
+def adjust_unit_count(subject_id: int, delta: int) -> None:
+    """教科の単元数を増減"""
+    Subject.objects.filter(pk=subject_id).update(unit_count=F('unit_count') + delta)
+
+
+@transaction.atomic
+def recount_question_counts() -> List[str]:
+    """問題数・単元数を数え直して修正し、修正内容を返す"""
+    fixes = []
+
+    for unit in Unit.objects.annotate(actual=Count('questions')).select_related('subject'):
+        if unit.question_count != unit.actual:
+            fixes.append(f'単元 {unit}: 問題数 {unit.question_count} → {unit.actual}')
+            Unit.objects.filter(pk=unit.pk).update(question_count=unit.actual)
+
+    for subject in Subject.objects.annotate(
+        actual_units=Count('units', distinct=True),
+        actual_questions=Count('units__questions', distinct=True),
+    ):
+        if subject.unit_count != subject.actual_units:
+            fixes.append(f'教科 {subject}: 単元数 {subject.unit_count} → {subject.actual_units}')
+        if subject.question_count != subject.actual_questions:
+            fixes.append(f'教科 {subject}: 問題数 {subject.question_count} → {subject.actual_questions}')
+        if (subject.unit_count, subject.question_count) != (subject.actual_units, subject.actual_questions):
+            Subject.objects.filter(pk=subject.pk).update(
+                unit_count=subject.actual_units,
+                question_count=subject.actual_questions,
+            )
+
+    return fixes
@@ -0,0 +1,43 @@
+"""
+ランキングのスナップショット
+
+ランキングは全解答記録の集計が必要なため、RANKING_SNAPSHOT_SECONDSごとに集計した結果を
+キャッシュして表示する。集計日時はLast-Modified・ETagにも使う。
+"""
+from typing import Any, Dict
+from django.core.cache import cache
+from django.db.models import Avg, Count
+from django.utils import timezone
+from .models import QuizAttempt, QuizSession
+
+# ランキングを集計し直す間隔（秒）
+RANKING_SNAPSHOT_SECONDS = 300
+
+_SNAPSHOT_KEY = 'ranking:snapshot'
+
+
+def build_ranking_snapshot() -> Dict[str, Any]:
+    # 総プレイ数ランキング
+    play_count_ranking = QuizSession.objects.values('user__student_profile__nickname').annotate(
+        total_sessions=Count('id')
+    ).order_by('-total_sessions')[:10]
+
+    # 1問あたり平均時間ランキング
+    avg_time_ranking = QuizAttempt.objects.values('session__user__student_profile__nickname').annotate(
+        avg_time=Avg('time_spent_sec')
+    ).order_by('avg_time')[:10]
+
+    return {
+        'taken_at': timezone.now().replace(microsecond=0),
+        'play_count_ranking': list(play_count_ranking),
+        'avg_time_ranking': list(avg_time_ranking),
+    }
+
+
+def get_ranking_snapshot() -> Dict[str, Any]:
+    """最新のランキングのスナップショット（期限切れなら集計し直す）"""
+    snapshot = cache.get(_SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = build_ranking_snapshot()
+        cache.set(_SNAPSHOT_KEY, snapshot, RANKING_SNAPSHOT_SECONDS)
+    return snapshot
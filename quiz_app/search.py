@@ -0,0 +1,272 @@
+"""
+問題の全文検索インデックス
+
+問題文・正解・別解・単元（学年・カテゴリ）を正規化（NFKC・小文字化）した文字列を索引にする。
+データベースに合わせて次の2つの実装を使い分ける。
+
+- SQLite: FTS5の仮想テーブルに文字bigramのトークン列を格納する。検索語も同じくbigramにし、
+  フレーズ検索にすることで部分一致と同じ結果になる。順位はbm25。
+- PostgreSQL: 正規化した文字列と、その文字unigram・bigramの配列を別テーブルに格納する。
+  検索語のbigram（1文字の語はその文字）をすべて含む行を配列のGINインデックスで絞り込み、
+  LIKEで部分一致を確かめる。pg_trgmのトライグラムは1〜2文字の語から作れず、照合順序が
+  Cのデータベースでは日本語の文字を無視するため、日本語の短い語でも索引が使えるようにしている。
+  順位はpg_trgmのsimilarity。
+
+問題・単元の保存と削除はシグナルで、一括の取込・同期は各処理から明示的に索引を更新する。
+索引が壊れた場合は rebuild_search_index コマンドで作り直す。
+"""
+import json
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.db import connection
+
+# 検索結果として返す最大件数（順位の高いものから）
+SEARCH_RESULT_LIMIT = 200
+
+# 順位付けの対象にする一致件数（新しい問題から）。よく使われる語でも一致した全件を順位付けしない
+SEARCH_CANDIDATE_WINDOW = 1000
+
+# 索引を更新するときの1回あたりの件数
+INDEX_BATCH_SIZE = 1000
+
+FTS_TABLE = 'quiz_app_question_fts'
+TRGM_TABLE = 'quiz_app_question_search'
+
+_RUN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def normalize_search_text(value: str) -> str:
+    return unicodedata.normalize('NFKC', value or '').lower()
+
+
+def search_runs(value: str) -> List[str]:
+    """記号・空白で区切った文字の並び（正規化済み）"""
+    return _RUN_PATTERN.findall(normalize_search_text(value))
+
+
+def bigram_tokens(value: str) -> List[str]:
+    """
+    文字bigramのトークン列
+
+    各並びの最後の1文字も単独のトークンにする（1文字の検索語を前方一致で探せるように）。
+    """
+    tokens = []
+    for run in search_runs(value):
+        tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+        tokens.append(run[-1])
+    return tokens
+
+
+def index_tokens(value: str) -> List[str]:
+    """索引に格納する文字unigram・bigram（重複なし。PostgreSQL用）"""
+    tokens = set()
+    for run in search_runs(value):
+        tokens.update(run)
+        tokens.update(run[index:index + 2] for index in range(len(run) - 1))
+    return sorted(tokens)
+
+
+def query_tokens(run: str) -> List[str]:
+    """検索語の並びが含むべきトークン（1文字ならその文字、2文字以上ならbigram）"""
+    if len(run) == 1:
+        return [run]
+    return [run[index:index + 2] for index in range(len(run) - 1)]
+
+
+def _as_list(value: Any) -> List[Any]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return [value]
+    return list(value) if isinstance(value, (list, tuple)) else []
+
+
+def question_search_text(row: Dict[str, Any]) -> str:
+    """索引にする文字列（問題のフィールド値のdictから作る）"""
+    parts = [
+        row.get('unit__grade_year') or '',
+        row.get('unit__category') or '',
+        row.get('text') or '',
+        row.get('correct_answer') or '',
+    ]
+    parts.extend(str(alternative) for alternative in _as_list(row.get('accepted_alternatives')))
+    return '\n'.join(parts)
+
+
+SEARCH_SOURCE_FIELDS = ['id', 'text', 'correct_answer', 'accepted_alternatives', 'unit__grade_year', 'unit__category']
+
+
+class SqliteFTSBackend:
+    """SQLite FTS5（文字bigram）"""
+
+    create_sql = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(body, tokenize='unicode61 remove_diacritics 0')",
+    ]
+    drop_sql = [f'DROP TABLE IF EXISTS {FTS_TABLE}']
+
+    def index(self, cursor, rows: List[Tuple[int, str]]) -> None:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row_id,) for row_id, _ in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)',
+            [(row_id, ' '.join(bigram_tokens(text))) for row_id, text in rows],
+        )
+
+    def remove(self, cursor, ids: List[int]) -> None:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row_id,) for row_id in ids])
+
+    def clear(self, cursor) -> None:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def match_expression(self, query: str) -> Optional[str]:
+        phrases = []
+        for run in search_runs(query):
+            if len(run) == 1:
+                phrases.append(f'"{run}"*')
+            else:
+                phrases.append('"' + ' '.join(run[index:index + 2] for index in range(len(run) - 1)) + '"')
+        return ' AND '.join(phrases) or None
+
+    def search(self, cursor, query: str, limit: int) -> List[int]:
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        # 一致した問題のうち新しいものからSEARCH_CANDIDATE_WINDOW件の範囲（rowidの下限）を求め、
+        # その範囲だけをbm25で順位付けする
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s',
+            [expression, SEARCH_CANDIDATE_WINDOW - 1],
+        )
+        bound = cursor.fetchone()
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid >= %s '
+            f'ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT %s',
+            [expression, bound[0] if bound else 0, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBigramBackend:
+    """PostgreSQL（文字unigram・bigramの配列のGINインデックス）"""
+
+    create_sql = [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        f'CREATE TABLE IF NOT EXISTS {TRGM_TABLE} ('
+        f'question_id bigint PRIMARY KEY REFERENCES quiz_app_question (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        f"body text NOT NULL, tokens text[] NOT NULL DEFAULT '{{}}')",
+        f'CREATE INDEX IF NOT EXISTS {TRGM_TABLE}_tokens ON {TRGM_TABLE} USING gin (tokens)',
+    ]
+    drop_sql = [f'DROP TABLE IF EXISTS {TRGM_TABLE}']
+
+    def index(self, cursor, rows: List[Tuple[int, str]]) -> None:
+        values = []
+        for row_id, text in rows:
+            body = normalize_search_text(text)
+            values.append((row_id, body, index_tokens(body)))
+        cursor.executemany(
+            f'INSERT INTO {TRGM_TABLE} (question_id, body, tokens) VALUES (%s, %s, %s) '
+            f'ON CONFLICT (question_id) DO UPDATE SET body = EXCLUDED.body, tokens = EXCLUDED.tokens',
+            values,
+        )
+
+    def remove(self, cursor, ids: List[int]) -> None:
+        cursor.execute(f'DELETE FROM {TRGM_TABLE} WHERE question_id = ANY(%s)', [list(ids)])
+
+    def clear(self, cursor) -> None:
+        cursor.execute(f'TRUNCATE {TRGM_TABLE}')
+
+    def search(self, cursor, query: str, limit: int) -> List[int]:
+        runs = search_runs(query)
+        if not runs:
+            return []
+        tokens = sorted({token for run in runs for token in query_tokens(run)})
+        # トークンの包含で絞り込んでから、並びの連続をLIKEで確かめる
+        conditions = ' AND '.join(['body LIKE %s'] * len(runs))
+        # 一致した問題のうち新しいものからSEARCH_CANDIDATE_WINDOW件だけをsimilarityで順位付けする
+        cursor.execute(
+            f'SELECT question_id FROM ('
+            f'SELECT question_id, body FROM {TRGM_TABLE} WHERE tokens @> %s::text[] AND {conditions} '
+            f'ORDER BY question_id DESC LIMIT %s'
+            f') AS candidates ORDER BY similarity(body, %s) DESC, question_id DESC LIMIT %s',
+            [tokens] + [f'%{run}%' for run in runs] + [SEARCH_CANDIDATE_WINDOW, ' '.join(runs), limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+_BACKENDS = {
+    'sqlite': SqliteFTSBackend,
+    'postgresql': PostgresBigramBackend,
+}
+
+
+def get_search_backend(db_connection=None):
+    """接続先のデータベースに対応する実装（対応していなければNone）"""
+    backend_class = _BACKENDS.get((db_connection or connection).vendor)
+    return backend_class() if backend_class else None
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def index_rows(rows: Iterable[Dict[str, Any]]) -> int:
+    """SEARCH_SOURCE_FIELDSの値のdictを索引に登録（登録件数を返す）"""
+    backend = get_search_backend()
+    if backend is None:
+        return 0
+    pairs = [(row['id'], question_search_text(row)) for row in rows]
+    with connection.cursor() as cursor:
+        for chunk in _chunks(pairs, INDEX_BATCH_SIZE):
+            backend.index(cursor, chunk)
+    return len(pairs)
+
+
+def index_questions(question_ids: Iterable[int]) -> int:
+    """指定した問題の索引を更新"""
+    from .models import Question
+
+    question_ids = list(question_ids)
+    count = 0
+    for chunk in _chunks(question_ids, INDEX_BATCH_SIZE):
+        count += index_rows(Question.objects.filter(id__in=chunk).values(*SEARCH_SOURCE_FIELDS))
+    return count
+
+
+def remove_questions(question_ids: Iterable[int]) -> None:
+    backend = get_search_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, list(question_ids))
+
+
+def rebuild_search_index() -> int:
+    """全問題の索引を作り直す"""
+    from .models import Question
+
+    backend = get_search_backend()
+    if backend is None:
+        return 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+    count = 0
+    last_id = 0
+    while True:
+        rows = list(
+            Question.objects.filter(id__gt=last_id).order_by('id').values(*SEARCH_SOURCE_FIELDS)[:INDEX_BATCH_SIZE]
+        )
+        if not rows:
+            return count
+        count += index_rows(rows)
+        last_id = rows[-1]['id']
+
+
+def search_question_ids(query: str, limit: int = SEARCH_RESULT_LIMIT) -> Optional[List[int]]:
+    """検索語に一致する問題IDを順位の高い順に返す（索引に対応していないデータベースではNone）"""
+    backend = get_search_backend()
+    if backend is None:
+        return None
+    with connection.cursor() as cursor:
+        return backend.search(cursor, query, limit)
@@ -0,0 +1,86 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Subject, Unit, Question, Homework
+from .catalog_cache import schedule_content_version_bump
+from .question_counts import adjust_question_counts, adjust_unit_count
+from .search import index_questions, remove_questions
+from .homework import prepare_homework_for_save, rebuild_homework_audience
+
+
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=Unit)
+@receiver([post_save, post_delete], sender=Question)
+def content_changed(sender, **kwargs):
+    """教科・単元・問題が変更されたら表示データのキャッシュを無効にする"""
+    schedule_content_version_bump()
+
+
+@receiver(pre_save, sender=Question)
+def remember_previous_unit(sender, instance, **kwargs):
+    """既存の問題の保存前の単元を記録（単元が変わった場合に問題数を移すため）"""
+    if instance._state.adding or instance.pk is None:
+        instance._previous_unit_id = None
+    else:
+        instance._previous_unit_id = (
+            Question.objects.filter(pk=instance.pk).values_list('unit_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, raw=False, **kwargs):
+    """問題の追加・単元の変更を問題数と検索索引に反映"""
+    if raw:
+        return
+    index_questions([instance.pk])
+    previous_unit_id = getattr(instance, '_previous_unit_id', None)
+    if created:
+        adjust_question_counts({instance.unit_id: 1})
+    elif previous_unit_id is not None and previous_unit_id != instance.unit_id:
+        adjust_question_counts({previous_unit_id: -1, instance.unit_id: 1})
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    adjust_question_counts({instance.unit_id: -1})
+    remove_questions([instance.pk])
+
+
+@receiver(post_save, sender=Unit)
+def unit_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_unit_count(instance.subject_id, 1)
+    else:
+        # 学年・カテゴリは問題の検索索引に含まれる
+        index_questions(instance.questions.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Unit)
+def unit_deleted(sender, instance, **kwargs):
+    adjust_unit_count(instance.subject_id, -1)
+
+
+@receiver(pre_save, sender=Homework)
+def freeze_homework(sender, instance, raw=False, **kwargs):
+    """公開する宿題の出題問題を固定"""
+    if raw:
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = Homework.objects.filter(pk=instance.pk).values('unit_id', 'question_count').first()
+    prepare_homework_for_save(instance, previous)
+
+
+@receiver(post_save, sender=Homework)
+def homework_saved(sender, instance, raw=False, **kwargs):
+    """公開状態・対象を宿題の対象の表に反映し、宿題の表示データのキャッシュを無効にする"""
+    if raw:
+        return
+    rebuild_homework_audience(instance)
+    schedule_content_version_bump()
+
+
+@receiver(post_delete, sender=Homework)
+def homework_deleted(sender, instance, **kwargs):
+    schedule_content_version_bump()
@@ -0,0 +1,369 @@
+"""
+公開ページ（ホーム・教科・単元）の静的HTMLへの書き出し
+
+未ログイン時のページをそのままHTMLファイルに書き出し、WhiteNoiseで /catalog/ 以下から配信する。
+書き出すたびに全ページの内容のハッシュを名前にしたディレクトリ（/catalog/<ハッシュ>/）を作り、
+ページ間のリンクもそのディレクトリ内のファイルに書き換える。ハッシュ付きのファイルは
+内容が変わらないため長期間キャッシュでき、入口の /catalog/ だけが短いキャッシュ期間になる。
+
+CatalogWhiteNoiseMiddlewareはmanifest.jsonの更新を検知して配信するファイルを読み直すため、
+XLSM取込後などに書き出し直してもサーバーの再起動は不要。
+
+未ログインの訪問者による元のURL（/・/subject/<pk>/・/unit/<pk>/）へのGETにも、書き出した
+ページをそのまま返す（Djangoのビューとデータベースを使わない）。セッションやメッセージの
+Cookieを持つリクエストと、書き出した後にコンテンツが変更されている場合はビューで表示する。
+
+コンテンツのバージョンが上がると（問題の編集・宿題の保存・同期など）、現在のバージョンを
+書き出し先のcontent_versionファイルに書き込み、少し待ってからバックグラウンドで書き出し直す
+（続けて変更された場合は1回にまとめる）。ミドルウェアはこのファイルとmanifest.jsonの
+バージョンを比べるため、書き出したページが古いかの判定にデータベースを使わない。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve, reverse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+logger = logging.getLogger(__name__)
+
+STATIC_CATALOG_URL = '/catalog/'
+MANIFEST_NAME = 'manifest.json'
+INDEX_NAME = 'index.html'
+VERSION_NAME = 'content_version'
+
+# コンテンツのバージョンが上がってから書き出し直すまでの待ち時間（秒）。この間の変更は1回の書き出しにまとめる
+REFRESH_DELAY_SECONDS = 2.0
+
+# 現在のものを含めて残す書き出し世代の数（古いページを表示中のブラウザのリンク切れを防ぐ）
+KEEP_GENERATIONS = 3
+
+_GENERATION_PATTERN = re.compile(r'^[0-9a-f]{12}$')
+_render_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refresh_timer: Optional[threading.Timer] = None
+
+
+def get_static_catalog_root() -> str:
+    return str(getattr(settings, 'STATIC_CATALOG_ROOT', settings.BASE_DIR / 'static_catalog'))
+
+
+def _render_view(view_class, path: str, **kwargs) -> str:
+    """未ログインのGETリクエストとしてビューを描画"""
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    response = view_class.as_view()(request, **kwargs)
+    response.render()
+    return response.content.decode(response.charset)
+
+
+def _render_pages() -> List[Tuple[str, str, str]]:
+    """(URL, ファイル名, HTML) の一覧"""
+    from .catalog_cache import catalog_subject, catalog_subjects
+    from .views import HomeView, SubjectView, UnitView
+
+    home_url = reverse('quiz_app:home')
+    pages = [(home_url, INDEX_NAME, _render_view(HomeView, home_url))]
+    for subject in catalog_subjects():
+        subject_url = reverse('quiz_app:subject', args=[subject.pk])
+        pages.append((subject_url, f'subject-{subject.pk}.html', _render_view(SubjectView, subject_url, pk=subject.pk)))
+        for unit in catalog_subject(subject.pk)['units']:
+            unit_url = reverse('quiz_app:unit', args=[unit.pk])
+            pages.append((unit_url, f'unit-{unit.pk}.html', _render_view(UnitView, unit_url, pk=unit.pk)))
+    return pages
+
+
+def _write_atomic(path: str, content: str) -> None:
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _prune_generations(root: str, current: str) -> List[str]:
+    generations = [
+        name for name in os.listdir(root)
+        if _GENERATION_PATTERN.match(name) and os.path.isdir(os.path.join(root, name)) and name != current
+    ]
+    generations.sort(key=lambda name: os.path.getmtime(os.path.join(root, name)), reverse=True)
+    removed = generations[KEEP_GENERATIONS - 1:]
+    for name in removed:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return removed
+
+
+def render_static_catalog(root: Optional[str] = None) -> Dict[str, Any]:
+    """
+    公開ページを静的HTMLに書き出す
+
+    内容が前回と同じ場合はファイルを書き換えない。
+    """
+    from .catalog_cache import read_content_version
+
+    root = root or get_static_catalog_root()
+    with _render_lock:
+        # 描画より前のバージョンを記録する（描画中に変更されれば、ミドルウェアは古いページとして扱う）
+        content_version = read_content_version()
+        pages = _render_pages()
+
+        digest = hashlib.sha1()
+        for url, name, html in pages:
+            digest.update(f'{url}\0{name}\0'.encode('utf-8'))
+            digest.update(html.encode('utf-8'))
+        generation = digest.hexdigest()[:12]
+        prefix = f'{STATIC_CATALOG_URL}{generation}/'
+        links = {url: prefix + name for url, name, _ in pages}
+
+        os.makedirs(root, exist_ok=True)
+        generation_dir = os.path.join(root, generation)
+        unchanged = os.path.isdir(generation_dir)
+        removed = []
+        if not unchanged:
+            temp_dir = f'{generation_dir}.tmp'
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            os.makedirs(temp_dir)
+            for _, name, html in pages:
+                for url, link in links.items():
+                    html = html.replace(f'href="{url}"', f'href="{link}"')
+                with open(os.path.join(temp_dir, name), 'w', encoding='utf-8') as f:
+                    f.write(html)
+            os.replace(temp_dir, generation_dir)
+
+            # 入口（/catalog/）は現在の世代のホームページと同じ内容
+            with open(os.path.join(generation_dir, INDEX_NAME), encoding='utf-8') as f:
+                _write_atomic(os.path.join(root, INDEX_NAME), f.read())
+
+            # 古い世代の削除もmanifest.jsonの更新より前に行う（削除済みのファイルを配信対象にしないため）
+            removed = _prune_generations(root, generation)
+
+        # manifest.jsonは最後に書き込む（ミドルウェアはこの更新を検知して読み直す）。
+        # 内容が同じでも、書き出したページが現在のバージョンのものであることを記録し直す
+        manifest = {
+            'generation': generation,
+            'generated_at': timezone.now().isoformat(),
+            'content_version': content_version,
+            'pages': links,
+        }
+        _write_atomic(os.path.join(root, MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, indent=2))
+
+    return {
+        'generation': generation,
+        'page_count': len(pages),
+        'unchanged': unchanged,
+        'removed_generations': removed,
+        'root': root,
+    }
+
+
+def refresh_static_catalog() -> None:
+    """公開ページを書き出し直す（失敗しても呼び出し元の処理は成功扱い）"""
+    try:
+        result = render_static_catalog()
+        logger.info(f"公開ページを書き出しました - 世代: {result['generation']}, ページ数: {result['page_count']}")
+    except Exception:
+        logger.exception('公開ページの書き出しエラー')
+
+
+def _refresh_in_background() -> None:
+    global _refresh_timer
+    from django.db import connection
+
+    with _refresh_lock:
+        # 書き出し中の変更は次の書き出しとして予約できるよう、先に予約を外す
+        _refresh_timer = None
+    try:
+        refresh_static_catalog()
+    finally:
+        connection.close()
+
+
+def schedule_static_catalog_refresh() -> None:
+    """REFRESH_DELAY_SECONDS後に公開ページを書き出し直す（予約済みなら何もしない）"""
+    global _refresh_timer
+    with _refresh_lock:
+        if _refresh_timer is not None:
+            return
+        # 管理コマンドのプロセスでも書き出しを終えてから終了するよう、デーモンスレッドにしない
+        _refresh_timer = threading.Timer(REFRESH_DELAY_SECONDS, _refresh_in_background)
+        _refresh_timer.start()
+
+
+def content_version_changed(version: int) -> None:
+    """
+    コンテンツのバージョンが上がったことを書き出し先に記録し、書き出し直しを予約する
+
+    一度も書き出していなければ何もしない（書き出しはrender_static_catalogコマンドで始める）。
+    """
+    root = get_static_catalog_root()
+    if not os.path.exists(os.path.join(root, MANIFEST_NAME)):
+        return
+    try:
+        _write_atomic(os.path.join(root, VERSION_NAME), str(version))
+    except OSError:
+        logger.exception('コンテンツのバージョンの記録エラー')
+    schedule_static_catalog_refresh()
+
+
+class CatalogWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddlewareに書き出した公開ページの配信を加えたもの
+
+    /catalog/ 以下へのリクエストのときだけmanifest.jsonの更新を確認する（CHECK_INTERVAL秒ごと）。
+    """
+
+    CHECK_INTERVAL = 2.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.catalog_root = get_static_catalog_root()
+        self._catalog_mtime = None
+        self._catalog_checked_at = 0.0
+        self._catalog_urls = set()
+        self._catalog_pages = {}
+        self._catalog_content_version = None
+        self._version_mtime = None
+        self._current_content_version = None
+        self._catalog_lock = threading.Lock()
+        self.refresh_catalog_files(force=True)
+
+    def __call__(self, request):
+        static_file = None
+        is_page = False
+        if request.path_info.startswith(STATIC_CATALOG_URL):
+            self.refresh_catalog_files()
+            static_file = self.files.get(request.path_info)
+        elif self.is_anonymous_page_request(request):
+            self.refresh_catalog_files()
+            static_file = self.catalog_page(request.path_info)
+            is_page = True
+        if static_file is not None:
+            try:
+                response = self.serve(static_file, request)
+            except FileNotFoundError:
+                # 他のプロセスが古い世代を削除した直後
+                return super().__call__(request)
+            if is_page:
+                # 元のURLはログイン後に内容が変わるため、ハッシュ付きのファイルの長期キャッシュを使わない
+                response['Cache-Control'] = 'no-cache'
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return super().__call__(request)
+
+    def is_anonymous_page_request(self, request) -> bool:
+        """
+        書き出したページで答えられるリクエストか
+
+        このミドルウェアはセッションより前に動くため、ログイン状態はCookieで判定する。
+        セッションのCookieがあればログイン中の可能性があり、メッセージのCookieがあれば
+        表示待ちのメッセージがあるので、どちらもビューで表示する。
+        """
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.META.get('QUERY_STRING')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and 'messages' not in request.COOKIES
+        )
+
+    def catalog_page(self, path: str):
+        """元のURLに対応する書き出したページ（なければ・内容が古ければNone）"""
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return None
+        if match.view_name not in ('quiz_app:home', 'quiz_app:subject', 'quiz_app:unit'):
+            return None
+        # quiz_appは / と /quiz/ の両方に割り当てているため、書き出したときのURL（reverseの結果）で探す
+        link = self._catalog_pages.get(reverse(match.view_name, kwargs=match.kwargs))
+        if link is None or self._catalog_content_version is None:
+            return None
+        # 書き出した後にバージョンが上がっていれば、書き出し直すまでビューで表示する
+        if self._current_content_version is not None and self._current_content_version > self._catalog_content_version:
+            return None
+        return self.files.get(link)
+
+    def refresh_catalog_files(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._catalog_checked_at < self.CHECK_INTERVAL:
+            return
+        with self._catalog_lock:
+            self._catalog_checked_at = now
+            self.refresh_content_version()
+            try:
+                mtime = os.stat(os.path.join(self.catalog_root, MANIFEST_NAME)).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._catalog_mtime:
+                return
+            self._catalog_mtime = mtime
+
+            files = {}
+            pages = {}
+            content_version = None
+            if mtime is not None:
+                try:
+                    with open(os.path.join(self.catalog_root, MANIFEST_NAME), encoding='utf-8') as f:
+                        manifest = json.load(f)
+                    pages = manifest.get('pages', {})
+                    content_version = manifest.get('content_version')
+                except (OSError, ValueError):
+                    pass
+                for dirpath, dirnames, filenames in os.walk(self.catalog_root):
+                    # 書き込み途中のディレクトリ・ファイルは除く
+                    dirnames[:] = [name for name in dirnames if not name.endswith('.tmp')]
+                    for filename in filenames:
+                        if filename.endswith('.tmp'):
+                            continue
+                        path = os.path.join(dirpath, filename)
+                        url = STATIC_CATALOG_URL + os.path.relpath(path, self.catalog_root).replace(os.sep, '/')
+                        try:
+                            files[url] = self.get_static_file(path, url)
+                        except FileNotFoundError:
+                            continue
+                index_url = STATIC_CATALOG_URL + INDEX_NAME
+                if index_url in files:
+                    files[STATIC_CATALOG_URL] = self.get_static_file(
+                        os.path.join(self.catalog_root, INDEX_NAME), STATIC_CATALOG_URL
+                    )
+
+            self.files.update(files)
+            for url in self._catalog_urls - set(files):
+                self.files.pop(url, None)
+            self._catalog_urls = set(files)
+            self._catalog_pages = pages
+            self._catalog_content_version = content_version
+
+    def refresh_content_version(self) -> None:
+        """content_versionファイル（コンテンツのバージョンが上がるたびに書き込まれる）を読み直す"""
+        path = os.path.join(self.catalog_root, VERSION_NAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            # 書き出し後にバージョンが上がっていない
+            self._version_mtime = None
+            self._current_content_version = None
+            return
+        if mtime == self._version_mtime:
+            return
+        self._version_mtime = mtime
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._current_content_version = int(f.read().strip())
+        except (OSError, ValueError):
+            self._current_content_version = None
+
+    def immutable_file_test(self, path, url):
+        # /catalog/<ハッシュ>/ 以下のファイルは内容が変わらない
+        if url.startswith(STATIC_CATALOG_URL):
+            generation = url[len(STATIC_CATALOG_URL):].split('/', 1)[0]
+            return bool(_GENERATION_PATTERN.match(generation)) and url.count('/') > 2
+        return super().immutable_file_test(path, url)
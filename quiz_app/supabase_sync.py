@@ -0,0 +1,311 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from urllib.parse import quote
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import SyncState
+from .sync_executor import SyncExecutor, SyncError
+
+logger = logging.getLogger(__name__)
+
+# 1リクエストで送信する行数
+SUPABASE_UPSERT_CHUNK_SIZE = 500
+
+# 行の内容が原因で拒否されたときの応答（外部キー・一意制約・NOT NULLなどの違反）。
+# この応答で拒否されたチャンクは分割して送り直し、原因の行を特定する
+ROW_ERROR_STATUS_CODES = {400, 409, 422}
+
+# 1リクエストで取得する行数（Supabaseの既定の上限は1000行）
+SUPABASE_PAGE_SIZE = 1000
+
+# IDを指定して取得する場合の1リクエストあたりのID数（URLの長さを抑える）
+SUPABASE_ID_CHUNK_SIZE = 200
+
+# Supabaseに同期する問題の列（Django側のQuestionと同じ列名）
+QUESTION_SYNC_FIELDS = [
+    'id', 'unit_id', 'source_id', 'question_type', 'text', 'correct_answer',
+    'accepted_alternatives', 'choices', 'parts_count', 'requires_unit_label',
+    'unit_label_text', 'created_at', 'updated_at',
+]
+
+# Supabaseに同期する単元の列
+UNIT_SYNC_FIELDS = ['id', 'subject_id', 'grade_year', 'category', 'unit_key']
+
+# 両側の差分判定に使うフィールド
+QUESTION_COMPARE_FIELDS = [
+    'text', 'correct_answer', 'parts_count', 'requires_unit_label',
+    'unit_label_text', 'question_type', 'choices', 'accepted_alternatives',
+]
+
+
+def get_supabase_config() -> Optional[Dict[str, str]]:
+    """SupabaseのURLとキーを環境変数から取得（未設定ならNone）"""
+    supabase_url = os.getenv('SUPABASE_URL')
+    supabase_key = os.getenv('SUPABASE_ANON_KEY')
+    if not supabase_url or not supabase_key:
+        return None
+    return {'url': supabase_url.rstrip('/'), 'key': supabase_key}
+
+
+def _chunked(rows: List[Dict[str, Any]], size: int) -> Iterable[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _post_rows(executor: SyncExecutor, path: str, headers: Dict[str, str], rows: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Exception]]:
+    """
+    行をまとめて送信し、送信できなかった行と例外の一覧を返す
+
+    外部キー・制約の違反など、行の内容が原因のエラーでチャンク全体が拒否された場合は、
+    半分ずつに分けて送り直し、原因の行だけを失敗とする（他の行は更新する）。
+    """
+    try:
+        executor.post(path, json=rows, headers=headers)
+        return []
+    except SyncError as e:
+        if len(rows) > 1 and e.status_code in ROW_ERROR_STATUS_CODES:
+            middle = len(rows) // 2
+            return (
+                _post_rows(executor, path, headers, rows[:middle])
+                + _post_rows(executor, path, headers, rows[middle:])
+            )
+        return [(row, e) for row in rows]
+
+
+def upsert_rows(
+    executor: SyncExecutor,
+    table: str,
+    rows: List[Dict[str, Any]],
+    on_conflict: str = 'id',
+    chunk_size: int = SUPABASE_UPSERT_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    PostgRESTのupsert（Prefer: resolution=merge-duplicates）で行をまとめて送信
+
+    chunk_size行ごとに1リクエストとし、チャンクは実行基盤のスレッドプールで並列に送る。
+    レート制限や一時的なエラーの再試行はSyncExecutorが行う。行の内容が原因で拒否された
+    チャンクは分割して送り直し、失敗は行ごとに報告する。
+    """
+    path = f'/rest/v1/{table}?on_conflict={on_conflict}'
+    headers = {'Prefer': 'resolution=merge-duplicates,return=minimal'}
+    chunks = list(_chunked(rows, chunk_size))
+
+    results, failures, _ = executor.map(
+        lambda chunk: _post_rows(executor, path, headers, chunk),
+        chunks,
+        label=f'{table} upsert',
+    )
+
+    # 失敗した行をエラーごとにまとめる（チャンク全体の失敗は1件のエラーとして報告する）
+    failed_groups: List[Tuple[List[Dict[str, Any]], Exception]] = []
+    for _, failed_rows in results:
+        for row, error in failed_rows:
+            if failed_groups and failed_groups[-1][1] is error:
+                failed_groups[-1][0].append(row)
+            else:
+                failed_groups.append(([row], error))
+    failed_groups.extend((chunk, error) for chunk, error in failures)
+
+    errors = []
+    for failed_rows, error in failed_groups:
+        first_id, last_id = failed_rows[0].get(on_conflict), failed_rows[-1].get(on_conflict)
+        target = f'{on_conflict} {first_id}' if len(failed_rows) == 1 else f'{on_conflict} {first_id}〜{last_id}'
+        errors.append(f'{table} {target} 更新失敗 {error}')
+        logger.warning(f'Supabase upsert失敗 - {table} {target}: {error}')
+
+    # 失敗した行と、中断で送信しなかったチャンクの行
+    failed_key_set = {row.get(on_conflict) for failed_rows, _ in failed_groups for row in failed_rows}
+    succeeded_keys = {
+        row.get(on_conflict) for chunk, _ in results for row in chunk
+    } - failed_key_set
+    failed_keys = [row.get(on_conflict) for row in rows if row.get(on_conflict) not in succeeded_keys]
+
+    return {
+        'updated_count': len(rows) - len(failed_keys),
+        'failed_count': len(failed_keys),
+        'failed_keys': failed_keys,
+        'errors': errors,
+    }
+
+
+def _json_list(value: Any) -> list:
+    """JSONFieldの値をリストにそろえる（文字列で保存されている場合も対応）"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return []
+    return value if isinstance(value, list) else []
+
+
+def unit_rows_for_sync(units) -> List[Dict[str, Any]]:
+    """単元のクエリセットをSupabaseに送る行に変換"""
+    return list(units.values(*UNIT_SYNC_FIELDS))
+
+
+def question_rows_for_sync(questions) -> List[Dict[str, Any]]:
+    """問題のクエリセットをSupabaseに送る行に変換"""
+    rows = []
+    for row in questions.values(*QUESTION_SYNC_FIELDS):
+        row['accepted_alternatives'] = _json_list(row['accepted_alternatives'])
+        row['choices'] = _json_list(row['choices'])
+        for field in ('created_at', 'updated_at'):
+            if row[field] is not None:
+                row[field] = row[field].isoformat()
+        rows.append(row)
+    return rows
+
+
+def get_sync_state(direction: str, subject_code: Optional[str] = None) -> SyncState:
+    """同期方向・教科ごとの同期状態を取得（なければ作成）"""
+    state, _ = SyncState.objects.get_or_create(direction=direction, subject_code=subject_code or '')
+    return state
+
+
+def questions_changed_since(questions, state: Optional[SyncState]):
+    """同期状態より後に更新された問題を更新日時・ID順で返す（stateがNoneなら全件）"""
+    if state is not None and state.last_updated_at is not None:
+        questions = questions.filter(
+            Q(updated_at__gt=state.last_updated_at)
+            | Q(updated_at=state.last_updated_at, id__gt=state.last_id or 0)
+        )
+    return questions.order_by('updated_at', 'id')
+
+
+def parse_remote_datetime(value: Any) -> Optional[datetime]:
+    """Supabaseの日時文字列をdatetimeに変換"""
+    if not value:
+        return None
+    parsed = parse_datetime(value) if isinstance(value, str) else value
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _content_range_total(response) -> Optional[int]:
+    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+
+def count_rows(executor: SyncExecutor, table: str) -> Optional[int]:
+    """テーブルの行数を取得（HEADリクエストとPrefer: count=exactのContent-Rangeから読む）"""
+    response = executor.request('HEAD', f'/rest/v1/{table}?select=id', headers={'Prefer': 'count=exact'})
+    return _content_range_total(response)
+
+
+def _keyset_filter(updated_at: str, row_id: int) -> str:
+    """(更新日時, ID)が指定した行より後の行の条件（PostgRESTのor=の値、URLエンコード済み）"""
+    value = '"' + updated_at.replace('"', '') + '"'
+    return quote(f'(updated_at.gt.{value},and(updated_at.eq.{value},id.gt.{row_id}))', safe='')
+
+
+def fetch_remote_questions(
+    executor: SyncExecutor,
+    state: Optional[SyncState] = None,
+    select: str = '*',
+    page_size: int = SUPABASE_PAGE_SIZE,
+) -> List[Dict[str, Any]]:
+    """
+    Supabaseの問題を更新日時・ID順に取得
+
+    (更新日時, ID)のキーセットで「前のページの最後の行より後」を絞り込み、1ページずつ順に取得する。
+    オフセットでページ分割すると、取得中に更新された行が並びの末尾に移って後ろのページがずれ、
+    ページの境目の行を読み飛ばすことがあるため（読み飛ばした行より後に同期位置が進んでしまう）。
+    stateを渡すと、同期状態より後に変更された行だけを取得する。
+    stateがNoneのときは、更新日時のない行もID順に取得して最後に加える。
+    """
+    if select != '*':
+        columns = select.split(',')
+        select = ','.join(columns + [column for column in ('id', 'updated_at') if column not in columns])
+    base_path = f'/rest/v1/quiz_app_question?select={select}&order=updated_at.asc,id.asc&limit={page_size}'
+    cursor = None
+    if state is not None and state.last_updated_at is not None:
+        cursor = (state.last_updated_at.isoformat(), state.last_id or 0)
+
+    rows = []
+    while True:
+        path = base_path + (f'&or={_keyset_filter(*cursor)}' if cursor else '')
+        page = [row for row in executor.get(path).json() if row.get('updated_at') is not None]
+        if not page:
+            break
+        rows.extend(page)
+        cursor = (page[-1]['updated_at'], page[-1]['id'])
+
+    if state is None:
+        # 更新日時のない行はキーセットの条件に一致しないため、IDのキーセットで別に取得する
+        last_id = 0
+        while True:
+            page = executor.get(
+                f'/rest/v1/quiz_app_question?select={select}&updated_at=is.null&order=id.asc&limit={page_size}&id=gt.{last_id}'
+            ).json()
+            if not page:
+                break
+            rows.extend(page)
+            last_id = page[-1]['id']
+    return rows
+
+
+def fetch_remote_questions_by_ids(
+    executor: SyncExecutor,
+    ids: List[int],
+    select: str = '*',
+) -> Dict[int, Dict[str, Any]]:
+    """指定IDのSupabaseの問題をまとめて取得（id=in.(...)で分割して並列に取得）"""
+    if not ids:
+        return {}
+    chunks = [ids[start:start + SUPABASE_ID_CHUNK_SIZE] for start in range(0, len(ids), SUPABASE_ID_CHUNK_SIZE)]
+
+    def fetch_chunk(chunk):
+        id_list = ','.join(str(question_id) for question_id in chunk)
+        return executor.get(f'/rest/v1/quiz_app_question?select={select}&id=in.({id_list})').json()
+
+    results, failures, _ = executor.map(fetch_chunk, chunks, label='Supabaseから取得')
+    if failures:
+        raise failures[0][1]
+    if len(results) < len(chunks):
+        raise SyncError('Supabaseからの取得が中断されました')
+    return {row['id']: row for _, rows in results for row in rows}
+
+
+def normalize_question_fields(values: Dict[str, Any]) -> Dict[str, Any]:
+    """比較用に問題の同期対象フィールドを正規化（JSONFieldは文字列で保存されていてもリストにする）"""
+    normalized = {field: values.get(field) for field in QUESTION_COMPARE_FIELDS}
+    normalized['accepted_alternatives'] = _json_list(normalized['accepted_alternatives'])
+    normalized['choices'] = _json_list(normalized['choices'])
+    return normalized
+
+
+def question_fingerprint(values: Dict[str, Any]) -> str:
+    """問題の同期対象フィールドのハッシュ（両側の差分判定に使う）"""
+    payload = json.dumps(normalize_question_fields(values), ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def advance_sync_state(
+    state: SyncState,
+    ordered_keys: List[Tuple[Optional[datetime], int]],
+    succeeded_ids: set,
+) -> int:
+    """
+    同期できた範囲まで同期状態を進める
+
+    ordered_keysは(更新日時, ID)の処理順のリスト。最初に失敗（または未処理）の行より前までを
+    同期済みとし、失敗した行は次回の同期で再度対象になる。進めた件数を返す。
+    """
+    advanced = 0
+    for updated_at, row_id in ordered_keys:
+        if row_id not in succeeded_ids or updated_at is None:
+            break
+        state.last_updated_at = updated_at
+        state.last_id = row_id
+        advanced += 1
+
+    state.last_synced_count = advanced
+    state.synced_at = timezone.now()
+    state.save()
+    return advanced
@@ -0,0 +1,307 @@
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 同時に実行するリクエスト数と1秒あたりのリクエスト上限の既定値
+SYNC_MAX_WORKERS = 8
+SYNC_RATE_LIMIT = 20.0
+
+# 再試行の回数と待ち時間の基準（秒）。待ち時間は試行ごとに倍にし、ランダムに揺らす
+SYNC_MAX_RETRIES = 4
+SYNC_RETRY_BACKOFF = 0.5
+SYNC_RETRY_BACKOFF_MAX = 30.0
+
+# 再試行する応答ステータス（レート制限・一時的なサーバーエラー）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+SYNC_TIMEOUT = 30
+
+# 進捗を表示する間隔（秒）
+PROGRESS_INTERVAL = 2.0
+
+
+class SyncError(Exception):
+    """再試行しても成功しなかったリクエスト"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """トークンバケットによるレート制限（スレッドセーフ）"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None) -> bool:
+        """トークンを1つ取得するまで待つ（中断された場合はFalse）"""
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_seconds = (1 - self._tokens) / self.rate
+            if cancel_event is not None:
+                if cancel_event.wait(wait_seconds):
+                    return False
+            else:
+                time.sleep(wait_seconds)
+
+
+class SyncProgress:
+    """同期処理の進捗（件数・速度）を集計"""
+
+    def __init__(self, label: str, total: Optional[int] = None):
+        self.label = label
+        self.total = total
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = False
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> int:
+        return self.succeeded + self.failed
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started_at
+        rate = self.done / elapsed if elapsed else 0.0
+        total = f'/{self.total}' if self.total is not None else ''
+        state = '（中断）' if self.cancelled else ''
+        return (
+            f'{self.label}{state}: {self.done}{total}件 '
+            f'(成功 {self.succeeded}, 失敗 {self.failed}) {elapsed:.1f}秒, {rate:.1f}件/秒'
+        )
+
+
+class SyncExecutor:
+    """
+    Supabase（PostgREST）へのリクエストを実行する共通の実行基盤
+
+    - 接続はホストごとにプールして再利用する（プールの大きさは同時実行数に合わせる）
+    - 全スレッド共通のトークンバケットで1秒あたりのリクエスト数を制限する
+    - 429・5xx・通信エラーはジッター付きの指数バックオフで再試行する（Retry-Afterがあれば従う）
+    - map()は同時実行数を制限したスレッドプールで処理し、Ctrl+Cで中断しても
+      実行中のリクエストの完了を待って、それまでの結果と進捗を返す
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        max_workers: int = SYNC_MAX_WORKERS,
+        rate_limit: float = SYNC_RATE_LIMIT,
+        max_retries: int = SYNC_MAX_RETRIES,
+        backoff: float = SYNC_RETRY_BACKOFF,
+        progress_callback: Optional[Callable[[str], None]] = None,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.progress_callback = progress_callback
+        self.rate_limiter = TokenBucket(rate_limit)
+        self.cancel_event = threading.Event()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'apikey': api_key,
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+        })
+
+    @classmethod
+    def from_config(cls, config: Dict[str, str], **kwargs) -> 'SyncExecutor':
+        """get_supabase_config()の結果から作成"""
+        return cls(config['url'], config['key'], **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> 'SyncExecutor':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(float(retry_after), SYNC_RETRY_BACKOFF_MAX)
+                except ValueError:
+                    pass
+        # フルジッター: 0〜基準値のランダムな時間待つ（同時に失敗したスレッドが一斉に再試行しない）
+        return random.uniform(0, min(SYNC_RETRY_BACKOFF_MAX, self.backoff * (2 ** attempt)))
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        リクエストを送信（レート制限・再試行付き）
+
+        pathはbase_urlからの相対パス（例: /rest/v1/quiz_app_question?id=eq.1）。
+        再試行しても2xx以外の場合はSyncErrorを送出する。
+        """
+        url = f'{self.base_url}{path}'
+        kwargs.setdefault('timeout', SYNC_TIMEOUT)
+        error = None
+        status_code = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self._retry_delay(attempt - 1, response)
+                if self.cancel_event.wait(delay):
+                    break
+            response = None
+            if not self.rate_limiter.acquire(self.cancel_event):
+                break
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.Timeout:
+                error = 'タイムアウト'
+                continue
+            except requests.exceptions.RequestException as e:
+                error = f'ネットワークエラー: {str(e)}'
+                continue
+
+            if response.status_code < 300:
+                return response
+            status_code = response.status_code
+            error = f'({response.status_code}): {response.text[:200]}'
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                break
+
+        if self.cancel_event.is_set() and error is None:
+            error = '中断されました'
+        raise SyncError(f'{method} {path} 失敗 {error}', status_code)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> requests.Response:
+        return self.request('PATCH', path, **kwargs)
+
+    def map(
+        self,
+        func: Callable[[Any], Any],
+        items: Iterable[Any],
+        label: str = '同期',
+        total: Optional[int] = None,
+    ) -> Tuple[List[Tuple[Any, Any]], List[Tuple[Any, Exception]], SyncProgress]:
+        """
+        itemsの各要素にfuncを並列に適用
+
+        戻り値は(成功した(要素, 結果)のリスト, 失敗した(要素, 例外)のリスト, 進捗)。
+        結果の順序は完了順。funcの中ではデータベースにアクセスしないこと
+        （ワーカースレッドごとに別の接続になるため）。
+        """
+        if total is None and hasattr(items, '__len__'):
+            total = len(items)
+        progress = SyncProgress(label, total)
+        results: List[Tuple[Any, Any]] = []
+        failures: List[Tuple[Any, Exception]] = []
+        last_report = time.monotonic()
+        iterator = iter(items)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {}
+            try:
+                while True:
+                    # 未完了のタスクは同時実行数の2倍までに抑える（巨大な入力でもメモリを使い切らない）
+                    while len(pending) < self.max_workers * 2 and not self.cancel_event.is_set():
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            break
+                        pending[pool.submit(func, item)] = item
+                    if not pending:
+                        break
+
+                    finished, _ = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        item = pending.pop(future)
+                        try:
+                            results.append((item, future.result()))
+                            progress.record(True)
+                        except Exception as e:
+                            failures.append((item, e))
+                            progress.record(False)
+
+                    if self.progress_callback and time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                        self.progress_callback(progress.report())
+                        last_report = time.monotonic()
+            except KeyboardInterrupt:
+                # 新しいリクエストは送らず、実行中のものだけ完了させる
+                self.cancel_event.set()
+                progress.cancelled = True
+                for future in list(pending):
+                    if future.cancel():
+                        pending.pop(future)
+                for future, item in pending.items():
+                    try:
+                        results.append((item, future.result()))
+                        progress.record(True)
+                    except Exception as e:
+                        failures.append((item, e))
+                        progress.record(False)
+
+        if self.progress_callback:
+            self.progress_callback(progress.report())
+        return results, failures, progress
+
+
+def add_executor_arguments(parser) -> None:
+    """管理コマンドに同時実行数・レート制限の引数を追加"""
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=SYNC_MAX_WORKERS,
+        help=f'同時に実行するリクエスト数（既定: {SYNC_MAX_WORKERS}）',
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=SYNC_RATE_LIMIT,
+        help=f'1秒あたりのリクエスト上限（0で無制限、既定: {SYNC_RATE_LIMIT:g}）',
+    )
+
+
+def executor_from_options(config: Dict[str, str], options: Dict[str, Any], stdout=None) -> SyncExecutor:
+    """管理コマンドの引数から実行基盤を作成（stdoutを渡すと進捗を表示）"""
+    return SyncExecutor.from_config(
+        config,
+        max_workers=options.get('workers') or SYNC_MAX_WORKERS,
+        rate_limit=options.get('rate', SYNC_RATE_LIMIT),
+        progress_callback=stdout.write if stdout is not None else None,
+    )
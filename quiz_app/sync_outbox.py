@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Question, SyncOutbox
+
+logger = logging.getLogger(__name__)
+
+# 最初の登録からこの時間（秒）待ってから送信し、その間の編集を1回の送信にまとめる
+OUTBOX_COALESCE_SECONDS = 2.0
+
+# 1回の送信でまとめる最大件数
+OUTBOX_BATCH_SIZE = 500
+
+# この回数を超えて失敗した問題は自動送信の対象から外す（drain_sync_outboxコマンドで再送）
+OUTBOX_MAX_ATTEMPTS = 5
+
+_drainer_lock = threading.Lock()
+_drainer_running = False
+
+
+def enqueue_question_sync(question_ids: Iterable[int]) -> None:
+    """問題をSupabaseへの送信待ちに登録し、トランザクション確定後に送信処理を開始"""
+    from .supabase_sync import get_supabase_config
+
+    if get_supabase_config() is None:
+        return
+
+    now = timezone.now()
+    for question_id in question_ids:
+        SyncOutbox.objects.update_or_create(
+            question_id=question_id,
+            defaults={'enqueued_at': now, 'attempts': 0, 'last_error': ''},
+        )
+    transaction.on_commit(schedule_outbox_drain)
+
+
+def drain_outbox(max_attempts: int = OUTBOX_MAX_ATTEMPTS) -> Dict[str, Any]:
+    """
+    送信待ちの問題をまとめてSupabaseにupsert
+
+    送信中に再度編集された問題（登録日時が送信開始より後）は送信待ちに残し、次回に送る。
+    """
+    from .supabase_sync import get_supabase_config, question_rows_for_sync, upsert_rows
+    from .sync_executor import SyncExecutor
+
+    config = get_supabase_config()
+    if config is None:
+        return {'sent_count': 0, 'failed_count': 0, 'skipped': True}
+
+    sent_count = 0
+    failed_count = 0
+    with SyncExecutor.from_config(config) as executor:
+        while True:
+            started_at = timezone.now()
+            entries = list(
+                SyncOutbox.objects.filter(enqueued_at__lte=started_at, attempts__lt=max_attempts)
+                .order_by('enqueued_at')[:OUTBOX_BATCH_SIZE]
+            )
+            if not entries:
+                break
+
+            question_ids = [entry.question_id for entry in entries]
+            rows = question_rows_for_sync(Question.objects.filter(id__in=question_ids).order_by('id'))
+            result = upsert_rows(executor, 'quiz_app_question', rows)
+            failed_ids = set(result['failed_keys'])
+
+            # 送信できた問題（削除済みの問題を含む）を送信待ちから外す
+            sent_ids = [question_id for question_id in question_ids if question_id not in failed_ids]
+            SyncOutbox.objects.filter(question_id__in=sent_ids, enqueued_at__lte=started_at).delete()
+            if failed_ids:
+                SyncOutbox.objects.filter(question_id__in=failed_ids, enqueued_at__lte=started_at).update(
+                    attempts=F('attempts') + 1,
+                    last_error='\n'.join(result['errors'][:3]),
+                )
+
+            sent_count += len(rows) - len(failed_ids)
+            failed_count += len(failed_ids)
+            if failed_ids:
+                # 失敗した問題は送信処理の次の周回で再送する（この周回では繰り返さない）
+                break
+
+    return {'sent_count': sent_count, 'failed_count': failed_count}
+
+
+def _run_drainer() -> None:
+    global _drainer_running
+    try:
+        while True:
+            time.sleep(OUTBOX_COALESCE_SECONDS)
+            close_old_connections()
+            try:
+                result = drain_outbox()
+                if result.get('skipped'):
+                    with _drainer_lock:
+                        _drainer_running = False
+                    return
+                logger.info(f"Supabase同期待ちの送信 - 成功: {result['sent_count']}, 失敗: {result['failed_count']}")
+            except Exception:
+                logger.exception('Supabase同期待ちの送信エラー')
+
+            with _drainer_lock:
+                # 送信中に登録された問題があれば続けて送る
+                pending = SyncOutbox.objects.filter(attempts__lt=OUTBOX_MAX_ATTEMPTS).exists()
+                if not pending:
+                    _drainer_running = False
+                    return
+    except Exception:
+        with _drainer_lock:
+            _drainer_running = False
+        raise
+    finally:
+        connection.close()
+
+
+def schedule_outbox_drain() -> None:
+    """送信処理をデーモンスレッドで開始（実行中なら何もしない）"""
+    global _drainer_running
+    with _drainer_lock:
+        if _drainer_running:
+            return
+        _drainer_running = True
+
+    thread = threading.Thread(target=_run_drainer)
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,215 @@
+"""
+DjangoとSupabaseの問題データが一致しているかをIDの範囲ごとのハッシュで検証する
+
+両側でIDの範囲を等分した区間ごとに（件数, ダイジェスト）を計算して比較し、
+一致しない区間だけをさらに分割していく。区間が小さくなったら行を取得して
+差分のある問題IDを特定する。データがほぼ一致していれば、全行を取得せずに
+数十回程度のリクエストで検証が終わる。
+
+Supabase側はRPC関数（QUESTION_DIGEST_FUNCTION_SQL）で区間ごとのダイジェストを計算する。
+行のハッシュはPostgreSQLとPythonで同じ文字列から計算できるよう、
+列の値を区切り文字（U+001F）でつないだものにする。
+"""
+import bisect
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 行のハッシュに含める列（この順で連結する）
+DIGEST_FIELDS = [
+    'id', 'unit_id', 'source_id', 'question_type', 'text', 'correct_answer',
+    'accepted_alternatives', 'choices', 'parts_count', 'requires_unit_label', 'unit_label_text',
+]
+
+DIGEST_SEPARATOR = '\x1f'
+
+# 区間を分割する数と、行を直接比較する区間の大きさ（件数）
+DIGEST_FANOUT = 16
+DIGEST_LEAF_SIZE = 64
+
+DIGEST_RPC_NAME = 'question_range_digests'
+
+# Supabase（PostgreSQL）に作成するRPC関数
+# [lo, hi)をbuckets個の区間に等分し、区間ごとの件数とダイジェストを返す
+QUESTION_DIGEST_FUNCTION_SQL = f"""
+create or replace function {DIGEST_RPC_NAME}(lo bigint, hi bigint, buckets int)
+returns table(bucket_lo bigint, bucket_hi bigint, row_count bigint, digest text)
+language sql stable as $$
+  with bounds as (
+    select lo + (hi - lo) * g / buckets as blo, lo + (hi - lo) * (g + 1) / buckets as bhi
+    from generate_series(0, buckets - 1) as g
+  ),
+  normalized as (
+    select q.*,
+      case when jsonb_typeof(q.accepted_alternatives) = 'string'
+        then (q.accepted_alternatives #>> '{{}}')::jsonb else q.accepted_alternatives end as alternatives_json,
+      case when jsonb_typeof(q.choices) = 'string'
+        then (q.choices #>> '{{}}')::jsonb else q.choices end as choices_json
+    from quiz_app_question q
+    where q.id >= lo and q.id < hi
+  )
+  select b.blo, b.bhi, count(n.id),
+    coalesce(md5(string_agg(md5(concat_ws(chr(31),
+      n.id, n.unit_id, coalesce(n.source_id, ''), coalesce(n.question_type, ''),
+      coalesce(n.text, ''), coalesce(n.correct_answer, ''),
+      coalesce(n.alternatives_json, '[]'::jsonb)::text, coalesce(n.choices_json, '[]'::jsonb)::text,
+      n.parts_count, n.requires_unit_label, coalesce(n.unit_label_text, '')
+    )), '' order by n.id)), '')
+  from bounds b
+  left join normalized n on n.id >= b.blo and n.id < b.bhi
+  group by b.blo, b.bhi
+  order by b.blo;
+$$;
+"""
+
+
+def _json_text(value: Any) -> str:
+    """JSONFieldの値をPostgreSQLのjsonbのテキスト表現と同じ形式にする"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            value = []
+    if value is None:
+        value = []
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _field_text(field: str, value: Any) -> str:
+    if field in ('accepted_alternatives', 'choices'):
+        return _json_text(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '' if value is None else str(value)
+
+
+def question_row_hash(row: Dict[str, Any]) -> str:
+    """1行分のハッシュ（RPC関数のmd5(concat_ws(...))と同じ値）"""
+    text = DIGEST_SEPARATOR.join(_field_text(field, row.get(field)) for field in DIGEST_FIELDS)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+class RowHashIndex:
+    """ID順に並べた行ハッシュ（区間のダイジェストを計算する）"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        pairs = sorted((row['id'], question_row_hash(row)) for row in rows)
+        self.ids = [row_id for row_id, _ in pairs]
+        self.hashes = [row_hash for _, row_hash in pairs]
+
+    def _slice(self, lo: int, hi: int) -> Tuple[int, int]:
+        return bisect.bisect_left(self.ids, lo), bisect.bisect_left(self.ids, hi)
+
+    def digest(self, lo: int, hi: int) -> Tuple[int, str]:
+        start, end = self._slice(lo, hi)
+        if start == end:
+            return 0, ''
+        return end - start, hashlib.md5(''.join(self.hashes[start:end]).encode('ascii')).hexdigest()
+
+    def range_digests(self, lo: int, hi: int, buckets: int) -> List[Dict[str, Any]]:
+        """RPC関数と同じ形式で区間ごとのダイジェストを返す"""
+        results = []
+        for index in range(buckets):
+            bucket_lo = lo + (hi - lo) * index // buckets
+            bucket_hi = lo + (hi - lo) * (index + 1) // buckets
+            row_count, digest = self.digest(bucket_lo, bucket_hi)
+            results.append({'bucket_lo': bucket_lo, 'bucket_hi': bucket_hi, 'row_count': row_count, 'digest': digest})
+        return results
+
+    def hashes_in(self, lo: int, hi: int) -> Dict[int, str]:
+        start, end = self._slice(lo, hi)
+        return dict(zip(self.ids[start:end], self.hashes[start:end]))
+
+    @property
+    def max_id(self) -> int:
+        return self.ids[-1] if self.ids else 0
+
+
+def verify_ranges(
+    local: RowHashIndex,
+    remote_digests: Callable[[int, int, int], List[Dict[str, Any]]],
+    remote_row_hashes: Callable[[int, int], Dict[int, str]],
+    remote_max_id: int,
+    fanout: int = DIGEST_FANOUT,
+    leaf_size: int = DIGEST_LEAF_SIZE,
+) -> Dict[str, Any]:
+    """
+    区間ごとのダイジェストを比較して差分のある問題IDを特定
+
+    remote_digests(lo, hi, buckets)はSupabase側の区間ダイジェスト、
+    remote_row_hashes(lo, hi)はSupabase側の行ハッシュを返す関数。
+    """
+    missing_remote: List[int] = []
+    missing_local: List[int] = []
+    different: List[int] = []
+    digest_requests = 0
+    row_requests = 0
+
+    pending = [(1, max(local.max_id, remote_max_id) + 1)]
+    while pending:
+        lo, hi = pending.pop()
+        digest_requests += 1
+        for bucket in remote_digests(lo, hi, fanout):
+            bucket_lo, bucket_hi = bucket['bucket_lo'], bucket['bucket_hi']
+            if bucket_lo >= bucket_hi:
+                continue
+            local_count, local_digest = local.digest(bucket_lo, bucket_hi)
+            if (local_count, local_digest) == (bucket['row_count'], bucket['digest'] or ''):
+                continue
+
+            if max(local_count, bucket['row_count']) <= leaf_size or bucket_hi - bucket_lo <= fanout:
+                # 小さな区間は行を取得して比較
+                row_requests += 1
+                remote_hashes = remote_row_hashes(bucket_lo, bucket_hi)
+                local_hashes = local.hashes_in(bucket_lo, bucket_hi)
+                missing_remote.extend(sorted(set(local_hashes) - set(remote_hashes)))
+                missing_local.extend(sorted(set(remote_hashes) - set(local_hashes)))
+                different.extend(sorted(
+                    row_id for row_id in set(local_hashes) & set(remote_hashes)
+                    if local_hashes[row_id] != remote_hashes[row_id]
+                ))
+            else:
+                pending.append((bucket_lo, bucket_hi))
+
+    return {
+        'missing_remote': sorted(missing_remote),
+        'missing_local': sorted(missing_local),
+        'different': sorted(different),
+        'digest_requests': digest_requests,
+        'row_requests': row_requests,
+    }
+
+
+def register_fake_digest_rpc(server, table: str = 'quiz_app_question') -> None:
+    """疑似PostgRESTサーバーに区間ダイジェストのRPC関数を登録（テスト・ベンチマーク用）"""
+
+    def rpc(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        index = RowHashIndex(server.rows(table))
+        return index.range_digests(int(body['lo']), int(body['hi']), int(body['buckets']))
+
+    server.register_rpc(DIGEST_RPC_NAME, rpc)
+
+
+def remote_max_question_id(executor) -> int:
+    rows = executor.get('/rest/v1/quiz_app_question?select=id&order=id.desc&limit=1').json()
+    return rows[0]['id'] if rows else 0
+
+
+def verify_with_supabase(executor, local_rows: List[Dict[str, Any]], fanout: int = DIGEST_FANOUT,
+                         leaf_size: int = DIGEST_LEAF_SIZE) -> Dict[str, Any]:
+    """Django側の行とSupabaseを比較"""
+    select = ','.join(DIGEST_FIELDS)
+
+    def remote_digests(lo: int, hi: int, buckets: int) -> List[Dict[str, Any]]:
+        return executor.post(f'/rest/v1/rpc/{DIGEST_RPC_NAME}', json={'lo': lo, 'hi': hi, 'buckets': buckets}).json()
+
+    def remote_row_hashes(lo: int, hi: int) -> Dict[int, str]:
+        rows = executor.get(f'/rest/v1/quiz_app_question?select={select}&id=gte.{lo}&id=lt.{hi}').json()
+        return {row['id']: question_row_hash(row) for row in rows}
+
+    result = verify_ranges(
+        RowHashIndex(local_rows), remote_digests, remote_row_hashes,
+        remote_max_question_id(executor), fanout=fanout, leaf_size=leaf_size,
+    )
+    result['requests'] = result['digest_requests'] + result['row_requests'] + 1
+    return result
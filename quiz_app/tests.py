@@ -1,3 +1,611 @@
-from django.test import TestCase
+import os
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+from accounts.models import User
+from .catalog_cache import read_content_version, schedule_content_version_bump
+from .fake_postgrest import FakePostgREST
+from .homework import get_homework_payload, start_homework_session, visible_homework
+from .models import Homework, Subject, Unit, Question, SyncOutbox, SyncState
+from .pagination import keyset_paginate
+from .search import index_tokens, query_tokens, search_question_ids
+from .supabase_sync import fetch_remote_questions, upsert_rows
+from .sync_executor import SyncExecutor
+from .sync_outbox import drain_outbox, enqueue_question_sync
+from .sync_verify import _json_text, question_row_hash, register_fake_digest_rpc, verify_with_supabase
+from .utils import save_questions_from_xlsm_data, sync_alternatives_to_supabase
 
-# Create your tests here.
+TABLE = 'quiz_app_question'
+
+
+def make_row(question_id, unit_id=1, alternatives=None):
+    return {
+        'id': question_id,
+        'unit_id': unit_id,
+        'source_id': f'T{question_id:07d}',
+        'text': f'問題{question_id}',
+        'correct_answer': f'正解{question_id}',
+        'accepted_alternatives': alternatives or [],
+    }
+
+
+class UpsertRowsTests(SimpleTestCase):
+    """疑似PostgRESTサーバーに対するupsert_rowsのチャンク分割・再試行・失敗の集計"""
+
+    def setUp(self):
+        self.server = FakePostgREST().start()
+        self.addCleanup(self.server.stop)
+        self.executor = SyncExecutor(self.server.url, 'test', max_workers=4, rate_limit=0, max_retries=2, backoff=0.01)
+        self.addCleanup(self.executor.close)
+
+    def test_rows_are_sent_in_chunks(self):
+        rows = [make_row(question_id) for question_id in range(1, 1201)]
+
+        result = upsert_rows(self.executor, TABLE, rows, chunk_size=500)
+
+        self.assertEqual(self.server.requests_by_method, {'POST': 3})
+        self.assertEqual(result['updated_count'], 1200)
+        self.assertEqual(result['failed_count'], 0)
+        self.assertEqual(len(self.server.rows(TABLE)), 1200)
+
+    def test_existing_rows_are_merged(self):
+        self.server.seed(TABLE, [make_row(1, alternatives=['旧別解'])])
+
+        upsert_rows(self.executor, TABLE, [{'id': 1, 'accepted_alternatives': ['新別解']}])
+
+        stored = self.server.rows(TABLE)[0]
+        self.assertEqual(stored['accepted_alternatives'], ['新別解'])
+        self.assertEqual(stored['text'], '問題1')
+
+    def test_temporary_errors_are_retried(self):
+        self.server.fail_next(2)
+        rows = [make_row(question_id) for question_id in range(1, 11)]
+
+        result = upsert_rows(self.executor, TABLE, rows, chunk_size=10)
+
+        self.assertEqual(self.server.request_count, 3)
+        self.assertEqual(result['updated_count'], 10)
+        self.assertEqual(result['errors'], [])
+
+    def test_chunk_failing_after_retries_is_counted(self):
+        # 1チャンク目の3回（初回と再試行2回）をすべて失敗させる
+        executor = SyncExecutor(self.server.url, 'test', max_workers=1, rate_limit=0, max_retries=2, backoff=0.01)
+        self.addCleanup(executor.close)
+        self.server.fail_next(3)
+        rows = [make_row(question_id) for question_id in range(1, 9)]
+
+        result = upsert_rows(executor, TABLE, rows, chunk_size=4)
+
+        self.assertEqual(result['updated_count'], 4)
+        self.assertEqual(result['failed_count'], 4)
+        self.assertEqual(result['failed_keys'], [1, 2, 3, 4])
+        self.assertEqual(len(result['errors']), 1)
+        self.assertEqual(sorted(row['id'] for row in self.server.rows(TABLE)), [5, 6, 7, 8])
+
+    def test_rejected_rows_are_reported_per_row(self):
+        self.server.add_foreign_key(TABLE, 'unit_id', 'quiz_app_unit')
+        self.server.seed('quiz_app_unit', [{'id': 1}])
+        rows = [make_row(question_id) for question_id in range(1, 9)]
+        rows[5]['unit_id'] = 99
+
+        result = upsert_rows(self.executor, TABLE, rows, chunk_size=8)
+
+        self.assertEqual(result['failed_keys'], [6])
+        self.assertEqual(result['updated_count'], 7)
+        self.assertEqual(len(result['errors']), 1)
+        self.assertIn('id 6', result['errors'][0])
+        self.assertEqual(len(self.server.rows(TABLE)), 7)
+
+
+class ScheduleContentVersionBumpTests(TestCase):
+    """確定後のバージョンの更新（同じトランザクションの予約は1回にまとめる）"""
+
+    def test_bumps_in_one_transaction_are_coalesced(self):
+        version = read_content_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                schedule_content_version_bump()
+        self.assertEqual(read_content_version(), version + 1)
+
+    def test_bump_is_not_lost_after_a_rollback(self):
+        version = read_content_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    schedule_content_version_bump()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        # ロールバックで捨てられた予約はバージョンを上げない
+        self.assertEqual(read_content_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_content_version_bump()
+        self.assertEqual(read_content_version(), version + 1)
+
+
+class SyncAlternativesTests(TestCase):
+    """取込後のSupabase同期（単元を先に送り、新しい単元の問題も送れること）"""
+
+    def setUp(self):
+        self.server = FakePostgREST().start()
+        self.addCleanup(self.server.stop)
+        self.server.add_foreign_key(TABLE, 'unit_id', 'quiz_app_unit')
+        environ = mock.patch.dict(os.environ, {'SUPABASE_URL': self.server.url, 'SUPABASE_ANON_KEY': 'test'})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        subject = Subject.objects.create(code=Subject.Code.SCIENCE, label_ja='理科')
+        self.old_unit = Unit.objects.create(subject=subject, grade_year='中1', category='化学')
+        self.new_unit = Unit.objects.create(subject=subject, grade_year='中2', category='生物')
+        self.old_question = Question.objects.create(
+            unit=self.old_unit, source_id='S1', text='問題1', correct_answer='酸化', accepted_alternatives=['さんか'],
+        )
+        self.new_question = Question.objects.create(
+            unit=self.new_unit, source_id='S2', text='問題2', correct_answer='細胞',
+        )
+        # Supabaseには既存の単元と問題だけがある
+        self.server.seed('quiz_app_unit', [{'id': self.old_unit.id}])
+        self.server.seed(TABLE, [make_row(self.old_question.id, unit_id=self.old_unit.id)])
+
+    def test_new_units_are_synced_before_questions(self):
+        result = sync_alternatives_to_supabase('science')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['failed_count'], 0)
+        self.assertEqual(result['updated_count'], 2)
+        remote = {row['id']: row for row in self.server.rows(TABLE)}
+        self.assertEqual(remote[self.old_question.id]['accepted_alternatives'], ['さんか'])
+        self.assertEqual(remote[self.new_question.id]['unit_id'], self.new_unit.id)
+
+    def test_questions_of_unsynced_units_are_reported(self):
+        # 単元のチャンクと、分割後の1つ目の単元（old_unit）の送信を拒否する
+        self.server.fail_next(2, status=400)
+
+        result = sync_alternatives_to_supabase('science')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['failed_ids'], [self.old_question.id])
+        self.assertEqual(result['updated_count'], 1)
+        self.assertTrue(any(f'問題ID {self.old_question.id}' in error for error in result['errors']))
+        remote = {row['id']: row for row in self.server.rows(TABLE)}
+        self.assertEqual(remote[self.old_question.id]['accepted_alternatives'], [])
+        self.assertEqual(remote[self.new_question.id]['unit_id'], self.new_unit.id)
+
+
+def import_item(source_id, answer, grade='中1', category='化学', alternatives=None):
+    return {
+        'source_id': source_id,
+        'grade': grade,
+        'category': category,
+        'question_type': Question.QuestionType.TEXT,
+        'question_text': f'{answer}を答えよ',
+        'correct_answer': answer,
+        'alternatives': alternatives or [],
+        'choices': [],
+        'parts_count': 1,
+        'requires_unit_label': False,
+        'unit_label_text': '',
+    }
+
+
+class SaveQuestionsFromXlsmDataTests(TestCase):
+    """取込データの保存（(単元, 元データID)をキーにした一括アップサート）"""
+
+    def setUp(self):
+        # 保存時に予約されるバージョンの更新をここで済ませ、取込での更新と区別する
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject = Subject.objects.create(code=Subject.Code.SCIENCE, label_ja='理科')
+            self.unit = Unit.objects.create(subject=self.subject, grade_year='中1', category='化学')
+            self.existing = Question.objects.create(
+                unit=self.unit, source_id='S1', text='旧問題', correct_answer='旧正解', accepted_alternatives=['旧別解'],
+            )
+            self.untouched = Question.objects.create(
+                unit=self.unit, source_id='S9', text='対象外', correct_answer='酸素', accepted_alternatives=['さんそ'],
+            )
+        Unit.objects.filter(pk=self.unit.pk).update(question_count=2)
+        Subject.objects.filter(pk=self.subject.pk).update(question_count=2)
+
+    def save(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return save_questions_from_xlsm_data(data, 'science', sync_supabase=False)
+
+    def test_inserts_and_updates_are_counted_and_written(self):
+        version = read_content_version()
+
+        result = self.save([
+            import_item('S1', '酸化', alternatives=['さんか']),
+            import_item('S2', '還元'),
+            # 同じファイル内の重複行は後の行で上書きする
+            import_item('S2', '還元反応'),
+            import_item('S3', '細胞', grade='中2', category='生物'),
+        ])
+
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['saved_count'], 2)
+        self.assertEqual(result['updated_count'], 2)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.correct_answer, '酸化')
+        self.assertEqual(self.existing.accepted_alternatives, ['さんか'])
+        self.assertEqual(Question.objects.get(unit=self.unit, source_id='S2').correct_answer, '還元反応')
+        self.assertEqual(Question.objects.filter(unit__subject=self.subject).count(), 4)
+        self.assertGreater(read_content_version(), version)
+
+    def test_existing_rows_keep_fields_outside_the_import(self):
+        created_at = self.existing.created_at
+        before = Question.objects.get(pk=self.existing.pk).updated_at
+
+        self.save([import_item('S1', '酸化')])
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.created_at, created_at)
+        self.assertGreaterEqual(self.existing.updated_at, before)
+        # 取込に含まれない問題は別解だけがクリアされる
+        self.untouched.refresh_from_db()
+        self.assertEqual(self.untouched.correct_answer, '酸素')
+        self.assertEqual(self.untouched.accepted_alternatives, [])
+
+    def test_only_new_questions_increase_the_counters(self):
+        self.save([
+            import_item('S1', '酸化'),
+            import_item('S2', '還元'),
+            import_item('S3', '細胞', grade='中2', category='生物'),
+        ])
+
+        self.unit.refresh_from_db()
+        self.subject.refresh_from_db()
+        self.assertEqual(self.unit.question_count, 3)
+        self.assertEqual(Unit.objects.get(grade_year='中2', category='生物').question_count, 1)
+        self.assertEqual(self.subject.question_count, 4)
+
+    def test_search_index_follows_the_import(self):
+        self.save([import_item('S1', '光合成'), import_item('S2', '還元')])
+
+        ids = search_question_ids('光合成')
+        if ids is None:
+            self.skipTest('このデータベースは検索索引に対応していない')
+        self.assertEqual(ids, [self.existing.pk])
+        self.assertEqual(search_question_ids('さんそ'), [])
+
+
+class SyncOutboxTests(TestCase):
+    """管理画面の編集の送信待ち（連続した編集を1回の送信にまとめる）"""
+
+    def setUp(self):
+        self.server = FakePostgREST().start()
+        self.addCleanup(self.server.stop)
+        environ = mock.patch.dict(os.environ, {'SUPABASE_URL': self.server.url, 'SUPABASE_ANON_KEY': 'test'})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        subject = Subject.objects.create(code=Subject.Code.SCIENCE, label_ja='理科')
+        unit = Unit.objects.create(subject=subject, grade_year='中1', category='化学')
+        self.question = Question.objects.create(unit=unit, source_id='S1', text='問題1', correct_answer='酸化')
+
+    def test_repeated_edits_are_sent_once(self):
+        for _ in range(3):
+            enqueue_question_sync([self.question.id])
+        self.assertEqual(SyncOutbox.objects.count(), 1)
+        self.server.reset_counters()
+
+        result = drain_outbox()
+
+        self.assertEqual(result, {'sent_count': 1, 'failed_count': 0})
+        self.assertEqual(self.server.requests_by_method, {'POST': 1})
+        self.assertEqual([row['id'] for row in self.server.rows(TABLE)], [self.question.id])
+        self.assertFalse(SyncOutbox.objects.exists())
+
+    def test_edits_during_the_send_are_sent_again(self):
+        enqueue_question_sync([self.question.id])
+
+        from .supabase_sync import upsert_rows as original_upsert
+        calls = []
+
+        def upsert_and_edit(*args, **kwargs):
+            result = original_upsert(*args, **kwargs)
+            calls.append(args)
+            if len(calls) == 1:
+                # 送信中に同じ問題がもう一度編集された（送信した内容より新しい）
+                Question.objects.filter(pk=self.question.pk).update(correct_answer='還元')
+                enqueue_question_sync([self.question.id])
+            return result
+
+        with mock.patch('quiz_app.supabase_sync.upsert_rows', side_effect=upsert_and_edit):
+            result = drain_outbox()
+
+        # 送信中の編集は送信済みとして消さず、続けて送る
+        self.assertEqual(result, {'sent_count': 2, 'failed_count': 0})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.server.rows(TABLE)[0]['correct_answer'], '還元')
+        self.assertFalse(SyncOutbox.objects.exists())
+
+    def test_failed_sends_are_retried_later(self):
+        enqueue_question_sync([self.question.id])
+        self.server.fail_next(1, status=400)
+
+        result = drain_outbox()
+
+        self.assertEqual(result, {'sent_count': 0, 'failed_count': 1})
+        entry = SyncOutbox.objects.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertTrue(entry.last_error)
+        # 試行回数の上限を超えた問題は自動送信の対象から外す
+        self.assertEqual(drain_outbox(max_attempts=1), {'sent_count': 0, 'failed_count': 0})
+
+
+class KeysetPaginateTests(TestCase):
+    """カーソル方式のページ分割（同じ作成日時の行もIDで区切って前後に移動できること）"""
+
+    def setUp(self):
+        subject = Subject.objects.create(code=Subject.Code.SCIENCE, label_ja='理科')
+        unit = Unit.objects.create(subject=subject, grade_year='中1', category='化学')
+        Question.objects.bulk_create(
+            Question(unit=unit, source_id=f'S{index}', text=f'問題{index}', correct_answer='正解') for index in range(11)
+        )
+        # 3問ずつ同じ作成日時にする
+        for question in Question.objects.all():
+            Question.objects.filter(pk=question.pk).update(
+                created_at=datetime(2026, 1, 1, 0, question.pk // 3, tzinfo=dt_timezone.utc)
+            )
+        self.ordered = list(Question.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def paginate(self, cursor=None):
+        return keyset_paginate(Question.objects.all(), ['created_at', 'id'], 4, cursor=cursor)
+
+    def test_next_and_previous_pages(self):
+        pages = [self.paginate()]
+        while pages[-1].has_next():
+            pages.append(self.paginate(pages[-1].next_cursor))
+
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        self.assertEqual([question.id for page in pages for question in page], self.ordered)
+        self.assertFalse(pages[0].has_previous())
+        self.assertIsNone(pages[-1].next_cursor)
+
+        # 最後のページから前のページに戻ると同じ区切りになる
+        previous = self.paginate(pages[-1].previous_cursor)
+        self.assertEqual([question.id for question in previous], [question.id for question in pages[1]])
+        self.assertTrue(previous.has_next())
+        first = self.paginate(previous.previous_cursor)
+        self.assertEqual([question.id for question in first], [question.id for question in pages[0]])
+        self.assertFalse(first.has_previous())
+
+    def test_invalid_cursor_shows_the_first_page(self):
+        page = self.paginate('不正なカーソル')
+        self.assertEqual([question.id for question in page], self.ordered[:4])
+
+
+class HomeworkTestCase(TestCase):
+    """宿題のテストの共通の準備（単元と選択問題10問）"""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass', role=User.Role.ADMIN)
+        subject = Subject.objects.create(code=Subject.Code.SCIENCE, label_ja='理科')
+        self.unit = Unit.objects.create(subject=subject, grade_year='中1', category='化学')
+        self.question_ids = set()
+        for index in range(10):
+            question = Question.objects.create(
+                unit=self.unit, source_id=f'S{index}', text=f'問題{index}', correct_answer='正解',
+                question_type=Question.QuestionType.CHOICE, choices=['ア', 'イ', 'ウ', 'エ'],
+            )
+            self.question_ids.add(question.id)
+
+    def create_homework(self, **fields):
+        values = {
+            'created_by': self.teacher, 'unit': self.unit, 'question_count': 5,
+            'publish_scope': Homework.PublishScope.SCHOOL, 'scope_prefecture': '東京都',
+            'scope_school': '第一中', 'public_slug': 'hw1', 'is_published': True,
+        }
+        values.update(fields)
+        return Homework.objects.create(**values)
+
+
+class HomeworkFreezeTests(HomeworkTestCase):
+    """宿題の出題問題の固定（公開時に1回だけ決め、全生徒に同じ問題を同じ順で出題する）"""
+
+    def test_questions_are_frozen_when_published(self):
+        homework = self.create_homework()
+
+        self.assertEqual(len(homework.question_ids), 5)
+        self.assertTrue(set(homework.question_ids) <= self.question_ids)
+        self.assertEqual(set(homework.choice_mappings), {str(question_id) for question_id in homework.question_ids})
+        self.assertIsNotNone(homework.published_at)
+
+        # 問題数・単元以外の変更では固定し直さない
+        frozen = homework.question_ids
+        homework.scope_school = '第二中'
+        homework.save()
+        self.assertEqual(Homework.objects.get(pk=homework.pk).question_ids, frozen)
+
+        homework.question_count = 3
+        homework.save()
+        self.assertEqual(len(Homework.objects.get(pk=homework.pk).question_ids), 3)
+
+    def test_unpublished_homework_is_not_frozen(self):
+        self.assertEqual(self.create_homework(is_published=False).question_ids, [])
+
+    def test_every_student_gets_the_same_questions(self):
+        homework = self.create_homework()
+        payload = get_homework_payload(homework.public_slug)
+        students = [User.objects.create_user(username=f'student{index}', password='pass') for index in range(2)]
+
+        sessions = [start_homework_session(student, payload) for student in students]
+
+        self.assertEqual([item['id'] for item in payload['questions']], homework.question_ids)
+        self.assertEqual(sessions[0].question_ids, sessions[1].question_ids)
+        self.assertEqual(sessions[0].choice_mappings, sessions[1].choice_mappings)
+        # 解答途中のセッションは作り直さない
+        self.assertEqual(start_homework_session(students[0], payload).pk, sessions[0].pk)
+
+    def test_legacy_homework_is_frozen_once(self):
+        homework = self.create_homework()
+        # 問題を固定する前に公開された宿題
+        Homework.objects.filter(pk=homework.pk).update(question_ids=[], choice_mappings={})
+
+        first = get_homework_payload(homework.public_slug)
+        cache.clear()
+        second = get_homework_payload(homework.public_slug)
+
+        self.assertEqual(len(first['questions']), 5)
+        self.assertEqual(first['questions'], second['questions'])
+        self.assertEqual(Homework.objects.get(pk=homework.pk).question_ids, [item['id'] for item in first['questions']])
+
+
+class VisibleHomeworkTests(HomeworkTestCase):
+    """生徒に表示する宿題（公開範囲の対象で絞り込み、対象ごとにキャッシュする）"""
+
+    def visible_slugs(self, school='第一中', class_name='A'):
+        return [assignment['slug'] for assignment in visible_homework('東京都', school, class_name)]
+
+    def test_scope_selects_the_students(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_homework(public_slug='school')
+            self.create_homework(public_slug='class-a', publish_scope=Homework.PublishScope.CLASS, scope_class_name='A')
+            self.create_homework(public_slug='draft', is_published=False)
+
+        self.assertEqual(sorted(self.visible_slugs()), ['class-a', 'school'])
+        self.assertEqual(self.visible_slugs(class_name='B'), ['school'])
+        self.assertEqual(self.visible_slugs(school='第二中'), [])
+
+    def test_changes_are_visible_despite_the_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            homework = self.create_homework()
+        self.assertEqual(self.visible_slugs(), ['hw1'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            homework.is_published = False
+            homework.save()
+        self.assertEqual(self.visible_slugs(), [])
+
+
+class SearchTokenTests(SimpleTestCase):
+    """PostgreSQLの検索索引のトークン（1〜2文字の日本語の語でも索引で絞り込めること）"""
+
+    def test_query_tokens_are_contained_in_the_index_tokens(self):
+        text = '中１ 化学\n物質が酸素と結びつく化学変化を何というか。\n酸化'
+        tokens = set(index_tokens(text))
+        for run in ['酸', '酸化', '化学変化', '中1', 'か']:
+            self.assertTrue(query_tokens(run), run)
+            self.assertTrue(set(query_tokens(run)) <= tokens, run)
+        self.assertFalse(set(query_tokens('還元')) <= tokens)
+
+    def test_short_terms_use_their_own_tokens(self):
+        self.assertEqual(query_tokens('酸'), ['酸'])
+        self.assertEqual(query_tokens('酸化'), ['酸化'])
+        self.assertEqual(query_tokens('酸化銅'), ['酸化', '化銅'])
+
+
+def remote_timestamp(minute):
+    return f'2026-01-01T00:{minute:02d}:00+00:00'
+
+
+class FetchRemoteQuestionsTests(SimpleTestCase):
+    """Supabaseの変更行の取得（(更新日時, ID)のキーセットで1ページずつ）"""
+
+    def setUp(self):
+        self.server = FakePostgREST().start()
+        self.addCleanup(self.server.stop)
+        self.executor = SyncExecutor(self.server.url, 'test', max_workers=1, rate_limit=0, max_retries=0, backoff=0.01)
+        self.addCleanup(self.executor.close)
+        # 3行ずつ同じ更新日時
+        self.server.seed(TABLE, [
+            {'id': question_id, 'updated_at': remote_timestamp(question_id // 3)} for question_id in range(1, 26)
+        ])
+
+    def test_rows_after_the_watermark_are_fetched_in_order(self):
+        state = SyncState(last_updated_at=datetime(2026, 1, 1, 0, 1, tzinfo=dt_timezone.utc), last_id=4)
+
+        rows = fetch_remote_questions(self.executor, state, page_size=4)
+
+        self.assertEqual([row['id'] for row in rows], list(range(5, 26)))
+
+    def test_rows_updated_during_the_fetch_are_not_skipped(self):
+        original_get = self.executor.get
+        calls = []
+
+        def get_and_update(path, **kwargs):
+            response = original_get(path, **kwargs)
+            calls.append(path)
+            if len(calls) == 1:
+                # 1ページ目の取得後に、取得済みの行が更新されて並びの末尾に移る
+                self.server.seed(TABLE, [{'id': 2, 'updated_at': remote_timestamp(59)}])
+            return response
+
+        with mock.patch.object(self.executor, 'get', side_effect=get_and_update):
+            rows = fetch_remote_questions(self.executor, page_size=5)
+
+        fetched = [row['id'] for row in rows]
+        self.assertEqual(set(fetched), set(range(1, 26)))
+        self.assertEqual(fetched[-1], 2)
+
+
+def digest_row(question_id, **changes):
+    row = {
+        'id': question_id,
+        'unit_id': 1 + question_id % 3,
+        'source_id': f'T{question_id:07d}',
+        'question_type': 'text',
+        'text': f'問題{question_id}',
+        'correct_answer': f'正解{question_id}',
+        'accepted_alternatives': [f'別解{question_id}'],
+        'choices': [],
+        'parts_count': 1,
+        'requires_unit_label': False,
+        'unit_label_text': '',
+    }
+    row.update(changes)
+    return row
+
+
+class VerifySupabaseSyncTests(SimpleTestCase):
+    """区間ダイジェストによるDjangoとSupabaseの比較（一致しない区間だけを分割する）"""
+
+    def setUp(self):
+        self.server = FakePostgREST().start()
+        self.addCleanup(self.server.stop)
+        register_fake_digest_rpc(self.server)
+        self.executor = SyncExecutor(self.server.url, 'test', max_workers=1, rate_limit=0, max_retries=0, backoff=0.01)
+        self.addCleanup(self.executor.close)
+        self.local_rows = [digest_row(question_id) for question_id in range(1, 601)]
+
+    def test_matching_data_needs_one_digest_request(self):
+        self.server.seed(TABLE, self.local_rows)
+
+        result = verify_with_supabase(self.executor, self.local_rows, fanout=4, leaf_size=8)
+
+        self.assertEqual((result['missing_remote'], result['missing_local'], result['different']), ([], [], []))
+        self.assertEqual(result['digest_requests'], 1)
+        self.assertEqual(result['row_requests'], 0)
+
+    def test_differences_are_found_by_splitting_ranges(self):
+        remote_rows = [row for row in self.local_rows if row['id'] != 100]
+        remote_rows.append(digest_row(700))
+        remote_rows[348] = digest_row(350, text='Supabaseで編集')
+        self.server.seed(TABLE, remote_rows)
+
+        result = verify_with_supabase(self.executor, self.local_rows, fanout=4, leaf_size=8)
+
+        self.assertEqual(result['missing_remote'], [100])
+        self.assertEqual(result['missing_local'], [700])
+        self.assertEqual(result['different'], [350])
+        # 差分のある区間だけを取得する（全600行は取得しない）
+        self.assertEqual(result['row_requests'], 3)
+        self.assertLess(result['requests'], 40)
+
+    def test_json_text_matches_jsonb_text(self):
+        # PostgreSQLの jsonb::text と同じ表記（区切りの後に空白、日本語はそのまま）
+        self.assertEqual(_json_text(['さんか', 'a"b']), '["さんか", "a\\"b"]')
+        self.assertEqual(_json_text([]), '[]')
+        self.assertEqual(_json_text(None), '[]')
+        # 文字列として保存されたJSON（RPC関数は中身のJSONに戻してから比較する）
+        self.assertEqual(_json_text('["さんか"]'), '["さんか"]')
+        self.assertEqual(_json_text('不正な値'), '[]')
+
+    def test_row_hash_ignores_json_stored_as_text(self):
+        row = digest_row(1)
+        as_text = digest_row(1, accepted_alternatives='["別解1"]', choices='[]')
+        self.assertEqual(question_row_hash(row), question_row_hash(as_text))
+        self.assertNotEqual(question_row_hash(row), question_row_hash(digest_row(1, requires_unit_label=True)))
@@ -28,4 +28,5 @@ urlpatterns = [
     
     # 宿題
     path('homework/<str:slug>/', views.HomeworkView.as_view(), name='homework'),
+    path('homework/<str:slug>/start/', views.HomeworkStartView.as_view(), name='homework_start'),
 ]
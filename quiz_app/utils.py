@@ -1,13 +1,16 @@
 import re
 import json
 import unicodedata
+from collections import defaultdict
 from typing import List, Dict, Any, Tuple, Optional
 from openpyxl import load_workbook
 from django.db import transaction
 from django.conf import settings
 from .models import Subject, Unit, Question
+from .catalog_cache import schedule_content_version_bump
+from .question_counts import adjust_question_counts
+from .search import index_questions
 import os
-import requests
 from dotenv import load_dotenv
 
 # .envファイルを読み込み
@@ -168,13 +171,21 @@ def check_answer(user_answer: str, question: Question) -> bool:
 
 
 def sync_alternatives_to_supabase(subject_code: str) -> Dict[str, Any]:
-    """Supabaseの別解データを同期更新"""
+    """
+    Supabaseの別解データを同期更新（問題行をまとめてupsert）
+
+    取込で新しく作成された単元はSupabaseにまだないため、問題より先に教科の単元をupsertする
+    （問題の単元への外部キーを満たすため）。単元を送れなかった問題は送らずに失敗とし、
+    失敗は行ごとに報告する。
+    """
+    from .supabase_sync import get_supabase_config, upsert_rows, question_rows_for_sync, unit_rows_for_sync
+    from .sync_executor import SyncExecutor
+
     try:
-        supabase_url = os.getenv('SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_ANON_KEY')
+        config = get_supabase_config()
         
         # 本番環境でのみSupabase同期を実行
-        if not supabase_url or not supabase_key:
+        if config is None:
             return {
                 'success': True,
                 'updated_count': 0,
@@ -183,66 +194,24 @@ def sync_alternatives_to_supabase(subject_code: str) -> Dict[str, Any]:
                 'skipped': True
             }
         
-        headers = {
-            'apikey': supabase_key,
-            'Authorization': f'Bearer {supabase_key}',
-            'Content-Type': 'application/json',
-            'Prefer': 'return=representation'
-        }
-        
         subject = Subject.objects.get(code=subject_code)
-        questions = Question.objects.filter(unit__subject=subject)
-        
-        updated_count = 0
-        failed_count = 0
-        errors = []
+        unit_rows = unit_rows_for_sync(Unit.objects.filter(subject=subject).order_by('id'))
+        rows = question_rows_for_sync(Question.objects.filter(unit__subject=subject).order_by('id'))
         
-        for question in questions:
-            try:
-                update_url = f"{supabase_url}/rest/v1/quiz_app_question?id=eq.{question.id}"
-                alternatives = question.accepted_alternatives or []
-                
-                # JSONFieldの文字列変換対応
-                if isinstance(alternatives, str):
-                    try:
-                        alternatives = json.loads(alternatives)
-                    except json.JSONDecodeError:
-                        alternatives = []
-                
-                # リストでない場合は空リストに
-                if not isinstance(alternatives, list):
-                    alternatives = []
-                
-                update_data = {
-                    'accepted_alternatives': alternatives
-                }
-                
-                response = requests.patch(update_url, headers=headers, json=update_data, timeout=30)
-                
-                if response.status_code == 200:
-                    updated_count += 1
-                else:
-                    failed_count += 1
-                    error_msg = f"問題ID {question.id} 更新失敗 ({response.status_code}): {response.text}"
-                    errors.append(error_msg)
-                    
-            except requests.exceptions.Timeout:
-                failed_count += 1
-                error_msg = f"問題ID {question.id} の更新タイムアウト"
-                errors.append(error_msg)
-            except requests.exceptions.RequestException as e:
-                failed_count += 1
-                error_msg = f"問題ID {question.id} のネットワークエラー: {str(e)}"
-                errors.append(error_msg)
-            except Exception as e:
-                failed_count += 1
-                error_msg = f"問題ID {question.id} の更新エラー: {str(e)}"
-                errors.append(error_msg)
+        with SyncExecutor.from_config(config) as executor:
+            unit_result = upsert_rows(executor, 'quiz_app_unit', unit_rows)
+            failed_units = set(unit_result['failed_keys'])
+            skipped = [row for row in rows if row['unit_id'] in failed_units]
+            rows = [row for row in rows if row['unit_id'] not in failed_units]
+            result = upsert_rows(executor, 'quiz_app_question', rows)
         
+        errors = unit_result['errors'] + result['errors']
+        errors.extend(f"問題ID {row['id']} 単元ID {row['unit_id']} を同期できなかったため未送信" for row in skipped)
         return {
             'success': True,
-            'updated_count': updated_count,
-            'failed_count': failed_count,
+            'updated_count': result['updated_count'],
+            'failed_count': result['failed_count'] + len(skipped),
+            'failed_ids': result['failed_keys'] + [row['id'] for row in skipped],
             'errors': errors
         }
         
@@ -251,100 +220,117 @@ def sync_alternatives_to_supabase(subject_code: str) -> Dict[str, Any]:
         return {'success': False, 'error': error_msg}
 
 
+# XLSM解析処理のバージョン（解析結果キャッシュのキーに含める。解析仕様を変えたら上げること）
+XLSM_PARSER_VERSION = 1
+
+
+def _parse_xlsm_row(row: tuple) -> Dict[str, Any]:
+    """XLSMの1行を問題データに変換（不正な行はValueErrorを送出）"""
+    # 新しい列の定義: ID, 単元, 問題, 正解, 別解, 問題タイプ, 選択肢1-6, 単位
+    source_id = str(row[0]).strip()
+    unit_text = str(row[1]).strip()
+    question_text = str(row[2]).strip()
+    correct_answer = str(row[3]).strip()
+    alternatives_text = str(row[4]).strip() if len(row) > 4 and row[4] else ""
+    question_type = str(row[5]).strip() if len(row) > 5 and row[5] else "text"
+    unit_label_text = str(row[12]).strip() if len(row) > 12 and row[12] else ""
+    
+    # 問題タイプの正規化
+    if question_type.lower() in ['choice', '選択', '選択問題']:
+        question_type = 'choice'
+    else:
+        question_type = 'text'
+    
+    # 選択肢の取得（G列〜L列）
+    choices = []
+    if question_type == 'choice':
+        # 正解を選択肢に追加
+        choices.append(correct_answer)
+        
+        # 入力された選択肢を追加
+        for i in range(6, 12):  # G列〜L列
+            if len(row) > i and row[i]:
+                choice = str(row[i]).strip()
+                if choice and choice != correct_answer:  # 重複を避ける
+                    choices.append(choice)
+        
+        # 選択肢をランダムに並べ替え
+        import random
+        random.shuffle(choices)
+    
+    # 必須項目のチェック
+    if not all([source_id, unit_text, question_text, correct_answer]):
+        raise ValueError("必須項目が不足しています")
+    
+    # 単元情報の抽出
+    grade, category = extract_unit_info(unit_text)
+    if not grade or not category:
+        raise ValueError(f"単元情報の解析に失敗しました: {unit_text}")
+    
+    # 別解の解析
+    alternatives = parse_alternatives(alternatives_text)
+    
+    # 複数解答欄の判定
+    parts_count = 1
+    if '・' in correct_answer:
+        parts_count = len(split_parts(correct_answer))
+    
+    # 単位ラベルの判定
+    requires_unit_label = bool(unit_label_text)
+    if not unit_label_text:
+        # 単位フィールドが空の場合、問題文から自動抽出を試行
+        if any(unit in question_text.lower() for unit in ['g', 'kg', 'm', 'cm', 'l', 'ml']):
+            requires_unit_label = True
+            # 単位の抽出（簡易版）
+            unit_match = re.search(r'([0-9]+)\s*(g|kg|m|cm|l|ml)', question_text)
+            if unit_match:
+                unit_label_text = unit_match.group(2)
+    
+    return {
+        'source_id': source_id,
+        'unit_text': unit_text,
+        'grade': grade,
+        'category': category,
+        'question_text': question_text,
+        'correct_answer': correct_answer,
+        'alternatives': alternatives,
+        'question_type': question_type,
+        'choices': choices,
+        'parts_count': parts_count,
+        'requires_unit_label': requires_unit_label,
+        'unit_label_text': unit_label_text,
+    }
+
+
+def _parse_worksheet(worksheet) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """ワークシートの全行を解析して（データ, エラー）を返す"""
+    data = []
+    errors = []
+    
+    # ヘッダー行をスキップ（2行目から開始）
+    for row_num, row in enumerate(worksheet.iter_rows(min_row=2, values_only=True), start=2):
+        if not row or not row[0]:  # IDが空の行はスキップ
+            continue
+        
+        try:
+            data.append(_parse_xlsm_row(row))
+        except ValueError as e:
+            errors.append(f"行{row_num}: {str(e)}")
+        except Exception as e:
+            errors.append(f"行{row_num}: 処理エラー - {str(e)}")
+    
+    return data, errors
+
+
 def process_xlsm_file(file_path: str, subject_code: str) -> Dict[str, Any]:
     """XLSMファイルを処理してデータを抽出"""
     try:
-        workbook = load_workbook(file_path, keep_vba=True)
-        worksheet = workbook.active
-        
-        data = []
-        errors = []
-        
-        # ヘッダー行をスキップ（2行目から開始）
-        for row_num, row in enumerate(worksheet.iter_rows(min_row=2, values_only=True), start=2):
-            if not row[0]:  # IDが空の行はスキップ
-                continue
-            
-            try:
-                # 新しい列の定義: ID, 単元, 問題, 正解, 別解, 問題タイプ, 選択肢1-6, 単位
-                source_id = str(row[0]).strip()
-                unit_text = str(row[1]).strip()
-                question_text = str(row[2]).strip()
-                correct_answer = str(row[3]).strip()
-                alternatives_text = str(row[4]).strip() if row[4] else ""
-                question_type = str(row[5]).strip() if len(row) > 5 and row[5] else "text"
-                unit_label_text = str(row[12]).strip() if len(row) > 12 and row[12] else ""
-                
-                # 問題タイプの正規化
-                if question_type.lower() in ['choice', '選択', '選択問題']:
-                    question_type = 'choice'
-                else:
-                    question_type = 'text'
-                
-                # 選択肢の取得（G列〜L列）
-                choices = []
-                if question_type == 'choice':
-                    # 正解を選択肢に追加
-                    choices.append(correct_answer)
-                    
-                    # 入力された選択肢を追加
-                    for i in range(6, 12):  # G列〜L列
-                        if len(row) > i and row[i]:
-                            choice = str(row[i]).strip()
-                            if choice and choice != correct_answer:  # 重複を避ける
-                                choices.append(choice)
-                    
-                    # 選択肢をランダムに並べ替え
-                    import random
-                    random.shuffle(choices)
-                
-                # 必須項目のチェック
-                if not all([source_id, unit_text, question_text, correct_answer]):
-                    errors.append(f"行{row_num}: 必須項目が不足しています")
-                    continue
-                
-                # 単元情報の抽出
-                grade, category = extract_unit_info(unit_text)
-                if not grade or not category:
-                    errors.append(f"行{row_num}: 単元情報の解析に失敗しました: {unit_text}")
-                    continue
-                
-                # 別解の解析
-                alternatives = parse_alternatives(alternatives_text)
-                
-                # 複数解答欄の判定
-                parts_count = 1
-                if '・' in correct_answer:
-                    parts_count = len(split_parts(correct_answer))
-                
-                # 単位ラベルの判定
-                requires_unit_label = bool(unit_label_text)
-                if not unit_label_text:
-                    # 単位フィールドが空の場合、問題文から自動抽出を試行
-                    if any(unit in question_text.lower() for unit in ['g', 'kg', 'm', 'cm', 'l', 'ml']):
-                        requires_unit_label = True
-                        # 単位の抽出（簡易版）
-                        unit_match = re.search(r'([0-9]+)\s*(g|kg|m|cm|l|ml)', question_text)
-                        if unit_match:
-                            unit_label_text = unit_match.group(2)
-                
-                data.append({
-                    'source_id': source_id,
-                    'unit_text': unit_text,
-                    'grade': grade,
-                    'category': category,
-                    'question_text': question_text,
-                    'correct_answer': correct_answer,
-                    'alternatives': alternatives,
-                    'question_type': question_type,
-                    'choices': choices,
-                    'parts_count': parts_count,
-                    'requires_unit_label': requires_unit_label,
-                    'unit_label_text': unit_label_text,
-                })
-                
-            except Exception as e:
-                errors.append(f"行{row_num}: 処理エラー - {str(e)}")
+        # 読み取り専用モードでストリーミング解析する（書き戻しはしないためVBAの保持は不要）
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            data, errors = _parse_worksheet(workbook.active)
+        finally:
+            workbook.close()
         
         return {
             'data': data,
@@ -362,66 +348,312 @@ def process_xlsm_file(file_path: str, subject_code: str) -> Dict[str, Any]:
         }
 
 
+def preview_xlsm_file(file_path: str, limit: int = 20) -> Dict[str, Any]:
+    """
+    XLSMファイルの先頭limit行だけを解析してプレビュー用のデータを返す
+
+    全行の検証はバックグラウンドで行うため、ここでは読み取り専用モードで
+    先頭limit行（ヘッダー除く）だけを読む。
+    """
+    try:
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            worksheet = workbook.active
+            rows = list(worksheet.iter_rows(min_row=2, max_row=limit + 1))
+            # シートのdimension（例: A1:M50001）から求めた総行数の見込み（ヘッダー行を除く）
+            estimated_total = max(worksheet.max_row - 1, 0) if worksheet.max_row else None
+        finally:
+            workbook.close()
+    except Exception as e:
+        return {
+            'rows': [],
+            'errors': [f"ファイル読み込みエラー: {str(e)}"],
+            'estimated_total_rows': None,
+        }
+
+    preview_rows = []
+    errors = []
+    for cells in rows:
+        # 空のセルしかない行は行番号を持たないため読み飛ばす
+        row_num = next((cell.row for cell in cells if getattr(cell, 'row', None)), None)
+        row = tuple(cell.value for cell in cells)
+        if row_num is None or not row or not row[0]:
+            continue
+        try:
+            item = _parse_xlsm_row(row)
+            item['row_num'] = row_num
+            preview_rows.append(item)
+        except ValueError as e:
+            errors.append(f"行{row_num}: {str(e)}")
+        except Exception as e:
+            errors.append(f"行{row_num}: 処理エラー - {str(e)}")
+
+    return {
+        'rows': preview_rows,
+        'errors': errors,
+        'estimated_total_rows': estimated_total,
+    }
+
+
+def list_xlsm_sheet_names(file_path: str) -> List[str]:
+    """XLSMファイルのシート名一覧を取得"""
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def parse_xlsm_sheet(file_path: str, sheet_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    XLSMファイルの1シートを解析する
+    
+    プロセスプールのワーカーから呼ばれるため、データベースには一切アクセスしない。
+    sheet_nameを省略した場合はアクティブシートを解析する。
+    """
+    try:
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            worksheet = workbook[sheet_name] if sheet_name else workbook.active
+            data, errors = _parse_worksheet(worksheet)
+            sheet_title = worksheet.title
+        finally:
+            workbook.close()
+    except Exception as e:
+        data = []
+        errors = [f"ファイル読み込みエラー: {str(e)}"]
+        sheet_title = sheet_name or ''
+    
+    return {
+        'file': file_path,
+        'sheet': sheet_title,
+        'data': data,
+        'errors': errors,
+        'total_rows': len(data),
+        'error_count': len(errors)
+    }
+
+
+def process_xlsm_files_parallel(
+    file_paths: List[str],
+    all_sheets: bool = False,
+    max_workers: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    複数のXLSMファイル（または全シート）をプロセスプールで並列解析する
+    
+    openpyxlの解析はCPUバウンドのため、シート単位でワーカープロセスに分散する。
+    戻り値はシートごとの解析結果（parse_xlsm_sheetの戻り値）のリストで、
+    入力ファイル順・シート順に並べ替えて返す。
+    """
+    import django
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    # 解析タスク（ファイル, シート）を列挙
+    tasks = []
+    sheet_results = []
+    for file_path in file_paths:
+        if not all_sheets:
+            tasks.append((file_path, None))
+            continue
+        try:
+            for sheet_name in list_xlsm_sheet_names(file_path):
+                tasks.append((file_path, sheet_name))
+        except Exception as e:
+            sheet_results.append({
+                'file': file_path,
+                'sheet': '',
+                'data': [],
+                'errors': [f"ファイル読み込みエラー: {str(e)}"],
+                'total_rows': 0,
+                'error_count': 1
+            })
+    
+    if not tasks:
+        return sheet_results
+    
+    order = {task: index for index, task in enumerate(tasks)}
+    ordered_results = [None] * len(tasks)
+    
+    # spawn方式（Windows等）でもワーカー内でアプリを読み込めるようにdjango.setupで初期化する
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=django.setup) as executor:
+        futures = {executor.submit(parse_xlsm_sheet, *task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {
+                    'file': task[0],
+                    'sheet': task[1] or '',
+                    'data': [],
+                    'errors': [f"解析プロセスエラー: {str(e)}"],
+                    'total_rows': 0,
+                    'error_count': 1
+                }
+            ordered_results[order[task]] = result
+    
+    return sheet_results + ordered_results
+
+
+def import_xlsm_files(
+    file_paths: List[str],
+    subject_code: str,
+    all_sheets: bool = False,
+    max_workers: Optional[int] = None,
+    dry_run: bool = False,
+    sync_supabase: bool = True
+) -> Dict[str, Any]:
+    """
+    複数のXLSMファイルを並列解析し、単一のDB書き込み処理で一括登録する
+    
+    学期初めの全教科一括登録用。解析エラーはシートごとに行単位で報告し、エラーのないシートの
+    データのみを1回のsave_questions_from_xlsm_dataで保存する（管理画面の取込と同じく、
+    エラーが1行でもあるシートは保存しない）。
+    """
+    sheet_results = process_xlsm_files_parallel(file_paths, all_sheets=all_sheets, max_workers=max_workers)
+    
+    data = []
+    sheets = []
+    for result in sheet_results:
+        sheets.append({
+            'file': result['file'],
+            'sheet': result['sheet'],
+            'total_rows': result['total_rows'],
+            'error_count': result['error_count'],
+            'errors': result['errors'],
+        })
+        if result['error_count'] == 0:
+            data.extend(result['data'])
+    
+    save_result = None
+    if data and not dry_run:
+        save_result = save_questions_from_xlsm_data(data, subject_code, sync_supabase=sync_supabase)
+    
+    return {
+        'sheets': sheets,
+        'total_rows': len(data),
+        'save_result': save_result,
+    }
+
+
+# 一括登録時のバッチサイズ
+BULK_BATCH_SIZE = 500
+
+# 取込時に上書きする問題フィールド
+QUESTION_IMPORT_FIELDS = [
+    'question_type', 'text', 'correct_answer', 'accepted_alternatives', 'choices',
+    'parts_count', 'requires_unit_label', 'unit_label_text',
+]
+
+
+def _question_fields_from_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """XLSMデータ1件をQuestionのフィールド値に変換"""
+    return {
+        'question_type': item['question_type'],
+        'text': item['question_text'],
+        'correct_answer': item['correct_answer'],
+        # 別解データは完全に上書き
+        'accepted_alternatives': item['alternatives'] if item['alternatives'] else [],
+        'choices': item['choices'],
+        'parts_count': item['parts_count'],
+        'requires_unit_label': item['requires_unit_label'],
+        'unit_label_text': item['unit_label_text'],
+    }
+
+
 @transaction.atomic
-def save_questions_from_xlsm_data(data: List[Dict[str, Any]], subject_code: str) -> Dict[str, Any]:
-    """XLSMデータから問題をデータベースに保存"""
+def save_questions_from_xlsm_data(
+    data: List[Dict[str, Any]],
+    subject_code: str,
+    sync_supabase: bool = True
+) -> Dict[str, Any]:
+    """
+    XLSMデータから問題をデータベースに保存
+    
+    単元と既存問題のキーを事前に一括で読み込み、(単元, 元データID)をキーにした
+    一括アップサート（INSERT ... ON CONFLICT DO UPDATE）でまとめて書き込む。
+    bulk_update（CASE/WHEN）より大幅に速く、既存問題のオブジェクトも読み込まない。
+    取込対象外のフィールド（作成日時・統計など）は既存の値のまま残る。
+    """
+    from django.utils import timezone
+    
     subject = Subject.objects.get(code=subject_code)
     saved_count = 0
     updated_count = 0
     errors = []
+    now = timezone.now()
     
     # 対象教科の既存の別解データを完全にクリア
-    questions_to_clear = Question.objects.filter(unit__subject=subject)
-    for question in questions_to_clear:
-        question.accepted_alternatives = []
-        question.save()
+    Question.objects.filter(unit__subject=subject).update(accepted_alternatives=[], updated_at=now)
+    
+    # 単元と既存問題のキーを一括で読み込み
+    units = {
+        (unit.grade_year, unit.category): unit
+        for unit in Unit.objects.filter(subject=subject)
+    }
+    existing_keys = set(
+        Question.objects.filter(unit__subject=subject).values_list('unit_id', 'source_id')
+    )
+    
+    questions = {}
     
     for item in data:
         try:
             # 単元の取得または作成
-            unit, created = Unit.objects.get_or_create(
-                subject=subject,
-                grade_year=item['grade'],
-                category=item['category']
-            )
-            
-            # 問題の取得または作成
-            question, created = Question.objects.get_or_create(
-                unit=unit,
-                source_id=item['source_id'],
-                defaults={
-                    'question_type': item['question_type'],
-                    'text': item['question_text'],
-                    'correct_answer': item['correct_answer'],
-                    'accepted_alternatives': item['alternatives'],
-                    'choices': item['choices'],
-                    'parts_count': item['parts_count'],
-                    'requires_unit_label': item['requires_unit_label'],
-                    'unit_label_text': item['unit_label_text'],
-                }
-            )
+            unit_key = (item['grade'], item['category'])
+            unit = units.get(unit_key)
+            if unit is None:
+                unit, created = Unit.objects.get_or_create(
+                    subject=subject,
+                    grade_year=item['grade'],
+                    category=item['category']
+                )
+                units[unit_key] = unit
             
-            if not created:
-                # 既存の問題を更新（別解データは完全に上書き）
-                question.question_type = item['question_type']
-                question.text = item['question_text']
-                question.correct_answer = item['correct_answer']
-                # 別解データを完全にクリアしてから新しい別解を設定
-                question.accepted_alternatives = item['alternatives'] if item['alternatives'] else []
-                question.choices = item['choices']
-                question.parts_count = item['parts_count']
-                question.requires_unit_label = item['requires_unit_label']
-                question.unit_label_text = item['unit_label_text']
-                question.save()
+            question_key = (unit.id, item['source_id'])
+            if question_key in existing_keys or question_key in questions:
+                # 既存の問題（または同一ファイル内の重複行）は後の行で上書き
                 updated_count += 1
             else:
                 saved_count += 1
+            
+            questions[question_key] = Question(
+                unit=unit,
+                source_id=item['source_id'],
+                **_question_fields_from_item(item)
+            )
                 
         except Exception as e:
             errors.append(f"問題保存エラー (ID: {item['source_id']}): {str(e)}")
     
+    if questions:
+        Question.objects.bulk_create(
+            questions.values(),
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['unit', 'source_id'],
+            update_fields=QUESTION_IMPORT_FIELDS + ['updated_at'],
+        )
+        
+        # 新規の問題の分だけ単元・教科の問題数を増やす
+        new_counts = defaultdict(int)
+        for unit_id, source_id in questions:
+            if (unit_id, source_id) not in existing_keys:
+                new_counts[unit_id] += 1
+        adjust_question_counts(new_counts)
+    
+    # 別解のクリアを含め、対象教科の問題の検索索引を更新する
+    index_questions(Question.objects.filter(unit__subject=subject).values_list('id', flat=True))
+    
+    # bulk_create・update()ではシグナルが送られないため、表示データのキャッシュを明示的に無効にする
+    schedule_content_version_bump()
+    
     # Supabaseとの同期
-    sync_result = sync_alternatives_to_supabase(subject_code)
+    if sync_supabase:
+        sync_result = sync_alternatives_to_supabase(subject_code)
+    else:
+        sync_result = {'success': True, 'skipped': True}
     
     return {
         'saved_count': saved_count,
@@ -2,9 +2,9 @@ import logging
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from django.views.generic import ListView, DetailView, TemplateView
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.views.generic import View, ListView, DetailView, TemplateView
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.db.models import Q, Count, Avg
@@ -12,42 +12,60 @@ from django.utils import timezone
 from django.contrib import messages
 from .models import Subject, Unit, Question, QuizSession, QuizAttempt, Homework
 from .utils import check_answer, calculate_parts_count
+from .catalog_cache import catalog_subjects, catalog_subject, catalog_unit
+from .conditional import (
+    catalog_etag, catalog_last_modified, home_etag, quiz_result_etag, quiz_result_last_modified,
+    ranking_etag, ranking_last_modified,
+)
+from .ranking import get_ranking_snapshot
+from .homework import get_homework_payload, homework_for_student, start_homework_session
+from .homework_progress import invalidate_homework_progress
 
 # ロガーを設定
 logger = logging.getLogger(__name__)
 
 
+@method_decorator(condition(etag_func=home_etag, last_modified_func=catalog_last_modified), name='dispatch')
 class HomeView(TemplateView):
     """ホームページ"""
     template_name = 'quiz_app/home.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['subjects'] = Subject.objects.all()
+        context['subjects'] = catalog_subjects()
+        user = self.request.user
+        if user.is_authenticated and user.role == 'student':
+            context['assignments'] = homework_for_student(user)
         return context
 
 
-class SubjectView(DetailView):
-    """教科詳細ページ"""
-    model = Subject
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='dispatch')
+class SubjectView(TemplateView):
+    """教科詳細ページ（教科と単元一覧はキャッシュから表示）"""
     template_name = 'quiz_app/subject.html'
-    context_object_name = 'subject'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['units'] = self.object.units.all().order_by('grade_year', 'category')
+        catalog = catalog_subject(self.kwargs['pk'])
+        if catalog is None:
+            raise Http404('教科が見つかりません')
+        context['subject'] = catalog['subject']
+        context['units'] = catalog['units']
         return context
 
 
-class UnitView(DetailView):
-    """単元詳細ページ"""
-    model = Unit
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='dispatch')
+class UnitView(TemplateView):
+    """単元詳細ページ（単元と問題数はキャッシュから表示）"""
     template_name = 'quiz_app/unit.html'
-    context_object_name = 'unit'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['question_count'] = self.object.questions.count()
+        catalog = catalog_unit(self.kwargs['pk'])
+        if catalog is None:
+            raise Http404('単元が見つかりません')
+        context['unit'] = catalog['unit']
+        context['question_count'] = catalog['question_count']
         return context
 
 
@@ -131,7 +149,10 @@ class QuizQuestionView(LoginRequiredMixin, TemplateView):
             else:
                 choices_list = list(question.choices) if question.choices else []
             
-            if choices_list:
+            if session.choice_mappings and str(question.id) in session.choice_mappings:
+                # 並べ替え済み（宿題で固定された並び順・再読み込み）
+                question.shuffled_choices = session.choice_mappings[str(question.id)]
+            elif choices_list:
                 # 選択肢のコピーを作成してランダムに並べ替え
                 shuffled_choices = choices_list.copy()
                 random.shuffle(shuffled_choices)
@@ -155,6 +176,7 @@ class QuizQuestionView(LoginRequiredMixin, TemplateView):
         return context
 
 
+@method_decorator(condition(etag_func=quiz_result_etag, last_modified_func=quiz_result_last_modified), name='dispatch')
 class QuizResultView(LoginRequiredMixin, DetailView):
     """クイズ結果ページ"""
     model = QuizSession
@@ -328,6 +350,9 @@ class MyPageView(LoginRequiredMixin, TemplateView):
             
             # 最近のセッション
             context['recent_sessions'] = sessions.order_by('-started_at')[:5]
+            
+            # 自分のクラス・学校に公開されている宿題
+            context['assignments'] = homework_for_student(user)
         
         return context
 
@@ -393,6 +418,7 @@ class ProfileEditView(LoginRequiredMixin, TemplateView):
         return redirect('quiz_app:profile_edit')
 
 
+@method_decorator(condition(etag_func=ranking_etag, last_modified_func=ranking_last_modified), name='dispatch')
 class RankingView(TemplateView):
     """匿名ランキングページ"""
     template_name = 'quiz_app/ranking.html'
@@ -400,34 +426,46 @@ class RankingView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # 総プレイ数ランキング
-        play_count_ranking = QuizSession.objects.values('user__student_profile__nickname').annotate(
-            total_sessions=Count('id')
-        ).order_by('-total_sessions')[:10]
+        # 一定時間ごとに集計したランキングを表示
+        snapshot = get_ranking_snapshot()
         
-        # 1問あたり平均時間ランキング
-        avg_time_ranking = QuizAttempt.objects.values('session__user__student_profile__nickname').annotate(
-            avg_time=Avg('time_spent_sec')
-        ).order_by('avg_time')[:10]
-        
-        context['play_count_ranking'] = play_count_ranking
-        context['avg_time_ranking'] = avg_time_ranking
+        context['play_count_ranking'] = snapshot['play_count_ranking']
+        context['avg_time_ranking'] = snapshot['avg_time_ranking']
+        context['ranking_taken_at'] = snapshot['taken_at']
         
         return context
 
 
 class HomeworkView(TemplateView):
-    """宿題ページ"""
+    """宿題ページ（固定した問題の表示データはキャッシュから表示）"""
     template_name = 'quiz_app/homework.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        slug = self.kwargs['slug']
-        homework = get_object_or_404(Homework, public_slug=slug, is_published=True)
+        homework = get_homework_payload(self.kwargs['slug'])
+        if homework is None:
+            raise Http404('宿題が見つかりません')
         context['homework'] = homework
         return context
 
 
+class HomeworkStartView(LoginRequiredMixin, View):
+    """宿題の開始（固定した問題からクイズセッションを作成）"""
+    
+    def post(self, request, *args, **kwargs):
+        homework = get_homework_payload(self.kwargs['slug'])
+        if homework is None:
+            raise Http404('宿題が見つかりません')
+        if not homework['questions']:
+            messages.error(request, 'この宿題には出題できる問題がありません。')
+            return redirect('quiz_app:homework', slug=homework['slug'])
+        session = start_homework_session(request.user, homework)
+        answered = session.attempts.count()
+        if answered >= session.question_count:
+            return redirect('quiz_app:quiz_result', pk=session.pk)
+        return redirect('quiz_app:quiz_question', session_id=session.pk, question_number=answered + 1)
+
+
 # API Views
 @method_decorator(csrf_exempt, name='dispatch')
 class SubmitAnswerView(LoginRequiredMixin, TemplateView):
@@ -541,6 +579,8 @@ def submit_answer(request, session_id, question_number):
                 session.finished_at = timezone.now()
                 session.total_score = (session.attempts.filter(is_correct=True).count() / session.question_count) * 100
                 session.save()
+                if session.homework_id:
+                    invalidate_homework_progress(session)
                 return redirect('quiz_app:quiz_result', pk=session_id)
         
         return redirect('quiz_app:home')